@@ -0,0 +1,33 @@
+"""
+Measures the time needed to import PyonFX in a fresh interpreter,
+and the time needed to load the native font system the first time a Font is created.
+
+Usage:
+    python benchmarks/import_time.py [runs]
+"""
+import os
+import sys
+import subprocess
+import statistics
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(code, runs):
+    # Time of code executed in a fresh interpreter, subtracting the startup of the interpreter itself
+    timer = "import time; _t = time.perf_counter(); %s; print(time.perf_counter() - _t)"
+    times = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", timer % code], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True, cwd=root, universal_newlines=True)
+        times.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(times)
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    print("import pyonfx:                 %.1f ms" % (measure("import pyonfx", runs) * 1000))
+    try:
+        print("import pyonfx + font backend:  %.1f ms" % (measure("import pyonfx; pyonfx.font_utility.load_backend()", runs) * 1000))
+    except subprocess.CalledProcessError:
+        print("import pyonfx + font backend:  not available (native font system not installed)")
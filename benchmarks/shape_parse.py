@@ -0,0 +1,48 @@
+"""
+Measures the throughput of the drawing commands parser of Shape, alone and through the methods reusing it,
+on a big outline made of curves and lines (like the one of a long text converted with Convert.text_to_shape).
+
+Usage:
+    python benchmarks/shape_parse.py [runs]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pyonfx import Shape
+
+
+def big_outline(glyphs=400):
+    # Outline with the size of a few lines of text: every "glyph" has curves and lines, some with holes
+    figures = []
+    for i in range(glyphs):
+        x, y = (i % 40) * 30, (i // 40) * 40
+        figures.append(Shape.heart(24, 2).move(x, y).drawing_cmds)
+        figures.append(Shape.ring(8, 4).move(x + 6, y + 20).drawing_cmds)
+        figures.append(Shape.star(5, 4, 9).move(x + 3, y + 5).drawing_cmds)
+    return " ".join(figures)
+
+
+def measure(name, stmt, size, runs):
+    best = min(timeit.repeat(stmt, number=1, repeat=runs))
+    print("%-28s %8.2f ms  %6.1f MB/s" % (name, best * 1000, size / best / 1e6))
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    cmds = big_outline()
+    size = len(cmds)
+    print("Outline: %d characters, %d tokens\n" % (size, len(cmds.split())))
+
+    measure("has_error", lambda: Shape(cmds).has_error(), size, runs)
+    measure("map (identity)", lambda: Shape(cmds).map(lambda x, y: (x, y)), size, runs)
+    measure("bounding", lambda: Shape(cmds).bounding(), size, runs)
+
+    def validate_and_measure():
+        # The parse is done once and shared by all the calls
+        shape = Shape(cmds)
+        shape.has_error()
+        shape.bounding()
+        shape.bounding(exact=True)
+    measure("has_error + 2x bounding", validate_and_measure, size, runs)
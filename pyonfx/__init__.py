@@ -1,9 +1,9 @@
 # -*- coding: utf-8 -*-
 
 from .font_utility import Font
-from .ass_core import Ass, Meta, Style, Line, Word, Syllable, Char
+from .ass_core import Ass, Meta, Style, Line, Word, Syllable, Char, SharedLayout
 from .convert import Convert
-from .shape import Shape
+from .shape import Shape, ShapePath, ShapeMorph, ShapeIndex, DistanceField
 from .utils import Utils, FrameUtility, ColorUtility
 
 __version__ = '0.9.0'
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# PyonFX: An easy way to do KFX and complex typesetting based on subtitle format ASS (Advanced Substation Alpha).
+# Copyright (C) 2019 Antonio Strippoli (CoffeeStraw/YellowFlash)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyonFX is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see http://www.gnu.org/licenses/.
+"""
+Command line entry point of PyonFX.
+
+Usage:
+    pyonfx watch script.py [in.ass ...]    (or: python -m pyonfx watch ...)
+"""
+import os
+import sys
+import time
+import runpy
+import argparse
+import traceback
+from . import ass_core
+
+
+def run_script(path_script, args=()):
+    """Executes an effect script in this interpreter, as if it was launched with ``python script.py``.
+
+    Parameters:
+        path_script (str): Path of the script to execute.
+        args (list of str, optional): Command line arguments for the script.
+
+    Returns:
+        True if the script ended without errors, else False (the traceback is printed).
+    """
+    path_script = os.path.abspath(path_script)
+    old_argv, old_path = sys.argv, sys.path[:]
+
+    # Ass resolves relative paths from the directory of sys.argv[0], so let's make it the script
+    sys.argv = [path_script] + list(args)
+    sys.path.insert(0, os.path.dirname(path_script))
+    try:
+        runpy.run_path(path_script, run_name="__main__")
+        return True
+    except SystemExit as e:
+        return not e.code
+    except Exception:
+        traceback.print_exc()
+        return False
+    finally:
+        sys.argv, sys.path[:] = old_argv, old_path
+
+
+def watch(path_script, paths_input=(), args=(), interval=0.5):
+    """Runs an effect script, then runs it again every time it or one of its input files changes.
+
+    The interpreter stays alive between runs, so modules (like cairo and Pango), fonts and caches stay warm,
+    and every Ass object created by the script is parsed incrementally (see :class:`Ass<pyonfx.ass_core.Ass>`),
+    laying out again only the lines that changed.
+    Players opened by the script with :func:`open_aegisub<pyonfx.ass_core.Ass.open_aegisub>`
+    or :func:`open_mpv<pyonfx.ass_core.Ass.open_mpv>` are started only after the first run.
+
+    Parameters:
+        path_script (str): Path of the effect script.
+        paths_input (list of str, optional): Additional files to watch. Input files read by the script are watched automatically.
+        args (list of str, optional): Command line arguments for the script.
+        interval (float, optional): Seconds between two checks of the watched files.
+    """
+    ass_core.INCREMENTAL_PARSE = True
+    ass_core.WATCH_MODE = True
+
+    def get_mtimes():
+        paths = {os.path.abspath(path_script)}
+        paths.update(os.path.abspath(p) for p in paths_input)
+        paths.update(ass_core._layout_caches)
+
+        mtimes = {}
+        for path in paths:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+
+    try:
+        while True:
+            # Snapshot taken before the run, so that files saved while the script is running trigger a new run
+            mtimes = get_mtimes()
+            start = time.time()
+            ok = run_script(path_script, args)
+            print("[%s] Run %s in %.3f seconds, watching for changes (Ctrl+C to stop)..." % (
+                time.strftime("%H:%M:%S"), "completed" if ok else "failed", time.time() - start))
+
+            # Input files found by the run are watched from their current state
+            mtimes = {**get_mtimes(), **mtimes}
+            while get_mtimes() == mtimes:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="pyonfx", description="PyonFX command line utilities.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    parser_watch = subparsers.add_parser("watch", help="run an effect script again every time it or its input changes")
+    parser_watch.add_argument("script", help="path of the effect script")
+    parser_watch.add_argument("inputs", nargs="*", help="additional files to watch (input .ass files read by the script are watched anyway)")
+    parser_watch.add_argument("--interval", type=float, default=0.5, help="seconds between two checks of the files (default: 0.5)")
+    parser_watch.add_argument("--args", nargs=argparse.REMAINDER, default=[], help="command line arguments for the script")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "watch":
+        watch(args.script, args.inputs, args.args, args.interval)
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -21,10 +21,29 @@ import time
 import re
 import copy
 import subprocess
+import array
+import struct
+import pickle
+import operator
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
 from typing import List
 from .font_utility import Font
+from . import font_utility
 from .convert import Convert
 
+# CONFIGURATION
+INCREMENTAL_PARSE = False # Reuse unchanged lines from the last parse of the same file by default? (see Ass)
+LAYOUT_CHUNKS_PER_WORKER = 4 # Chunks of lines given to every process by Ass(workers=...), more chunks balance better the work between processes
+WATCH_MODE = False # Set by the watch runner (python -m pyonfx watch): players are opened only once, without waiting for them
+
+# Last parse of every input file read with incremental=True, used as layout cache
+_layout_caches = {}
+
+# Players already opened in watch mode, as (player, output path)
+_opened_players = set()
+
+
 def pretty_print(obj, indent=0, name=""):
     # Utility function to print object Meta, Style, Line, Word, Syllable and Char (this is a dirty solution probably)
     if   type(obj) == Line:
@@ -110,6 +129,7 @@ class Style:
         margin_r (int): Distance from the right of the video frame
         margin_v (int): Distance from the bottom (or top if alignment >= 7) of the video frame
         encoding (int): Codepage used to map codepoints to glyphs
+        font_backend (str): Backend used to read the font of the style (see :class:`Font`)
     """
     fontname: str
     fontsize: float
@@ -137,6 +157,7 @@ class Style:
     margin_r: int
     margin_v: int
     encoding: int
+    font_backend: str
     def __repr__(self):
         return pretty_print(self)
 
@@ -385,6 +406,842 @@ class Line:
         return copy.deepcopy(self)
 
 
+def _layout_line(line, meta, vertical_kanji):
+    # Adds to a line (whose styleref has already been set) its text, durations, sizes and positions, with words, syls and chars
+    line.duration = line.end_time - line.start_time
+    line.text = re.sub(r"\{.*?\}", "", line.raw_text)
+
+    # Add dialog text sizes and positions (if possible)
+    if not line.styleref:
+        return
+
+    # Creating a Font object and saving return values of font.get_metrics() for the future
+    font = Font(line.styleref)
+    font_metrics = font.get_metrics()
+
+    line.width, line.height = font.get_text_extents(line.text)
+    line.ascent, line.descent, line.internal_leading, line.external_leading = font_metrics
+    if meta.play_res_x > 0 and meta.play_res_y > 0:
+        # Horizontal position
+        tmp_margin_l = line.margin_l if line.margin_l != 0 else line.styleref.margin_l
+        tmp_margin_r = line.margin_r if line.margin_r != 0 else line.styleref.margin_r
+
+        if (line.styleref.alignment-1) % 3 == 0:
+            line.left = tmp_margin_l
+            line.center = line.left + line.width / 2
+            line.right = line.left + line.width
+            line.x = line.left
+        elif (line.styleref.alignment-2) % 3 == 0:
+            line.left = meta.play_res_x / 2 - line.width / 2 + tmp_margin_l / 2 - tmp_margin_r / 2
+            line.center = line.left + line.width / 2
+            line.right = line.left + line.width
+            line.x = line.center
+        else:
+            line.left = meta.play_res_x - tmp_margin_r - line.width
+            line.center = line.left + line.width / 2
+            line.right = line.left + line.width
+            line.x = line.right
+
+        # Vertical position
+        if line.styleref.alignment > 6:
+            line.top = line.margin_v if line.margin_v != 0 else line.styleref.margin_v
+            line.middle = line.top + line.height / 2
+            line.bottom = line.top + line.height
+            line.y = line.top
+        elif line.styleref.alignment > 3:
+            line.top = meta.play_res_y / 2 - line.height / 2
+            line.middle = line.top + line.height / 2
+            line.bottom = line.top + line.height
+            line.y = line.middle
+        else:
+            line.top = meta.play_res_y - (line.margin_v if line.margin_v != 0 else line.styleref.margin_v) - line.height
+            line.middle = line.top + line.height / 2
+            line.bottom = line.top + line.height
+            line.y = line.bottom
+
+    # Calculating space width and saving spacing
+    space_width = font.get_text_extents(" ")[0]
+    style_spacing = line.styleref.spacing
+
+    # Adding words
+    line.words = []
+
+    wi = 0
+    for prespace, word_text, postspace in re.findall(r"(\s*)([^\s]+)(\s*)", line.text):
+        word = Word()
+
+        word.i = wi
+        wi += 1
+
+        word.start_time = line.start_time
+        word.end_time = line.end_time
+        word.duration = line.duration
+
+        word.styleref = line.styleref
+        word.text = word_text
+
+        word.prespace = len(prespace)
+        word.postspace = len(postspace)
+
+        word.width, word.height = font.get_text_extents(word.text)
+        word.ascent, word.descent, word.internal_leading, word.external_leading = font_metrics
+
+        line.words.append(word)
+
+    # Calculate word positions with all words data already available
+    if line.words and meta.play_res_x > 0 and meta.play_res_y > 0:
+        if line.styleref.alignment > 6 or line.styleref.alignment < 4:
+            cur_x = line.left
+            for word in line.words:
+                # Horizontal position
+                cur_x = cur_x + word.prespace * (space_width + style_spacing)
+
+                word.left = cur_x
+                word.center = word.left + word.width / 2
+                word.right = word.left + word.width
+
+                if (line.styleref.alignment-1) % 3 == 0:
+                    word.x = word.left
+                elif (line.styleref.alignment-2) % 3 == 0:
+                    word.x = word.center
+                else:
+                    word.x = word.right
+
+                # Vertical position
+                word.top = line.top
+                word.middle = line.middle
+                word.bottom = line.bottom
+                word.y = line.y
+
+                # Updating cur_x
+                cur_x = cur_x + word.width + word.postspace * (space_width + style_spacing) + style_spacing
+        else:
+            max_width, sum_height = 0, 0
+            for word in line.words:
+                max_width = max(max_width, word.width)
+                sum_height = sum_height + word.height
+
+            cur_y = x_fix = meta.play_res_y / 2 - sum_height / 2
+            for word in line.words:
+                # Horizontal position
+                x_fix = (max_width - word.width) / 2
+
+                if line.styleref.alignment == 4:
+                    word.left = line.left + x_fix
+                    word.center = word.left + word.width / 2
+                    word.right = word.left + word.width
+                    word.x = word.left
+                elif line.styleref.alignment == 5:
+                    word.left = meta.play_res_x / 2 - word.width / 2
+                    word.center = word.left + word.width / 2
+                    word.right = word.left + word.width
+                    word.x = word.center
+                else:
+                    word.left = line.right - word.width - x_fix
+                    word.center = word.left + word.width / 2
+                    word.right = word.left + word.width
+                    word.x = word.right
+
+                # Vertical position
+                word.top = cur_y
+                word.middle = word.top + word.height / 2
+                word.bottom = word.top + word.height
+                word.y = word.middle
+                cur_y = cur_y + word.height
+
+
+    # Search for dialog's text chunks, to later create syllables
+    # A text chunk is a text with one or more {tags} preceding it
+    # Tags can be some text or empty string
+    text_chunks = []
+    tag_pattern = re.compile(r"(\{.*?\})+")
+    tag = tag_pattern.search(line.raw_text)
+    word_i = 0
+
+    if not tag:
+        # No tags found
+        text_chunks.append({'tags': "", 'text': line.raw_text})
+    else:
+        # First chunk without tags?
+        if tag.start() != 0:
+            text_chunks.append({'tags': "", 'text': line.raw_text[0:tag.start()]})
+
+        # Searching for other tags
+        while True:
+            next_tag = tag_pattern.search(line.raw_text, tag.end())
+            tmp = {
+                # Note that we're removing possibles '}{' caused by consecutive tags
+                'tags': line.raw_text[tag.start()+1:tag.end()-1].replace('}{', ''),
+                'text': line.raw_text[tag.end():(next_tag.start() if next_tag else None)],
+                'word_i': word_i
+            }
+            text_chunks.append(tmp)
+
+            # If there are some spaces after text, then we're at the end of the current word
+            if re.match(r"(.*?)(\s+)$", tmp['text']):
+                word_i = word_i + 1
+
+            if not next_tag:
+                break
+            tag = next_tag
+
+    # Adding syls
+    si = 0
+    last_time = 0
+    inline_fx = ''
+    syl_tags_pattern = re.compile(r"(.*?)\\[kK][of]?(\d+)(.*)")
+
+    line.syls = []
+    for tc in text_chunks:                    
+        # If we don't have at least one \k tag, everything is invalid
+        if not syl_tags_pattern.match(tc['tags']):
+            line.syls.clear()
+            break
+
+        posttags = tc['tags']
+        syls_in_text_chunk = []
+        while True:
+            # Are there \k in posttags?
+            tags_syl = syl_tags_pattern.match(posttags)
+
+            if not tags_syl:
+                # Append all the temporary syls, except last one
+                for syl in syls_in_text_chunk[:-1]:
+                    curr_inline_fx = re.search(r"\\\-([^\\]+)", syl.tags)
+                    if curr_inline_fx:
+                        inline_fx = curr_inline_fx[1]
+                    syl.inline_fx = inline_fx
+
+                    # Hidden syls are treated like empty syls
+                    syl.prespace, syl.text, syl.postspace = 0, '', 0
+
+                    syl.width, syl.height = font.get_text_extents('')
+                    syl.ascent, syl.descent, syl.internal_leading, syl.external_leading = font_metrics
+
+                    line.syls.append(syl)
+
+                # Append last syl
+                syl = syls_in_text_chunk[-1]
+                syl.tags += posttags
+
+                curr_inline_fx = re.search(r"\\\-([^\\]+)", syl.tags)
+                if curr_inline_fx:
+                    inline_fx = curr_inline_fx[1]
+                syl.inline_fx = inline_fx
+
+                if tc['text'].isspace():
+                    syl.prespace, syl.text, syl.postspace = 0, tc['text'], 0
+                else:
+                    syl.prespace, syl.text, syl.postspace = re.match(r"(\s*)(.*?)(\s*)$", tc['text']).groups()
+                    syl.prespace, syl.postspace = len(syl.prespace), len(syl.postspace)
+
+                syl.width, syl.height = font.get_text_extents(syl.text)
+                syl.ascent, syl.descent, syl.internal_leading, syl.external_leading = font_metrics
+
+                line.syls.append(syl)
+                break
+
+            pretags, kdur, posttags = tags_syl.groups()
+
+            # Create a Syllable object
+            syl = Syllable()
+
+            syl.start_time = last_time
+            syl.end_time = last_time + int(kdur) * 10
+            syl.duration = int(kdur) * 10
+
+            syl.styleref = line.styleref
+            syl.tags = pretags
+
+            syl.i = si
+            syl.word_i = tc['word_i']
+
+            syls_in_text_chunk.append(syl)
+
+            # Update working variable
+            si += 1
+            last_time = syl.end_time
+
+    # Calculate syllables positions with all syllables data already available
+    if line.syls and meta.play_res_x > 0 and meta.play_res_y > 0:
+        if line.styleref.alignment > 6 or line.styleref.alignment < 4 or not vertical_kanji:
+            cur_x = line.left
+            for syl in line.syls:
+                cur_x = cur_x + syl.prespace * (space_width + style_spacing)
+                # Horizontal position
+                syl.left = cur_x
+                syl.center = syl.left + syl.width / 2
+                syl.right = syl.left + syl.width
+
+                if (line.styleref.alignment-1) % 3 == 0:
+                    syl.x = syl.left
+                elif (line.styleref.alignment-2) % 3 == 0:
+                    syl.x = syl.center
+                else:
+                    syl.x = syl.right
+
+                cur_x = cur_x + syl.width + syl.postspace * (space_width + style_spacing) + style_spacing
+
+                # Vertical position
+                syl.top = line.top
+                syl.middle = line.middle
+                syl.bottom = line.bottom
+                syl.y = line.y
+
+        else: # Kanji vertical position
+            max_width, sum_height = 0, 0
+            for syl in line.syls:
+                max_width = max(max_width, syl.width)
+                sum_height = sum_height + syl.height
+
+            cur_y = meta.play_res_y / 2 - sum_height / 2
+
+            # Fixing line positions
+            line.top = cur_y
+            line.middle = meta.play_res_y / 2
+            line.bottom = line.top + sum_height
+            line.width = max_width
+            line.height = sum_height
+            if line.styleref.alignment == 4:
+                line.center = line.left + max_width / 2
+                line.right = line.left + max_width
+            elif line.styleref.alignment == 5:
+                line.left = line.center - max_width / 2
+                line.right = line.left + max_width
+            else:
+                line.left = line.right - max_width
+                line.center = line.left + max_width / 2
+
+            for syl in line.syls:
+                # Horizontal position
+                x_fix = (max_width - syl.width) / 2
+                if line.styleref.alignment == 4:
+                    syl.left = line.left + x_fix
+                    syl.center = syl.left + syl.width / 2
+                    syl.right = syl.left + syl.width
+                    syl.x = syl.left
+                elif line.styleref.alignment == 5:
+                    syl.left = line.center - syl.width / 2
+                    syl.center = syl.left + syl.width / 2
+                    syl.right = syl.left + syl.width
+                    syl.x = syl.center
+                else:
+                    syl.left = line.right - syl.width - x_fix
+                    syl.center = syl.left + syl.width / 2
+                    syl.right = syl.left + syl.width
+                    syl.x = syl.right
+
+                # Vertical position
+                syl.top = cur_y
+                syl.middle = syl.top + syl.height / 2
+                syl.bottom = syl.top + syl.height
+                syl.y = syl.middle
+                cur_y = cur_y + syl.height
+
+    # Adding chars
+    line.chars = []
+
+    # If we have syls in line, we prefert to work with them to provide more informations
+    if line.syls:
+        words_or_syls = line.syls
+    else:
+        words_or_syls = line.words
+
+    # Getting chars
+    char_index = 0
+    for el in words_or_syls:
+        el_text = "{}{}{}".format(" "*el.prespace, el.text, " "*el.postspace)
+        for ci, char_text in enumerate(list(el_text)):
+            char = Char()
+            char.i = ci
+
+            # If we're working with syls, we can add some indexes
+            char.i = char_index
+            char_index += 1
+            if line.syls:
+                char.word_i = el.word_i
+                char.syl_i = el.i
+                char.syl_char_i = ci
+            else:
+                char.word_i = el.i
+
+            # Adding last fields based on the existance of syls or not
+            char.start_time = el.start_time
+            char.end_time = el.end_time
+            char.duration = el.duration
+
+            char.styleref = line.styleref
+            char.text = char_text
+
+            char.width, char.height = font.get_text_extents(char.text)
+            char.ascent, char.descent, char.internal_leading, char.external_leading = font_metrics
+
+            line.chars.append(char)
+
+    # Calculate character positions with all characters data already available
+    if line.chars and meta.play_res_x > 0 and meta.play_res_y > 0:
+        if line.styleref.alignment > 6 or line.styleref.alignment < 4:
+            cur_x = line.left
+            for char in line.chars:
+                # Horizontal position
+                char.left = cur_x
+                char.center = char.left + char.width / 2
+                char.right = char.left + char.width
+
+                if (line.styleref.alignment-1) % 3 == 0:
+                    char.x = char.left
+                elif (line.styleref.alignment-2) % 3 == 0:
+                    char.x = char.center
+                else:
+                    char.x = char.right
+
+                cur_x = cur_x + char.width + style_spacing
+
+                # Vertical position
+                char.top = line.top
+                char.middle = line.middle
+                char.bottom = line.bottom
+                char.y = line.y
+        else:
+            max_width, sum_height = 0, 0
+            for char in line.chars:
+                max_width = max(max_width, char.width)
+                sum_height = sum_height + char.height
+
+            cur_y = x_fix = meta.play_res_y / 2 - sum_height / 2
+            for char in line.chars:
+                # Horizontal position
+                x_fix = (max_width - char.width) / 2
+                if line.styleref.alignment == 4:
+                    char.left = line.left + x_fix
+                    char.center = char.left + char.width / 2
+                    char.right = char.left + char.width
+                    char.x = char.left
+                elif line.styleref.alignment == 5:
+                    char.left = meta.play_res_x / 2 - char.width / 2
+                    char.center = char.left + char.width / 2
+                    char.right = char.left + char.width
+                    char.x = char.center
+                else:
+                    char.left = line.right - char.width - x_fix
+                    char.center = char.left + char.width / 2
+                    char.right = char.left + char.width
+                    char.x = char.right
+
+                # Vertical position
+                char.top = cur_y
+                char.middle = char.top + char.height / 2
+                char.bottom = char.top + char.height
+                char.y = char.middle
+                cur_y = cur_y + char.height
+
+
+# Attributes of the layout objects, in the same order they are set by Ass and _layout_line (so that rebuilt objects look the same),
+# with their types: "n" for numbers and booleans, "s" for strings, "r" for style references and "c" for lists of child objects
+_POSITION_FIELDS = (
+    ("width", "n"), ("height", "n"), ("ascent", "n"), ("descent", "n"), ("internal_leading", "n"), ("external_leading", "n"),
+    ("left", "n"), ("center", "n"), ("right", "n"), ("x", "n"), ("top", "n"), ("middle", "n"), ("bottom", "n"), ("y", "n"),
+)
+_LAYOUT_FIELDS = {
+    "line": (
+        ("i", "n"), ("comment", "n"), ("layer", "n"), ("start_time", "n"), ("end_time", "n"), ("style", "s"), ("actor", "s"),
+        ("margin_l", "n"), ("margin_r", "n"), ("margin_v", "n"), ("effect", "s"), ("raw_text", "s"), ("styleref", "r"),
+        ("duration", "n"), ("text", "s"), *_POSITION_FIELDS, ("words", "c"), ("syls", "c"), ("chars", "c"), ("leadin", "n"), ("leadout", "n"),
+    ),
+    "words": (
+        ("i", "n"), ("start_time", "n"), ("end_time", "n"), ("duration", "n"), ("styleref", "r"), ("text", "s"),
+        ("prespace", "n"), ("postspace", "n"), *_POSITION_FIELDS,
+    ),
+    "syls": (
+        ("start_time", "n"), ("end_time", "n"), ("duration", "n"), ("styleref", "r"), ("tags", "s"), ("i", "n"), ("word_i", "n"),
+        ("inline_fx", "s"), ("prespace", "n"), ("text", "s"), ("postspace", "n"), *_POSITION_FIELDS,
+    ),
+    "chars": (
+        ("i", "n"), ("word_i", "n"), ("syl_i", "n"), ("syl_char_i", "n"), ("start_time", "n"), ("end_time", "n"), ("duration", "n"),
+        ("styleref", "r"), ("text", "s"), *_POSITION_FIELDS,
+    ),
+}
+_LAYOUT_CLASSES = {"line": Line, "words": Word, "syls": Syllable, "chars": Char}
+
+# Kinds of the numbers in the layout columns
+_FLOAT, _INT, _BOOL, _MISSING = 0, 1, 2, 3
+_NONE, _ABSENT = -1, -2
+
+
+class _LayoutColumns:
+    # Lines with their words, syls and chars stored as one array for every attribute and a table of strings,
+    # much faster to send to other processes than the objects themselves.
+    # Columns are named "<kind>.<attribute>": numbers are doubles with a "<kind>.<attribute>:type" column telling their kind,
+    # strings and styles (by name) are indexes of the string table, lists of children have a ":start" column with n + 1 indexes.
+
+    def __init__(self, columns, strings):
+        self.columns, self.strings = columns, strings
+
+    def __len__(self):
+        return len(self.columns["line.i"])
+
+    def __getstate__(self):
+        return self.columns, self.strings
+
+    def __setstate__(self, state):
+        self.columns, self.strings = state
+
+    @staticmethod
+    def _plan(kind, columns):
+        # Attributes of a kind of objects with their columns (value, type, start), looked up once
+        return [
+            (name, field_type, columns["%s.%s" % (kind, name)], columns.get("%s.%s:type" % (kind, name)), columns.get("%s.%s:start" % (kind, name)))
+            for name, field_type in _LAYOUT_FIELDS[kind]
+        ]
+
+    @classmethod
+    def from_lines(cls, lines):
+        columns = {}
+        for kind, fields in _LAYOUT_FIELDS.items():
+            for name, field_type in fields:
+                key = "%s.%s" % (kind, name)
+                columns[key] = array.array("q" if field_type in "sr" else "d")
+                if field_type in "nc":
+                    columns[key + ":type"] = array.array("b")
+                if field_type == "c":
+                    columns[key + ":start"] = array.array("q", [0])
+        plans = {kind: cls._plan(kind, columns) for kind in _LAYOUT_FIELDS}
+        strings, string_ids = [], {}
+        absent = object()
+
+        def add(kind, obj, style):
+            # Styles are written by name: the one of the line (lines of a style always refer to it)
+            attributes = obj.__dict__
+            for name, field_type, values, types, starts in plans[kind]:
+                value = attributes.get(name, absent)
+                if field_type in "sr":
+                    if value is absent:
+                        value = _ABSENT
+                    elif value is None:
+                        value = _NONE
+                    else:
+                        if field_type == "r":
+                            value = style
+                        index = string_ids.get(value)
+                        if index is None:
+                            index = string_ids[value] = len(strings)
+                            strings.append(value)
+                        value = index
+                    values.append(value)
+                elif value is absent:
+                    values.append(0.0)
+                    types.append(_MISSING)
+                    if starts is not None:
+                        starts.append(starts[-1])
+                elif field_type == "c":
+                    for child in value:
+                        add(name, child, style)
+                    values.append(len(value))
+                    types.append(_INT)
+                    starts.append(starts[-1] + len(value))
+                else:
+                    values.append(value)
+                    types.append(_FLOAT if type(value) is float else _INT if type(value) is int else _BOOL)
+
+        for line in lines:
+            add("line", line, line.style)
+        return cls(columns, strings)
+
+    def to_lines(self, styles, lines=None):
+        # Creates all the lines with their words, syls and chars (filling the given line objects, if any), with styles found by name in styles.
+        # Values are converted column by column, then every object gets its attributes at once
+        absent = object()
+        strings = self.strings
+        style_refs = [styles.get(string) for string in strings]
+        built = {}
+
+        for kind in ("chars", "syls", "words", "line"):
+            names, values_list, partial = [], [], []
+            for name, field_type, values, types, starts in self._plan(kind, self.columns):
+                values = values.tolist()
+                if field_type in "sr":
+                    # Attributes missing in every object are skipped, so that most objects can take the fast path below
+                    if values.count(_ABSENT) == len(values):
+                        continue
+                    table = strings if field_type == "s" else style_refs
+                    if min(values, default=0) >= 0:
+                        values = list(map(table.__getitem__, values))
+                    else:
+                        if _ABSENT in values:
+                            partial.append(len(names))
+                        values = [table[v] if v >= 0 else None if v == _NONE else absent for v in values]
+                else:
+                    types = types.tolist()
+                    missing = types.count(_MISSING)
+                    if missing == len(types):
+                        continue
+                    if missing:
+                        partial.append(len(names))
+                    if field_type == "c":
+                        children, starts = built[name], starts.tolist()
+                        values = [children[starts[i]:starts[i + 1]] if t != _MISSING else absent for i, t in enumerate(types)]
+                    elif types.count(_INT) == len(types):
+                        values = list(map(int, values))
+                    elif types.count(_FLOAT) != len(types):
+                        values = [
+                            v if t == _FLOAT else int(v) if t == _INT else bool(v) if t == _BOOL else absent
+                            for v, t in zip(values, types)
+                        ]
+                names.append(name)
+                values_list.append(values)
+
+            cls = _LAYOUT_CLASSES[kind]
+            count = len(self.columns[kind + ".i:type"])
+            objects = lines if kind == "line" and lines is not None else [cls() for _ in range(count)]
+            rows = zip(*values_list)
+            if not partial:
+                for obj, row in zip(objects, rows):
+                    obj.__dict__.update(zip(names, row))
+            else:
+                # Objects missing some attributes take the others with a getter made once for every pattern of missing attributes
+                getters = {}
+                for obj, row in zip(objects, rows):
+                    pattern = tuple([row[k] is absent for k in partial])
+                    getter = getters.get(pattern)
+                    if getter is None:
+                        present = [k for k, value in enumerate(row) if value is not absent]
+                        get_values = operator.itemgetter(*present) if len(present) > 1 else lambda row, k=present[0]: (row[k],)
+                        getter = getters[pattern] = ([names[k] for k in present], get_values)
+                    obj.__dict__.update(zip(getter[0], getter[1](row)))
+            built[kind] = objects
+
+        return built["line"]
+
+    def to_line(self, i, styles):
+        # Creates only the line at index i with its words, syls and chars (see to_lines), converting just the values it needs
+        plans = self.__dict__.get("_plans")
+        if plans is None:
+            plans = self._plans = {kind: self._plan(kind, self.columns) for kind in _LAYOUT_FIELDS}
+        strings = self.strings
+
+        def build(kind, i):
+            obj = _LAYOUT_CLASSES[kind]()
+            attributes = obj.__dict__
+            for name, field_type, values, types, starts in plans[kind]:
+                if field_type in "sr":
+                    value = values[i]
+                    if value >= 0:
+                        attributes[name] = styles.get(strings[value]) if field_type == "r" else strings[value]
+                    elif value == _NONE:
+                        attributes[name] = None
+                    continue
+
+                value_type = types[i]
+                if value_type == _MISSING:
+                    continue
+                if field_type == "c":
+                    attributes[name] = [build(name, j) for j in range(starts[i], starts[i + 1])]
+                else:
+                    value = values[i]
+                    attributes[name] = value if value_type == _FLOAT else int(value) if value_type == _INT else bool(value)
+            return obj
+
+        return build("line", i)
+
+
+def _layout_chunk(lines, styles, meta, vertical_kanji):
+    # Runs in a worker process of Ass(workers=...): lays out some lines and returns them as columns, with the fonts found
+    for line in lines:
+        line.styleref = styles.get(line.style)
+        _layout_line(line, meta, vertical_kanji)
+    return _LayoutColumns.from_lines(lines), font_utility.resolved_fonts()
+
+
+class _SharedStrings:
+    # String table of a SharedLayout: UTF-8 data with n + 1 offsets, every string is decoded the first time it's used
+    def __init__(self, data, offsets):
+        self.data, self.offsets, self.decoded = data, offsets, {}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        value = self.decoded.get(i)
+        if value is None:
+            if not 0 <= i < len(self.offsets) - 1:
+                raise IndexError("string index out of range")
+            value = self.decoded[i] = str(self.data[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+        return value
+
+
+# SharedLayout objects attached by this process, by name
+_attached_layouts = {}
+
+
+def _shared_memory():
+    # multiprocessing.shared_memory, missing before Python 3.8
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        raise RuntimeError("Shared layouts require Python 3.8+ (multiprocessing.shared_memory is not available)")
+    return shared_memory
+
+
+class SharedLayout:
+    """Meta, styles and lines of an :class:`Ass` published in shared memory (see :func:`Ass.share_layout`), readable by other processes.
+
+    | Lines, words, syllables and chars are stored as one array for every attribute, with a table for their texts.
+      Other processes attach to the shared memory without copying it, and create only the lines they ask for.
+    | A SharedLayout can be given to other processes as it is (f.e. as argument of a function run by a process pool):
+      it is attached again on the other side, only once for every process.
+    | The process that created it must keep it open until the other processes are done, then close it (or use it in a ``with`` block).
+    | Shared layouts require Python 3.8+ (they use ``multiprocessing.shared_memory``).
+
+    Attributes:
+        name (str): Name of the shared memory block.
+        meta (:class:`Meta`): Meta of the Ass.
+        styles (dict of :class:`Style`): Styles of the Ass.
+
+    Examples:
+        ..  code-block:: python3
+
+            def work(layout, i):
+                line = layout.line(i)
+                return line.text, line.width
+
+            io = Ass("in.ass")
+            with io.share_layout() as layout:
+                with concurrent.futures.ProcessPoolExecutor() as executor:
+                    results = list(executor.map(work, [layout] * len(layout), range(len(layout))))
+    """
+    def __init__(self, memory, owner):
+        # Use Ass.share_layout or SharedLayout.attach to get a SharedLayout
+        self.name, self.__memory, self.__owner = memory.name, memory, owner
+
+        buf = memory.buf
+        header_size = struct.unpack_from("<Q", buf)[0]
+        blocks, self.meta, self.styles = pickle.loads(buf[8:8 + header_size])
+        start = -(-(8 + header_size) // 8) * 8
+
+        self.__views = {}
+        for key, (typecode, offset, count) in blocks.items():
+            view = buf[start + offset:start + offset + count * struct.calcsize(typecode)]
+            self.__views[key] = view.cast(typecode) if typecode != "B" else view
+        strings = _SharedStrings(self.__views.pop("strings:data"), self.__views.pop("strings:offsets"))
+        self.__columns = _LayoutColumns(self.__views, strings)
+
+    def __reduce__(self):
+        return SharedLayout.attach, (self.name,)
+
+    def __len__(self):
+        return len(self.__columns)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @classmethod
+    def create(cls, meta, styles, lines):
+        """Publishes meta, styles and lines in a new block of shared memory (usually called by :func:`Ass.share_layout`).
+
+        Parameters:
+            meta (:class:`Meta`): Meta to publish.
+            styles (dict of :class:`Style`): Styles to publish, by name.
+            lines (list of :class:`Line`): Lines to publish, with their words, syllables and chars.
+
+        Returns:
+            A SharedLayout object, owner of the shared memory.
+        """
+        shared_memory = _shared_memory()
+
+        columns = _LayoutColumns.from_lines(lines)
+        data = [string.encode("utf-8") for string in columns.strings]
+        offsets = array.array("q", [0])
+        for string in data:
+            offsets.append(offsets[-1] + len(string))
+        arrays = dict(columns.columns, **{"strings:offsets": offsets, "strings:data": array.array("B", b"".join(data))})
+
+        # Every array starts at a multiple of 8 bytes, after the header
+        blocks, size = {}, 0
+        for key, values in arrays.items():
+            blocks[key] = (values.typecode, size, len(values))
+            size += -(-values.itemsize * len(values) // 8) * 8
+        header = pickle.dumps((blocks, meta, styles))
+        start = -(-(8 + len(header)) // 8) * 8
+
+        memory = shared_memory.SharedMemory(create=True, size=start + size)
+        try:
+            buf = memory.buf
+            struct.pack_into("<Q", buf, 0, len(header))
+            buf[8:8 + len(header)] = header
+            for key, values in arrays.items():
+                offset = start + blocks[key][1]
+                buf[offset:offset + values.itemsize * len(values)] = values.tobytes()
+            del buf
+            return cls(memory, True)
+        except BaseException:
+            memory.close()
+            memory.unlink()
+            raise
+
+    @classmethod
+    def attach(cls, name):
+        """Attaches to a SharedLayout created by another process (once for every process, the same object is returned after the first time).
+
+        Parameters:
+            name (str): Name of the shared memory block (see :attr:`name`).
+
+        Returns:
+            A SharedLayout object.
+        """
+        layout = _attached_layouts.get(name)
+        if layout is None:
+            shared_memory = _shared_memory()
+            try:
+                # Only the owner of the memory has to free it (Python >= 3.13)
+                memory = shared_memory.SharedMemory(name, track=False)
+            except TypeError:
+                memory = shared_memory.SharedMemory(name)
+            layout = _attached_layouts[name] = cls(memory, False)
+        return layout
+
+    def line(self, i):
+        """Creates the line at index i, with its words, syllables and chars referring to :attr:`styles`.
+
+        Parameters:
+            i (int): Index of the line.
+
+        Returns:
+            A new :class:`Line` object.
+        """
+        if not -len(self) <= i < len(self):
+            raise IndexError("line index out of range")
+        return self.__columns.to_line(i % len(self), self.styles)
+
+    def lines(self):
+        """Creates all the lines (faster than calling :func:`line` for every index).
+
+        Returns:
+            A list of new :class:`Line` objects.
+        """
+        return self.__columns.to_lines(self.styles)
+
+    def close(self):
+        """Detaches from the shared memory, also freeing it if this is the SharedLayout created by :func:`Ass.share_layout`.
+        Lines already created can still be used.
+        """
+        if self.__memory is None:
+            return
+        for view in self.__views.values():
+            view.release()
+        strings = self.__columns.strings
+        strings.data.release()
+        strings.offsets.release()
+        self.__memory.close()
+        if self.__owner:
+            self.__memory.unlink()
+        if _attached_layouts.get(self.name) is self:
+            del _attached_layouts[self.name]
+        self.__memory = None
+
+
 class Ass:
     """Contains all the informations about a file in the ASS format and the methods to work with it for both input and output.
 
@@ -398,6 +1255,12 @@ class Ass:
         keep_original (bool): If True, you will find all the lines of the input file commented before the new lines generated.
         extended (bool): Calculate more informations from lines (usually you will not have to touch this).
         vertical_kanji (bool): If True, line text with alignment 4, 5 or 6 will be positioned vertically.
+        incremental (bool): If True, the lines of a previous parse of the same input file (in this process) whose text and style didn't change are reused instead of being computed again (DEFAULT: value of INCREMENTAL_PARSE).
+        font_backend (str): Backend used to read the fonts of the styles, "native" or "sfnt" (see :class:`Font`) (DEFAULT: value of FONT_BACKEND in font_utility).
+        warmup (bool): If True, the chars of all the lines are measured in parallel processes before the layout (see :func:`pyonfx.font_utility.warm_up_fonts`, the script needs an ``if __name__ == "__main__":`` guard), useful for big scripts on many-core machines.
+        workers (int): If greater than 1, lines are laid out in chunks by this number of processes (DEFAULT: 1, everything in this process).
+            With the "spawn" and "forkserver" start methods (the default on Windows, and on Linux since Python 3.14) every new process runs the script again,
+            so the script needs an ``if __name__ == "__main__":`` guard (see the example), else the lines are laid out in this process after a warning.
 
     Attributes:
         path_input (str): Path for input file (absolute).
@@ -412,15 +1275,22 @@ class Ass:
 
             io = Ass("in.ass")
             meta, styles, lines = io.get_data()
+
+        With workers (or warmup), the code of the script goes under the guard:
+
+        ..  code-block:: python3
+
+            if __name__ == "__main__":
+                io = Ass("in.ass", workers=4)
+                meta, styles, lines = io.get_data()
     """
 
-    def __init__(self, path_input="", path_output="Output.ass", keep_original=True, extended=True, vertical_kanji=True):
+    def __init__(self, path_input="", path_output="Output.ass", keep_original=True, extended=True, vertical_kanji=True, incremental=None, font_backend=None, warmup=False, workers=1):
         # Starting to take process time
         self.__saved = False
         self.__plines = 0
         self.__ptime = time.time()
 
-        self.meta, self.styles, self.lines = Meta(), {}, []
         # Getting absolute sub file path
         dirname = os.path.dirname(os.path.abspath(sys.argv[0]))
         if not os.path.isabs(path_input):
@@ -438,8 +1308,29 @@ class Ass:
 
         self.path_input = path_input
         self.path_output = path_output
+
+        self.__keep_original = keep_original
+        self.__extended = extended
+        self.__vertical_kanji = vertical_kanji
+        self.__incremental = INCREMENTAL_PARSE if incremental is None else incremental
+        self.__font_backend = font_backend or font_utility.FONT_BACKEND
+        self.__warmup = warmup
+        self.__workers = workers or 1
+
+        # Taking the layout of the last parse of this file, if we can reuse it
+        self.__layout_cache = _layout_caches.get(self.path_input) if self.__incremental else None
+
+        self.__parse()
+
+    def __parse(self):
+        # Reads the input file, filling meta, styles and lines (reusing unchanged lines from the layout cache, if any)
+        self.meta, self.styles, self.lines = Meta(), {}, []
         self.__output = []
 
+        # Raw definitions of styles and lines, used as keys for the next incremental parse
+        styles_raw, lines_raw = {}, []
+        cache = self.__layout_cache
+
         section = ""
         li = 0
         for line in open(self.path_input, "r", encoding="utf-8-sig"):
@@ -498,8 +1389,18 @@ class Ass:
                     # Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour,
                     # Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle,
                     # BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+                    raw = style[1]
                     style = [el for el in style[1].split(',')]
+                    styles_raw[style[0]] = raw
+
+                    # Unchanged style from the last parse? Let's keep the old object, so its lines can be reused
+                    if cache and style[0] in cache['styles'] and cache['styles'][style[0]][0] == raw \
+                            and cache['styles'][style[0]][1].font_backend == self.__font_backend:
+                        self.styles[style[0]] = cache['styles'][style[0]][1]
+                        continue
+
                     tmp = Style()
+                    tmp.font_backend = self.__font_backend
 
                     tmp.fontname = style[1]
                     tmp.fontsize = float(style[2])
@@ -546,7 +1447,7 @@ class Ass:
             # Parsing Dialogues
             elif section == "Events":
                 # Appending line to output (commented) if keep_original is True
-                if keep_original:
+                if self.__keep_original:
                     self.__output.append(re.sub(r"^(Dialogue|Comment):", "Comment:", line))
 
                 # Analyzing line
@@ -555,6 +1456,7 @@ class Ass:
                 if line:
                     # Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
                     tmp = Line()
+                    lines_raw.append(line[0])
 
                     tmp.i = li
                     li += 1
@@ -580,456 +1482,146 @@ class Ass:
 
                     self.lines.append(tmp)
 
+        # Saving what is needed to reuse this parse later
+        self.__layout_cache = {
+            'layout': (getattr(self.meta, 'play_res_x', None), getattr(self.meta, 'play_res_y', None), self.__vertical_kanji, self.__font_backend),
+            'styles': {name: (raw, self.styles[name]) for name, raw in styles_raw.items()},
+            'lines': {},
+        }
+        if self.__incremental:
+            _layout_caches[self.path_input] = self.__layout_cache
 
         # Adding informations to lines and meta?
-        if not extended:
+        if not self.__extended:
             return None
 
-        lines_by_styles = {}
+        # Lines of the last parse can be reused only if they have been laid out with the same resolution, font backend and fonts
+        # (fonts found are kept until the font caches are cleared, only the ones known by this process can be compared)
+        if cache and (cache['layout'] != self.__layout_cache['layout'] or cache.get('font_generation') != font_utility._font_generation):
+            cache = None
+        if cache:
+            fonts = font_utility.resolved_fonts()
+            for name, resolved in cache.get('fonts', {}).items():
+                style = self.styles.get(name)
+                current = fonts.get((style.fontname, style.bold, style.italic)) if style else None
+                if current is not None and resolved is not None and current != resolved:
+                    cache = None
+                    break
+
+        # Measuring all the distinct chars of every style at once, in parallel
+        if self.__warmup:
+            chars_by_style = {}
+            for line in self.lines:
+                if line.style in self.styles:
+                    chars_by_style.setdefault(line.style, {" "}).update(re.sub(r"\{.*?\}", "", line.raw_text))
+            font_utility.warm_up_fonts([(self.styles[name], chars) for name, chars in chars_by_style.items()])
+
         # Let the fun begin (Pyon!)
-        for li, line in enumerate(self.lines):
-            try:
-                line.styleref = self.styles[line.style]
-            except KeyError:
-                line.styleref = None
+        new_lines = []
+        for li, (line, raw) in enumerate(zip(self.lines, lines_raw)):
+            line.styleref = self.styles.get(line.style)
+
+            # Do we already have this line, with its style unchanged?
+            old_lines = cache['lines'].get(raw) if cache else None
+            if old_lines and old_lines[0].styleref is line.styleref:
+                old_line = old_lines.pop(0)
+                old_line.i = line.i
+                self.lines[li] = line = old_line
+            else:
+                new_lines.append(line)
+
+            self.__layout_cache['lines'].setdefault(raw, []).append(line)
+
+        fonts = {}
+        if self.__workers > 1 and len(new_lines) > 1:
+            fonts = self.__layout_parallel(new_lines)
+        else:
+            for line in new_lines:
+                _layout_line(line, self.meta, self.__vertical_kanji)
+
+        # Fonts used by this parse, to be compared by the next one
+        if self.__incremental:
+            fonts.update(font_utility.resolved_fonts())
+            styles = {line.style: line.styleref for line in self.lines if line.styleref}
+            self.__layout_cache['fonts'] = {
+                name: fonts.get((style.fontname, style.bold, style.italic)) for name, style in styles.items()
+            }
+            self.__layout_cache['font_generation'] = font_utility._font_generation
 
+        # Add durations between dialogs
+        lines_by_styles = {}
+        for line in self.lines:
             # Append dialog to styles (for leadin and leadout later)
             if line.style not in lines_by_styles:
                 lines_by_styles[line.style] = []
             lines_by_styles[line.style].append(line)
 
-            line.duration = line.end_time - line.start_time
-            line.text = re.sub(r"\{.*?\}", "", line.raw_text)
-
-            # Add dialog text sizes and positions (if possible)
-            if line.styleref:
-                # Creating a Font object and saving return values of font.get_metrics() for the future
-                font = Font(line.styleref)
-                font_metrics = font.get_metrics()
-
-                line.width, line.height = font.get_text_extents(line.text)
-                line.ascent, line.descent, line.internal_leading, line.external_leading = font_metrics
-                if self.meta.play_res_x > 0 and self.meta.play_res_y > 0:
-                    # Horizontal position
-                    tmp_margin_l = line.margin_l if line.margin_l != 0 else line.styleref.margin_l
-                    tmp_margin_r = line.margin_r if line.margin_r != 0 else line.styleref.margin_r
-
-                    if (line.styleref.alignment-1) % 3 == 0:
-                        line.left = tmp_margin_l
-                        line.center = line.left + line.width / 2
-                        line.right = line.left + line.width
-                        line.x = line.left
-                    elif (line.styleref.alignment-2) % 3 == 0:
-                        line.left = self.meta.play_res_x / 2 - line.width / 2 + tmp_margin_l / 2 - tmp_margin_r / 2
-                        line.center = line.left + line.width / 2
-                        line.right = line.left + line.width
-                        line.x = line.center
-                    else:
-                        line.left = self.meta.play_res_x - tmp_margin_r - line.width
-                        line.center = line.left + line.width / 2
-                        line.right = line.left + line.width
-                        line.x = line.right
-
-                    # Vertical position
-                    if line.styleref.alignment > 6:
-                        line.top = line.margin_v if line.margin_v != 0 else line.styleref.margin_v
-                        line.middle = line.top + line.height / 2
-                        line.bottom = line.top + line.height
-                        line.y = line.top
-                    elif line.styleref.alignment > 3:
-                        line.top = self.meta.play_res_y / 2 - line.height / 2
-                        line.middle = line.top + line.height / 2
-                        line.bottom = line.top + line.height
-                        line.y = line.middle
-                    else:
-                        line.top = self.meta.play_res_y - (line.margin_v if line.margin_v != 0 else line.styleref.margin_v) - line.height
-                        line.middle = line.top + line.height / 2
-                        line.bottom = line.top + line.height
-                        line.y = line.bottom
-
-                # Calculating space width and saving spacing
-                space_width = font.get_text_extents(" ")[0]
-                style_spacing = line.styleref.spacing
-
-                # Adding words
-                line.words = []
-
-                wi = 0
-                for prespace, word_text, postspace in re.findall(r"(\s*)([^\s]+)(\s*)", line.text):
-                    word = Word()
-
-                    word.i = wi
-                    wi += 1
-
-                    word.start_time = line.start_time
-                    word.end_time = line.end_time
-                    word.duration = line.duration
-
-                    word.styleref = line.styleref
-                    word.text = word_text
-
-                    word.prespace = len(prespace)
-                    word.postspace = len(postspace)
-
-                    word.width, word.height = font.get_text_extents(word.text)
-                    word.ascent, word.descent, word.internal_leading, word.external_leading = font_metrics
-
-                    line.words.append(word)
-
-                # Calculate word positions with all words data already available
-                if line.words and self.meta.play_res_x > 0 and self.meta.play_res_y > 0:
-                    if line.styleref.alignment > 6 or line.styleref.alignment < 4:
-                        cur_x = line.left
-                        for word in line.words:
-                            # Horizontal position
-                            cur_x = cur_x + word.prespace * (space_width + style_spacing)
-
-                            word.left = cur_x
-                            word.center = word.left + word.width / 2
-                            word.right = word.left + word.width
-
-                            if (line.styleref.alignment-1) % 3 == 0:
-                                word.x = word.left
-                            elif (line.styleref.alignment-2) % 3 == 0:
-                                word.x = word.center
-                            else:
-                                word.x = word.right
-
-                            # Vertical position
-                            word.top = line.top
-                            word.middle = line.middle
-                            word.bottom = line.bottom
-                            word.y = line.y
-
-                            # Updating cur_x
-                            cur_x = cur_x + word.width + word.postspace * (space_width + style_spacing) + style_spacing
-                    else:
-                        max_width, sum_height = 0, 0
-                        for word in line.words:
-                            max_width = max(max_width, word.width)
-                            sum_height = sum_height + word.height
-
-                        cur_y = x_fix = self.meta.play_res_y / 2 - sum_height / 2
-                        for word in line.words:
-                            # Horizontal position
-                            x_fix = (max_width - word.width) / 2
-
-                            if line.styleref.alignment == 4:
-                                word.left = line.left + x_fix
-                                word.center = word.left + word.width / 2
-                                word.right = word.left + word.width
-                                word.x = word.left
-                            elif line.styleref.alignment == 5:
-                                word.left = self.meta.play_res_x / 2 - word.width / 2
-                                word.center = word.left + word.width / 2
-                                word.right = word.left + word.width
-                                word.x = word.center
-                            else:
-                                word.left = line.right - word.width - x_fix
-                                word.center = word.left + word.width / 2
-                                word.right = word.left + word.width
-                                word.x = word.right
-
-                            # Vertical position
-                            word.top = cur_y
-                            word.middle = word.top + word.height / 2
-                            word.bottom = word.top + word.height
-                            word.y = word.middle
-                            cur_y = cur_y + word.height
-
-
-                # Search for dialog's text chunks, to later create syllables
-                # A text chunk is a text with one or more {tags} preceding it
-                # Tags can be some text or empty string
-                text_chunks = []
-                tag_pattern = re.compile(r"(\{.*?\})+")
-                tag = tag_pattern.search(line.raw_text)
-                word_i = 0
-
-                if not tag:
-                    # No tags found
-                    text_chunks.append({'tags': "", 'text': line.raw_text})
-                else:
-                    # First chunk without tags?
-                    if tag.start() != 0:
-                        text_chunks.append({'tags': "", 'text': line.raw_text[0:tag.start()]})
-
-                    # Searching for other tags
-                    while True:
-                        next_tag = tag_pattern.search(line.raw_text, tag.end())
-                        tmp = {
-                            # Note that we're removing possibles '}{' caused by consecutive tags
-                            'tags': line.raw_text[tag.start()+1:tag.end()-1].replace('}{', ''),
-                            'text': line.raw_text[tag.end():(next_tag.start() if next_tag else None)],
-                            'word_i': word_i
-                        }
-                        text_chunks.append(tmp)
-
-                        # If there are some spaces after text, then we're at the end of the current word
-                        if re.match(r"(.*?)(\s+)$", tmp['text']):
-                            word_i = word_i + 1
-
-                        if not next_tag:
-                            break
-                        tag = next_tag
-
-                # Adding syls
-                si = 0
-                last_time = 0
-                inline_fx = ''
-                syl_tags_pattern = re.compile(r"(.*?)\\[kK][of]?(\d+)(.*)")
-
-                line.syls = []
-                for tc in text_chunks:                    
-                    # If we don't have at least one \k tag, everything is invalid
-                    if not syl_tags_pattern.match(tc['tags']):
-                        line.syls.clear()
-                        break
-                    
-                    posttags = tc['tags']
-                    syls_in_text_chunk = []
-                    while True:
-                        # Are there \k in posttags?
-                        tags_syl = syl_tags_pattern.match(posttags)
-                        
-                        if not tags_syl:
-                            # Append all the temporary syls, except last one
-                            for syl in syls_in_text_chunk[:-1]:
-                                curr_inline_fx = re.search(r"\\\-([^\\]+)", syl.tags)
-                                if curr_inline_fx:
-                                    inline_fx = curr_inline_fx[1]
-                                syl.inline_fx = inline_fx
-                                
-                                # Hidden syls are treated like empty syls
-                                syl.prespace, syl.text, syl.postspace = 0, '', 0
-
-                                syl.width, syl.height = font.get_text_extents('')
-                                syl.ascent, syl.descent, syl.internal_leading, syl.external_leading = font_metrics
-
-                                line.syls.append(syl)
-                            
-                            # Append last syl
-                            syl = syls_in_text_chunk[-1]
-                            syl.tags += posttags
-                            
-                            curr_inline_fx = re.search(r"\\\-([^\\]+)", syl.tags)
-                            if curr_inline_fx:
-                                inline_fx = curr_inline_fx[1]
-                            syl.inline_fx = inline_fx
-                            
-                            if tc['text'].isspace():
-                                syl.prespace, syl.text, syl.postspace = 0, tc['text'], 0
-                            else:
-                                syl.prespace, syl.text, syl.postspace = re.match(r"(\s*)(.*?)(\s*)$", tc['text']).groups()
-                                syl.prespace, syl.postspace = len(syl.prespace), len(syl.postspace)
-
-                            syl.width, syl.height = font.get_text_extents(syl.text)
-                            syl.ascent, syl.descent, syl.internal_leading, syl.external_leading = font_metrics
-
-                            line.syls.append(syl)
-                            break
-
-                        pretags, kdur, posttags = tags_syl.groups()
-
-                        # Create a Syllable object
-                        syl = Syllable()
-
-                        syl.start_time = last_time
-                        syl.end_time = last_time + int(kdur) * 10
-                        syl.duration = int(kdur) * 10
-
-                        syl.styleref = line.styleref
-                        syl.tags = pretags
-
-                        syl.i = si
-                        syl.word_i = tc['word_i']
-
-                        syls_in_text_chunk.append(syl)
-
-                        # Update working variable
-                        si += 1
-                        last_time = syl.end_time
-
-                # Calculate syllables positions with all syllables data already available
-                if line.syls and self.meta.play_res_x > 0 and self.meta.play_res_y > 0:
-                    if line.styleref.alignment > 6 or line.styleref.alignment < 4 or not vertical_kanji:
-                        cur_x = line.left
-                        for syl in line.syls:
-                            cur_x = cur_x + syl.prespace * (space_width + style_spacing)
-                            # Horizontal position
-                            syl.left = cur_x
-                            syl.center = syl.left + syl.width / 2
-                            syl.right = syl.left + syl.width
-
-                            if (line.styleref.alignment-1) % 3 == 0:
-                                syl.x = syl.left
-                            elif (line.styleref.alignment-2) % 3 == 0:
-                                syl.x = syl.center
-                            else:
-                                syl.x = syl.right
-
-                            cur_x = cur_x + syl.width + syl.postspace * (space_width + style_spacing) + style_spacing
-
-                            # Vertical position
-                            syl.top = line.top
-                            syl.middle = line.middle
-                            syl.bottom = line.bottom
-                            syl.y = line.y
-
-                    else: # Kanji vertical position
-                        max_width, sum_height = 0, 0
-                        for syl in line.syls:
-                            max_width = max(max_width, syl.width)
-                            sum_height = sum_height + syl.height
-
-                        cur_y = self.meta.play_res_y / 2 - sum_height / 2
-
-                        # Fixing line positions
-                        line.top = cur_y
-                        line.middle = self.meta.play_res_y / 2
-                        line.bottom = line.top + sum_height
-                        line.width = max_width
-                        line.height = sum_height
-                        if line.styleref.alignment == 4:
-                            line.center = line.left + max_width / 2
-                            line.right = line.left + max_width
-                        elif line.styleref.alignment == 5:
-                            line.left = line.center - max_width / 2
-                            line.right = line.left + max_width
-                        else:
-                            line.left = line.right - max_width
-                            line.center = line.left + max_width / 2
-
-                        for syl in line.syls:
-                            # Horizontal position
-                            x_fix = (max_width - syl.width) / 2
-                            if line.styleref.alignment == 4:
-                                syl.left = line.left + x_fix
-                                syl.center = syl.left + syl.width / 2
-                                syl.right = syl.left + syl.width
-                                syl.x = syl.left
-                            elif line.styleref.alignment == 5:
-                                syl.left = line.center - syl.width / 2
-                                syl.center = syl.left + syl.width / 2
-                                syl.right = syl.left + syl.width
-                                syl.x = syl.center
-                            else:
-                                syl.left = line.right - syl.width - x_fix
-                                syl.center = syl.left + syl.width / 2
-                                syl.right = syl.left + syl.width
-                                syl.x = syl.right
-
-                            # Vertical position
-                            syl.top = cur_y
-                            syl.middle = syl.top + syl.height / 2
-                            syl.bottom = syl.top + syl.height
-                            syl.y = syl.middle
-                            cur_y = cur_y + syl.height
-
-                # Adding chars
-                line.chars = []
-
-                # If we have syls in line, we prefert to work with them to provide more informations
-                if line.syls:
-                    words_or_syls = line.syls
-                else:
-                    words_or_syls = line.words
-
-                # Getting chars
-                char_index = 0
-                for el in words_or_syls:
-                    el_text = "{}{}{}".format(" "*el.prespace, el.text, " "*el.postspace)
-                    for ci, char_text in enumerate(list(el_text)):
-                        char = Char()
-                        char.i = ci
-
-                        # If we're working with syls, we can add some indexes
-                        char.i = char_index
-                        char_index += 1
-                        if line.syls:
-                            char.word_i = el.word_i
-                            char.syl_i = el.i
-                            char.syl_char_i = ci
-                        else:
-                            char.word_i = el.i
-
-                        # Adding last fields based on the existance of syls or not
-                        char.start_time = el.start_time
-                        char.end_time = el.end_time
-                        char.duration = el.duration
-
-                        char.styleref = line.styleref
-                        char.text = char_text
-
-                        char.width, char.height = font.get_text_extents(char.text)
-                        char.ascent, char.descent, char.internal_leading, char.external_leading = font_metrics
-
-                        line.chars.append(char)
-
-                # Calculate character positions with all characters data already available
-                if line.chars and self.meta.play_res_x > 0 and self.meta.play_res_y > 0:
-                    if line.styleref.alignment > 6 or line.styleref.alignment < 4:
-                        cur_x = line.left
-                        for char in line.chars:
-                            # Horizontal position
-                            char.left = cur_x
-                            char.center = char.left + char.width / 2
-                            char.right = char.left + char.width
-
-                            if (line.styleref.alignment-1) % 3 == 0:
-                                char.x = char.left
-                            elif (line.styleref.alignment-2) % 3 == 0:
-                                char.x = char.center
-                            else:
-                                char.x = char.right
-
-                            cur_x = cur_x + char.width + style_spacing
-
-                            # Vertical position
-                            char.top = line.top
-                            char.middle = line.middle
-                            char.bottom = line.bottom
-                            char.y = line.y
-                    else:
-                        max_width, sum_height = 0, 0
-                        for char in line.chars:
-                            max_width = max(max_width, char.width)
-                            sum_height = sum_height + char.height
-
-                        cur_y = x_fix = self.meta.play_res_y / 2 - sum_height / 2
-                        for char in line.chars:
-                            # Horizontal position
-                            x_fix = (max_width - char.width) / 2
-                            if line.styleref.alignment == 4:
-                                char.left = line.left + x_fix
-                                char.center = char.left + char.width / 2
-                                char.right = char.left + char.width
-                                char.x = char.left
-                            elif line.styleref.alignment == 5:
-                                char.left = self.meta.play_res_x / 2 - char.width / 2
-                                char.center = char.left + char.width / 2
-                                char.right = char.left + char.width
-                                char.x = char.center
-                            else:
-                                char.left = line.right - char.width - x_fix
-                                char.center = char.left + char.width / 2
-                                char.right = char.left + char.width
-                                char.x = char.right
-
-                            # Vertical position
-                            char.top = cur_y
-                            char.middle = char.top + char.height / 2
-                            char.bottom = char.top + char.height
-                            char.y = char.middle
-                            cur_y = cur_y + char.height
-
-        # Add durations between dialogs
         for style in lines_by_styles:
             lines_by_styles[style].sort(key=lambda x: x.start_time)
             for li, line in enumerate(lines_by_styles[style]):
                 line.leadin = 1000.1 if li == 0 else line.start_time - lines_by_styles[style][li-1].end_time
                 line.leadout = 1000.1 if li == len(lines_by_styles[style])-1 else lines_by_styles[style][li+1].start_time - line.end_time
 
+    def __layout_parallel(self, lines):
+        # Lays out the lines in chunks with a pool of processes (every one with its own fonts),
+        # getting back their attributes as columns to fill the objects of this process, and the fonts they found
+        size = -(-len(lines) // (self.__workers * LAYOUT_CHUNKS_PER_WORKER))
+        chunks = [lines[i:i + size] for i in range(0, len(lines), size)]
+
+        fonts, done = {}, 0
+        try:
+            with concurrent.futures.ProcessPoolExecutor(min(self.__workers, len(chunks)), mp_context=font_utility.MP_CONTEXT) as executor:
+                futures = []
+                for chunk in chunks:
+                    styles = {line.style: self.styles[line.style] for line in chunk if line.style in self.styles}
+                    futures.append(executor.submit(_layout_chunk, chunk, styles, self.meta, self.__vertical_kanji))
+
+                for chunk, future in zip(chunks, futures):
+                    columns, chunk_fonts = future.result()
+                    columns.to_lines(self.styles, chunk)
+                    fonts.update(chunk_fonts)
+                    done += 1
+        except BrokenProcessPool:
+            # F.e. processes started with "spawn" running again a script without the __main__ guard
+            print("[WARNING] Processes for the layout could not be started (is the script under an 'if __name__ == \"__main__\":' guard?), "
+                  "laying out the lines in this process.")
+            for chunk in chunks[done:]:
+                for line in chunk:
+                    _layout_line(line, self.meta, self.__vertical_kanji)
+        return fonts
+
+    def reload(self):
+        """Reads again the input file, computing informations only for the lines that changed since the last parse.
+
+        Lines whose text, timings and style are unchanged are reused as they are, so this is much faster
+        than creating a new Ass object when you are tweaking a few lines of a big file.
+        Everything written with :func:`write_line` so far is discarded.
+
+        Note:
+            Since unchanged lines are shared between the two parses, always work on copies (see :func:`Line.copy`) if you need to edit them.
+
+        Returns:
+            A pointer to the current object.
+        """
+        self.__saved = False
+        self.__plines = 0
+        self.__ptime = time.time()
+
+        self.__parse()
+        return self
+
+    def share_layout(self):
+        """Publishes :attr:`meta`, :attr:`styles` and :attr:`lines` in shared memory, so that other processes
+        (f.e. the ones generating effects in parallel) can read them without parsing the file again nor receiving copies of the lines.
+
+        Note:
+            Requires Python 3.8+ (a RuntimeError is raised on older versions).
+
+        Returns:
+            A :class:`SharedLayout` object, that must be closed when the other processes are done (or used in a ``with`` block).
+        """
+        return SharedLayout.create(self.meta, self.styles, self.lines)
+
     def get_data(self):
         """Utility function to retrieve easily meta styles and lines.
 
@@ -1072,9 +1664,11 @@ class Ass:
             quiet (bool): If True, you will not get printed any message.
         """
 
-        # Writing to file
-        with open(self.path_output, 'w', encoding="utf-8-sig") as f:
+        # Writing to a temporary file and then replacing the output, so that a player reloading it never reads it half written
+        path_tmp = "%s.%d.tmp" % (self.path_output, os.getpid())
+        with open(path_tmp, 'w', encoding="utf-8-sig") as f:
             f.writelines(self.__output)
+        os.replace(path_tmp, self.path_output)
         self.__saved = True
 
         if not quiet:
@@ -1094,11 +1688,20 @@ class Ass:
             print("[WARNING] You've tried to open the output with Aegisub before having saved. Check your code.")
             return -1
 
+        # In watch mode the player is opened just once, without waiting for it
+        if WATCH_MODE:
+            if ("aegisub", self.path_output) in _opened_players:
+                return 0
+            _opened_players.add(("aegisub", self.path_output))
+
         if sys.platform == "win32":
             os.startfile(self.path_output)
         else:
             try:
-                subprocess.call(["aegisub", os.path.abspath(self.path_output)])
+                if WATCH_MODE:
+                    subprocess.Popen(["aegisub", os.path.abspath(self.path_output)])
+                else:
+                    subprocess.call(["aegisub", os.path.abspath(self.path_output)])
             except FileNotFoundError:
                 print("[WARNING] Aegisub not found.")
                 return -1
@@ -1142,8 +1745,17 @@ class Ass:
 
         cmd.append("--sub-file=" + self.path_output)
 
+        # In watch mode the player is opened just once, without waiting for it
+        if WATCH_MODE:
+            if ("mpv", self.path_output) in _opened_players:
+                return 0
+            _opened_players.add(("mpv", self.path_output))
+
         try:
-            subprocess.call(cmd)
+            if WATCH_MODE:
+                subprocess.Popen(cmd)
+            else:
+                subprocess.call(cmd)
         except FileNotFoundError:
             print("[WARNING] MPV not found in your environment variables.\n"\
                   "Please refer to the documentation's \"Quick Start\" section if you don't know how to solve it.")
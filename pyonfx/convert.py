@@ -17,7 +17,84 @@
 
 import re
 import math
+import functools
+import threading
+from collections import namedtuple
+from . import font_utility
 from .font_utility import Font
+from .shape import Shape, DistanceField
+from .png import read_png
+
+# CONFIGURATION
+FONT_CACHE_SIZE = 8 # Maximum number of fonts kept open by every thread for Convert.text_to_shape and Convert.text_to_pixels
+GLYPH_CACHE_SIZE = 4096 # Maximum number of text outlines and glyph coverage masks kept in memory by Convert.text_to_shape and Convert.text_to_pixels
+GLYPH_SUBPIXEL_STEPS = 4 # Number of subpixel offsets (per axis) a glyph can be rasterized at by Convert.text_to_pixels
+
+# Style values used by Font, hashable so that they can be the key of the caches (and can be changed without touching the original style)
+_FontStyle = namedtuple("_FontStyle", "fontname bold italic underline strikeout fontsize scale_x scale_y spacing font_backend")
+
+# Fonts keep a drawing context of the native font system, which can't be shared between threads
+_thread_fonts = threading.local()
+
+
+def _font_style(style, scale_x=None, scale_y=None, spacing=None):
+    return _FontStyle(
+        style.fontname, style.bold, style.italic, style.underline, style.strikeout, style.fontsize,
+        style.scale_x if scale_x is None else scale_x,
+        style.scale_y if scale_y is None else scale_y,
+        style.spacing if spacing is None else spacing,
+        getattr(style, "font_backend", None)
+    )
+
+
+def _font(style):
+    # Font of the current thread for the given style, the least recently created one is closed when there are too many of them
+    fonts = getattr(_thread_fonts, "fonts", None)
+    if fonts is None:
+        fonts = _thread_fonts.fonts = {}
+    font = fonts.get(style)
+    if font is None:
+        if len(fonts) >= FONT_CACHE_SIZE:
+            del fonts[next(iter(fonts))]
+        font = fonts[style] = Font(style)
+    return font
+
+
+@functools.lru_cache(maxsize=GLYPH_CACHE_SIZE)
+def _text_shape(style, text):
+    # Drawing commands of the text outline (as a string, so that every caller can build its own Shape object from it)
+    return _font(style).text_to_shape(text).drawing_cmds
+
+
+@functools.lru_cache(maxsize=GLYPH_CACHE_SIZE)
+def _glyph_advance(style, char):
+    return _font(style).get_text_extents(char)[0]
+
+
+@functools.lru_cache(maxsize=GLYPH_CACHE_SIZE)
+def _glyph_pixels(style, char, offset_x, offset_y):
+    # Coverage mask of a single glyph drawn with its origin in (offset_x, offset_y), as (x, y, alpha) tuples
+    shape = Shape(_text_shape(style, char)).move(offset_x, offset_y)
+    return tuple((int(p['x']), int(p['y']), p['alpha']) for p in Convert.shape_to_pixels(shape))
+
+
+def _image_rows(image, width, quantize):
+    # RGBA rows of a PNG image or of raw RGBA data, with every channel rounded to a multiple of quantize
+    if width is None:
+        width, _, rows = read_png(image)
+        rows = [bytes(row) for row in rows]
+    else:
+        data = bytes(image)
+        stride = 4 * width
+        if width <= 0 or len(data) % stride:
+            raise ValueError("Raw RGBA data size is not a multiple of the given width")
+        rows = [data[i:i + stride] for i in range(0, len(data), stride)]
+
+    if quantize:
+        table = bytes(min(255, round(v / quantize) * quantize) for v in range(256))
+        rows = [row.translate(table) for row in rows]
+    return width, rows
+
 
 class Convert:
     """
@@ -122,6 +199,9 @@ class Convert:
 
         **Tips:** *You can easily create impressive deforming effects.*
 
+        The style of the object is never modified (scale values are passed to the font) and outlines are cached for every
+        style, scale and text, so this function can be called from many threads at once and repeated texts are converted only once.
+
         Parameters:
             obj (Line, Word, Syllable or Char): An object of class Line, Word, Syllable or Char.
             fscx (float, optional): The scale_x value for the shape.
@@ -137,28 +217,9 @@ class Convert:
                 line.text = "{\\\\an7\\\\pos(%.3f,%.3f)\\\\p1}%s" % (line.left, line.top, convert.text_to_shape(line))
                 io.write_line(line)
         """
-        # Obtaining information and editing values of style if requested
-        original_scale_x = obj.styleref.scale_x
-        original_scale_y = obj.styleref.scale_y
-
-        # Editing temporary the style to properly get the shape
-        if fscx is not None:
-            obj.styleref.scale_x = fscx
-        if fscy is not None:
-            obj.styleref.scale_y = fscy
-
-        # Obtaining font information from style and obtaining shape
-        font = Font(obj.styleref)
-        shape = font.text_to_shape(obj.text)
-        # Clearing resources to not let overflow errors take over
-        del font
-
-        # Restoring values of style and returning the shape converted
-        if fscx is not None:
-            obj.styleref.scale_x = original_scale_x
-        if fscy is not None:
-            obj.styleref.scale_y = original_scale_y
-        return shape
+        # Scale overrides go in a copy of the style values, so that the shared style is never modified
+        style = _font_style(obj.styleref, fscx, fscy)
+        return Shape(_text_shape(style, obj.text))
 
     @staticmethod
     def text_to_clip(obj, an=5, fscx=None, fscy=None):
@@ -236,9 +297,13 @@ class Convert:
 
         **Tips:** *It allows easy creation of text decaying or light effects.*
 
+        The coverage of every glyph is cached for each style and subpixel offset (see ``GLYPH_SUBPIXEL_STEPS``),
+        so the same letters of the same style are rasterized only once, no matter how many times they appear.
+        Check :func:`glyph_cache_info` to see how well the cache is doing.
+
         Parameters:
             obj (Line, Word, Syllable or Char): An object of class Line, Word, Syllable or Char.
-            supersampling (int): Value used for supersampling. Higher value means smoother and more precise anti-aliasing (and more computational time for generation).
+            supersampling (int): Not used anymore (anti-aliasing is exact), kept for compatibility.
 
         Returns:
             A list of dictionaries representing each individual pixel of the input text styled.
@@ -256,8 +321,65 @@ class Convert:
                     line.text = "{\\p1\\pos(%d,%d)%s}%s" % (x, y, alpha, p_sh)
                     io.write_line(line)
         """
-        shape = Convert.text_to_shape(obj).move(obj.left % 1, obj.top % 1)
-        return Convert.shape_to_pixels(shape, supersampling)
+        style = obj.styleref
+        key = _font_style(style, spacing=0)
+        hspace = style.spacing * style.scale_x / 100
+        steps = GLYPH_SUBPIXEL_STEPS
+
+        # Kerning pairs are applied between glyphs like the font does for whole texts
+        font = _font(key)
+        kerning = font.backend == "sfnt" and font_utility.SFNT_KERNING
+
+        # Every glyph is rasterized once per subpixel offset and then placed by an integer offset
+        iy, by = divmod(round(obj.top % 1 * steps), steps)
+        coverage, x, prev = {}, obj.left % 1, None
+        for i, char in enumerate(obj.text):
+            if kerning:
+                gid = font.file.glyph_index(char)
+                if prev is not None:
+                    x += font.file.kerning(prev, gid) * font.unit * font.xscale
+                prev = gid
+            if not char.isspace():
+                ix, bx = divmod(round((x + hspace * i) * steps), steps)
+                for px, py, alpha in _glyph_pixels(key, char, bx / steps, by / steps):
+                    pos = (py + iy, px + ix)
+                    coverage[pos] = coverage.get(pos, 0) + alpha
+            x += _glyph_advance(key, char)
+
+        # Overlapping glyphs (kerning, italic) sum their coverages
+        return [
+            {'alpha': min(255, round(alpha, 3)), 'x': float(px), 'y': float(py)}
+            for (py, px), alpha in sorted(coverage.items())
+        ]
+
+    @staticmethod
+    def glyph_cache_info():
+        """Returns the statistics of the glyph cache used by :func:`text_to_pixels`.
+
+        Returns:
+            A named tuple with hits, misses, maxsize and currsize of the cache (see ``functools.lru_cache``).
+
+        Examples:
+            ..  code-block:: python3
+
+                for syl in line.syls:
+                    pixels = Convert.text_to_pixels(syl)
+                print(Convert.glyph_cache_info())
+
+            >>> CacheInfo(hits=14, misses=9, maxsize=4096, currsize=9)
+        """
+        return _glyph_pixels.cache_info()
+
+    @staticmethod
+    def glyph_cache_clear():
+        """Empties the glyph caches used by :func:`text_to_shape` and :func:`text_to_pixels` and resets their statistics.
+
+        Fonts opened by the current thread are closed too.
+        """
+        _glyph_pixels.cache_clear()
+        _glyph_advance.cache_clear()
+        _text_shape.cache_clear()
+        _thread_fonts.fonts = {}
 
     @staticmethod
     def shape_to_pixels(shape, supersampling=8):
@@ -273,11 +395,14 @@ class Convert:
         | - shad=0;
         | - For Font informations leave whatever the default is;
 
+        | The alpha of every pixel is the exact area of the pixel covered by the shape (computed in a single pass by accumulating the signed area
+          under every edge of the shape, like font rasterizers do), so anti-aliasing is precise without any supersampling.
+
         **Tips:** *As for text, even shapes can decay!*
 
         Parameters:
-            shape (Shape): An object of class Shape.
-            supersampling (int): Value used for supersampling. Higher value means smoother and more precise anti-aliasing (and more computational time for generation).
+            shape (Shape): An object of class Shape (it will not be modified).
+            supersampling (int): Not used anymore (anti-aliasing is exact), kept for compatibility.
 
         Returns:
             A list of dictionaries representing each individual pixel of the input shape.
@@ -296,103 +421,224 @@ class Convert:
                     line.text = "{\\p1\\pos(%d,%d)%s\\fad(0,%d)}%s" % (x, y, alpha, l.dur/4, p_sh)
                     io.write_line(line)
         """
-        # Scale values for supersampled rendering
-        upscale = supersampling
-        downscale = 1 / upscale
-
-        # Upscale shape for later downsampling
-        shape.map(lambda x, y: (x*upscale, y*upscale))
-
-        # Bring shape near origin in positive room
-        x1, y1, x2, y2 = shape.bounding()
-        shift_x, shift_y = -1*(x1 - x1 % upscale), -1*(y1 - y1 % upscale)
-        shape.move(shift_x, shift_y)
-
-        # Create image
-        width, height = math.ceil((x2 + shift_x) * downscale) * upscale, math.ceil((y2 + shift_y) * downscale) * upscale
-        image = [False for i in range(width*height)]
-
-        # Renderer (on binary image with aliasing)
-        lines, last_point, last_move = [], {}, {}
-
-        def collect_lines(x, y, typ):
-            # Collect lines (points + vectors)
-            nonlocal lines, last_point, last_move
-            x, y = int(round(x)), int(round(y))  # Use integers to avoid rounding errors
-
-            # Move
-            if typ == "m":
-                # Close figure with non-horizontal line in image
-                if last_move and last_move['y'] != last_point['y'] and not (last_point['y'] < 0 and last_move['y'] < 0) and not (last_point['y'] > height and last_move['y'] > height):
-                    lines.append([last_point['x'], last_point['y'], last_move['x'] - last_point['x'], last_move['y'] - last_point['y']])
-
-                last_move = {'x': x, 'y': y}
-            # Non-horizontal line in image
-            elif last_point and last_point['y'] != y and not (last_point['y'] < 0 and y < 0) and not (last_point['y'] > height and y > height):
-                lines.append([last_point['x'], last_point['y'], x - last_point['x'], y - last_point['y']])
-
-            # Remember last point
-            last_point = {'x': x, 'y': y}
-
-        shape.flatten().map(collect_lines)
-
-        # Close last figure with non-horizontal line in image
-        if last_move and last_move['y'] != last_point['y'] and not (last_point['y'] < 0 and last_move['y'] < 0) and not (last_point['y'] > height and last_move['y'] > height):
-            lines.append([last_point['x'], last_point['y'], last_move['x'] - last_point['x'], last_move['y'] - last_point['y']])
-
-        # Calculates line x horizontal line intersection
-        def line_x_hline(x, y, vx, vy, y2):
-            if vy != 0:
-                s = (y2 - y) / vy
-                if s >= 0 and s <= 1:
-                    return x + s * vx
-            return None
-
-        # Scan image rows in shape
-        _, y1, _, y2 = shape.bounding()
-        for y in range(max(math.floor(y1), 0), min(math.ceil(y2), height)):
-            # Collect row intersections with lines
-            row_stops = []
-            for line in lines:
-                cx = line_x_hline(line[0], line[1], line[2], line[3], y + 0.5)
-                if cx is not None:
-                    row_stops.append([max(0, min(cx, width)), 1 if line[3] > 0 else -1])  # image trimmed stop position & line vertical direction
-
-            # Enough intersections / something to render?
-            if len(row_stops) > 1:
-                # Sort row stops by horizontal position
-                row_stops.sort(key=lambda x: x[0])
-                # Render!
-                status, row_index = 0, y * width
-                for i in range(0, len(row_stops)-1):
-                    status = status + row_stops[i][1]
-                    if status != 0:
-                        for x in range(math.ceil(row_stops[i][0]-0.5), math.floor(row_stops[i+1][0]+0.5)):
-                            image[row_index + x] = True
-
-        # Extract pixels from image
+        # Figures of the shape, with curves flattened
+        contours = Shape(shape.drawing_cmds)._contours()
+        if not contours:
+            return []
+
+        # Pixels grid, aligned to integer coordinates
+        xs, ys = [x for pts in contours for x, _ in pts], [y for pts in contours for _, y in pts]
+        shift_x, shift_y = math.floor(min(xs)), math.floor(min(ys))
+        width, height = math.ceil(max(xs)) - shift_x, math.ceil(max(ys)) - shift_y
+        if width <= 0 or height <= 0:
+            return []
+
+        # Accumulation buffer: every edge adds the signed area on its right side in the cells it touches,
+        # so the coverage of every pixel is the sum of the row's cells up to it
+        stride = width + 2
+        acc = [0.0] * (stride * height)
+
+        for pts in contours:
+            n = len(pts)
+            for i in range(n):
+                (x0, y0), (x1, y1) = pts[i], pts[(i+1) % n]
+                if y0 == y1:
+                    continue
+                x0, y0, x1, y1 = x0 - shift_x, y0 - shift_y, x1 - shift_x, y1 - shift_y
+                direction = 1.0
+                if y0 > y1:
+                    direction = -1.0
+                    x0, y0, x1, y1 = x1, y1, x0, y0
+                dxdy = (x1 - x0) / (y1 - y0)
+
+                x = x0
+                y_start = max(0, int(y0))
+                if y0 < 0:
+                    x -= y0 * dxdy
+                for y in range(y_start, min(height, math.ceil(y1))):
+                    row = y * stride
+                    dy = min(y + 1, y1) - max(y, y0)
+                    x_next = x + dxdy * dy
+                    d = dy * direction
+                    xa, xb = (x, x_next) if x < x_next else (x_next, x)
+                    xa_floor = math.floor(xa)
+                    xa_i = int(xa_floor)
+                    xb_ceil = math.ceil(xb)
+
+                    if xb_ceil <= xa_floor + 1:
+                        # The edge is inside of a single cell
+                        xmf = 0.5 * (x + x_next) - xa_floor
+                        acc[row + xa_i] += d - d * xmf
+                        acc[row + xa_i + 1] += d * xmf
+                    else:
+                        # The edge goes through many cells: triangle areas at the ends, a constant step between them
+                        s = 1 / (xb - xa)
+                        xa_f = xa - xa_floor
+                        a0 = 0.5 * s * (1 - xa_f) * (1 - xa_f)
+                        xb_f = xb - xb_ceil + 1
+                        am = 0.5 * s * xb_f * xb_f
+                        acc[row + xa_i] += d * a0
+                        if xb_ceil == xa_i + 2:
+                            acc[row + xa_i + 1] += d * (1 - a0 - am)
+                        else:
+                            a1 = s * (1.5 - xa_f)
+                            acc[row + xa_i + 1] += d * (a1 - a0)
+                            for xi in range(xa_i + 2, xb_ceil - 1):
+                                acc[row + xi] += d * s
+                            a2 = a1 + (xb_ceil - xa_i - 3) * s
+                            acc[row + xb_ceil - 1] += d * (1 - a2 - am)
+                        acc[row + xb_ceil] += d * am
+                    x = x_next
+
+        # Extract pixels from the accumulation buffer
         pixels = []
-        for y in range(0, height, upscale):
-            for x in range(0, width, upscale):
-                opacity = 0
-                for yy in range(0, upscale):
-                    for xx in range(0, upscale):
-                        if image[(y+yy) * width + (x+xx)]:
-                            opacity = opacity + 255
-
-                if opacity > 0:
+        for y in range(height):
+            row, coverage = y * stride, 0.0
+            for x in range(width):
+                coverage += acc[row + x]
+                alpha = round(min(1.0, abs(coverage)) * 255, 3)
+                if alpha > 0:
                     pixels.append({
-                        'alpha': opacity * (downscale * downscale),
-                        'x': (x - shift_x) * downscale,
-                        'y': (y - shift_y) * downscale
+                        'alpha': alpha,
+                        'x': float(x + shift_x),
+                        'y': float(y + shift_y)
                     })
 
         return pixels
 
     @staticmethod
-    def image_to_ass(image):
-        pass
+    def shape_to_distance_field(shape, resolution=1.0, margin=10.0):
+        """Computes the signed distance of the points of a grid from the outline of a Shape object.
+
+        The distances are computed once, then outlines at any distance (inset or outset versions of the shape)
+        can be taken from the result, to build glow, dissolve or erosion effects with precomputed layers
+        instead of many lines with \\blur and \\bord.
+
+        Parameters:
+            shape (Shape): An object of class Shape.
+            resolution (int or float, optional): Distance between the points of the grid (lower is more precise and slower).
+            margin (int or float, optional): Space around the shape covered by the grid (the highest outset distance that can be used).
+
+        Returns:
+            A :class:`DistanceField` object, with negative distances inside of the shape and positive ones outside.
+
+        Examples:
+            ..  code-block:: python3
+
+                l = line.copy()
+                field = Convert.shape_to_distance_field(Convert.text_to_shape(line), resolution=0.5, margin=8)
+                for i, d in enumerate(range(8, -2, -2)):
+                    l.layer = i
+                    l.text = "{\\an7\\pos(%.3f,%.3f)\\p1\\1a%s}%s" % (line.left, line.top, Convert.coloralpha(255 - 40 * i), field.contour(d))
+                    io.write_line(l)
+        """
+        return DistanceField(shape, resolution, margin)
+
+    @staticmethod
+    def image_to_ass(image, width=None, quantize=None, merge=True):
+        """Converts an image to ASS drawings, one for every color (and alpha) found in it.
+
+        Pixels with the same color are joined in rectangles, merging them horizontally and then vertically,
+        so even big logos become a few lines in the .ass file.
+        Drawings have their top-left corner in (0,0), so use them in lines with **an=7**, bord=0 and shad=0,
+        positioning them with \\pos.
+
+        **Tips:** *Quantization reduces the colors of the image, which means less lines and shorter drawings.*
+
+        Parameters:
+            image (str, bytes or file object): A PNG image (see :func:`image_to_pixels`), or raw RGBA data if width is given.
+            width (int, optional): Width of the image, only for raw RGBA data.
+            quantize (int, optional): If given, every channel is rounded to a multiple of this value (f.e. 16).
+            merge (bool, optional): If False, every pixel will be a square by its own.
+
+        Returns:
+            A list of strings, each one with the color and alpha tags followed by the drawing of the pixels of that color.
+
+        Examples:
+            ..  code-block:: python3
+
+                line = lines[0].copy()
+                line.style = "p"
+                for drawing in Convert.image_to_ass("logo.png", quantize=16):
+                    line.text = "{\\pos(20,20)}" + drawing
+                    io.write_line(line)
+        """
+        width, rows = _image_rows(image, width, quantize)
+
+        # Rectangles [x0, y0, x1, y1] for every color, extended downwards while the next row has the same run
+        groups, above = {}, {}
+        for y, row in enumerate(rows):
+            runs, x = {}, 0
+            while x < width:
+                pixel = row[4*x:4*x + 4]
+                x0 = x
+                x += 1
+                if pixel[3] == 0:
+                    continue
+                if merge:
+                    while x < width and row[4*x:4*x + 4] == pixel:
+                        x += 1
+
+                run = (x0, x, pixel)
+                rect = above.get(run)
+                if rect is not None and merge:
+                    rect[3] = y + 1
+                else:
+                    rect = [x0, y, x, y + 1]
+                    groups.setdefault(pixel, []).append(rect)
+                runs[run] = rect
+            above = runs
+
+        drawings = []
+        for (r, g, b, a), rects in groups.items():
+            tags = "\\p1\\c" + Convert.coloralpha(r, g, b)
+            if a != 255:
+                tags += "\\1a" + Convert.coloralpha(255 - a)
+            shape = " ".join("m %d %d l %d %d %d %d %d %d" % (x0, y0, x1, y0, x1, y1, x0, y1) for x0, y0, x1, y1 in rects)
+            drawings.append("{%s}%s" % (tags, shape))
+        return drawings
 
     @staticmethod
-    def image_to_pixels(image):
-        pass
+    def image_to_pixels(image, width=None, quantize=None):
+        """| Converts an image to a list of pixel data.
+        | A pixel data is a tuple (x, y, color, alpha), with color as ASS color and alpha from 0 (transparent) to 255 (opaque).
+
+        Images are read by a PNG decoder written in pure Python (see :mod:`pyonfx.png`), so no image library is needed.
+        Any PNG image is supported, as well as raw RGBA data (4 bytes for each pixel, row by row) if width is given.
+        Fully transparent pixels are skipped.
+
+        It is highly suggested to create a dedicated style for pixels (see :func:`text_to_pixels`).
+
+        Parameters:
+            image (str, bytes or file object): Path of a PNG image, its content or a binary file object to read it from.
+            width (int, optional): If given, image is raw RGBA data of this width.
+            quantize (int, optional): If given, every channel is rounded to a multiple of this value (f.e. 16).
+
+        Returns:
+            A list of tuples (x, y, color, alpha), one for each visible pixel of the image.
+
+        Examples:
+            ..  code-block:: python3
+
+                line = lines[0].copy()
+                line.style = "p"
+                p_sh = Shape.rectangle()
+                for x, y, color, alpha in Convert.image_to_pixels("logo.png"):
+                    alpha = "\\1a" + Convert.coloralpha(255 - alpha) if alpha != 255 else ""
+
+                    line.text = "{\\p1\\pos(%d,%d)\\c%s%s}%s" % (x, y, color, alpha, p_sh)
+                    io.write_line(line)
+        """
+        width, rows = _image_rows(image, width, quantize)
+
+        pixels, colors = [], {}
+        for y, row in enumerate(rows):
+            for x in range(width):
+                alpha = row[4*x + 3]
+                if alpha:
+                    rgb = row[4*x:4*x + 3]
+                    color = colors.get(rgb)
+                    if color is None:
+                        color = colors[rgb] = Convert.coloralpha(rgb[0], rgb[1], rgb[2])
+                    pixels.append((x, y, color, alpha))
+        return pixels
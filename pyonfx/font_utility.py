@@ -18,31 +18,198 @@
 This file contains the Font class definition, which has some functions
 to help getting informations from a specific font
 """
+import os
 import sys
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+from collections import namedtuple
 from .shape import Shape
+from .serialization import format_list
+from . import sfnt
 
-if sys.platform == "win32":
-    import win32gui
-    import win32ui
-    import win32con
-elif sys.platform == "linux":
-    import cairo
-    import gi
-    gi.require_version('Pango', '1.0')
-    gi.require_version('PangoCairo', '1.0')
-    from gi.repository import Pango, PangoCairo
-    import html
+# Native font system modules, heavy to import: they're loaded by load_backend() when the first Font is created
+win32gui = win32ui = win32con = None
+cairo = Pango = PangoCairo = html = None
+
+
+def load_backend():
+    """Imports the modules used to talk with the native font system (pywin32 on Windows, cairo and Pango on Linux).
+
+    This is done automatically the first time a :class:`Font` is created, so that importing PyonFX stays fast
+    for the scripts that never need font informations.
+    """
+    global win32gui, win32ui, win32con, cairo, Pango, PangoCairo, html
+
+    if sys.platform == "win32":
+        if win32gui is None:
+            import win32ui
+            import win32con
+            import win32gui
+    elif sys.platform == "linux":
+        if cairo is None:
+            import gi
+            gi.require_version('Pango', '1.0')
+            gi.require_version('PangoCairo', '1.0')
+            from gi.repository import Pango, PangoCairo
+            import html
+            import cairo
 
 # CONFIGURATION
+FONT_BACKEND = "native" # Default backend of Font: "native" (pywin32 on Windows, cairo and Pango on Linux) or "sfnt" (font files read by PyonFX, see pyonfx.sfnt)
 FONT_PRECISION = 64 # Font scale for better precision output from native font system
 LIBASS_FONTHACK = True # Scale font data to fontsize? (no effect on windows)
 PANGO_SCALE = 1024 # The PANGO_SCALE macro represents the scale between dimensions used for Pango distances and device units.
+SFNT_KERNING = False # Apply kerning pairs with the "sfnt" backend? (the native backends don't, libass does only with "Kerning: yes")
+SFNT_OBLIQUE_SHEAR = 0.2 # Horizontal shear of the italic synthesized by the "sfnt" backend, for families without an italic font
+MP_CONTEXT = None # multiprocessing context of the processes started by PyonFX (f.e. multiprocessing.get_context("spawn")), None for the default one
+
+# Widths of single chars for every font (see Font._advance), shared by all the Font objects of the process
+_advance_caches = {}
+
+# Font found by the backend for every font key: its name or file (resolved), if it's not the requested family (fallback)
+# and what the backend needs to avoid looking for it again (data: the FontFile for "sfnt", the unscaled metrics for "native")
+_FontInfo = namedtuple("_FontInfo", "resolved fallback data")
+_font_infos = {}
+
+# Metrics of every font key and vertical scale, as returned by Font.get_metrics
+_metrics_cache = {}
+
+# Incremented by clear_font_caches, fonts found with different generations may be different
+_font_generation = 0
+
+
+def _font_info(key, resolved, fallback, data):
+    # Saves the font found for a key, warning (once for every family, weight and slant) if another family has been used
+    if fallback and not any(other[:4] == key[:4] for other in _font_infos):
+        print("[WARNING] Font '%s' not found, '%s' is used instead." % (key[1], resolved))
+    info = _font_infos[key] = _FontInfo(resolved, fallback, data)
+    return info
+
+
+def resolved_fonts():
+    """Returns the fonts found until now for the families asked to :class:`Font`, in this process.
+
+    Returns:
+        A dict with (family, bold, italic) as keys and the found font as values: the path of the font file
+        for the "sfnt" backend, the name of the font family used by the system for the "native" one.
+
+    Examples:
+        ..  code-block:: python3
+
+            Font(style)
+            print( resolved_fonts() )
+
+        >>> {('Arial', False, False): '/usr/share/fonts/truetype/msttcorefonts/Arial.ttf'}
+    """
+    return {key[1:4]: info.resolved for key, info in _font_infos.items()}
+
+
+def clear_font_caches():
+    """Forgets every font found and measured in this process (f.e. after installing new fonts while a script is running)."""
+    global _font_generation
+    _font_generation += 1
+    _advance_caches.clear()
+    _font_infos.clear()
+    _metrics_cache.clear()
+    sfnt.open_font.cache_clear()
+    sfnt._font_index.cache_clear()
+
+
+def _font_key(style, backend=None):
+    # Everything the width of a char depends on, before scaling and spacing (underline and strikeout don't change it)
+    backend = backend or getattr(style, "font_backend", None) or FONT_BACKEND
+    return backend, style.fontname, style.bold, style.italic, style.fontsize
+
+
+def _measure_chars(style, chars):
+    # Runs in a worker process of warm_up_fonts
+    font = Font(style)
+    return _font_key(style), {char: font._advance(char) for char in chars}
+
+
+def warm_up_fonts(chars_by_style, workers=None):
+    """Measures the widths of many chars in parallel processes, filling the width caches of the fonts before they are used.
+
+    | Every :class:`Font` of this process with the same family, weight, slant and size of a style will find its chars already measured.
+    | Chars already in the caches are not measured again.
+      With the native backend on Windows, texts are measured as a whole by the system, so nothing is done.
+    | With the "spawn" and "forkserver" start methods (the default on Windows, and on Linux since Python 3.14), every new process
+      runs the main script again, so the code of the script must be under an ``if __name__ == "__main__":`` guard.
+      Without it, the processes can't start: a warning is printed and the chars are measured in this process.
+
+    Parameters:
+        chars_by_style (list of tuple): Pairs (style, chars), with chars as an iterable of single chars.
+        workers (int, optional): Max number of processes (DEFAULT: number of CPUs).
+
+    Returns:
+        The number of chars measured.
+
+    Examples:
+        ..  code-block:: python3
+
+            if __name__ == "__main__":
+                io = Ass("in.ass", warmup=True)
+    """
+    pending = {}
+    for style, chars in chars_by_style:
+        key = _font_key(style)
+        if key[0] == "native" and sys.platform == "win32":
+            continue
+        # Looking for the font here first, so that fallbacks are reported only once
+        if key not in _font_infos:
+            Font(style)
+        cache = _advance_caches.get(key, {})
+        missing = pending.setdefault(key, (style, set()))[1]
+        missing.update(char for char in chars if char not in cache)
+
+    # Chunks of about the same size, so that every process gets some work also with a single style
+    total = sum(len(chars) for _, chars in pending.values())
+    if total == 0:
+        return 0
+    workers = min(workers or os.cpu_count() or 1, total)
+    size = -(-total // workers)
+    jobs = []
+    for style, chars in pending.values():
+        chars = sorted(chars)
+        jobs.extend((style, chars[i:i + size]) for i in range(0, len(chars), size))
+
+    results = None
+    if workers > 1:
+        try:
+            with concurrent.futures.ProcessPoolExecutor(workers, mp_context=MP_CONTEXT) as executor:
+                results = list(executor.map(_measure_chars, *zip(*jobs)))
+        except BrokenProcessPool:
+            print("[WARNING] Processes for the font warm-up could not be started (is the script under an 'if __name__ == \"__main__\":' guard?), "
+                  "measuring the chars in this process.")
+    if results is None:
+        results = [_measure_chars(style, chars) for style, chars in jobs]
+    for key, widths in results:
+        _advance_caches.setdefault(key, {}).update(widths)
+    return total
 
 class Font:
     """
     Font class definition
+
+    | The "native" backend asks fonts to the system (pywin32 on Windows, cairo and Pango on Linux).
+    | The "sfnt" backend finds and reads TrueType/OpenType files by itself (see :func:`pyonfx.sfnt.find_font`),
+      so it works everywhere without any native module and its objects can be pickled (f.e. to be sent to other processes).
+      Its results follow the ones of Pango: the font is scaled so that ascent + descent is the font size (with LIBASS_FONTHACK),
+      and kerning is not applied (unless SFNT_KERNING is True).
+
+    Args:
+        style (Style): The style with the font informations.
+        backend (str, optional): "native" or "sfnt". If not given, the one set in the style by :class:`Ass` (or FONT_BACKEND) is used.
+
+    Attributes:
+        resolved (str): The font found for the family: path of the font file for "sfnt", name of the family used by the system for "native" (see :func:`resolved_fonts`).
+        fallback (bool): True if the family was not found and another one is used (a warning is printed the first time).
     """
-    def __init__(self, style):
+    def __init__(self, style, backend=None):
+        self.backend = backend or getattr(style, "font_backend", None) or FONT_BACKEND
+        if self.backend not in ("native", "sfnt"):
+            raise ValueError("Font backend must be either 'native' or 'sfnt'")
+
         self.family = style.fontname
         self.bold = style.bold
         self.italic = style.italic
@@ -54,7 +221,28 @@ class Font:
         self.hspace = style.spacing
         self.upscale = FONT_PRECISION
         self.downscale = 1 / FONT_PRECISION
+        self.key = _font_key(style, self.backend)
+        self.advances = _advance_caches.setdefault(self.key, {})
+        info = _font_infos.get(self.key)
+
+        if self.backend == "sfnt":
+            if info is None:
+                file = sfnt.find_font(self.family, self.bold, self.italic)
+                if file is None:
+                    raise RuntimeError("No font file found in the font directories: %s" % sfnt.FONT_DIRS)
+                fallback = self.family.lower() not in file.names and not os.path.isfile(self.family)
+                info = _font_info(self.key, file.path, fallback, file)
+            self.file = info.data
+            self.resolved, self.fallback = info.resolved, info.fallback
+            # Size of a font unit in pixels
+            if LIBASS_FONTHACK:
+                self.unit = self.size / (self.file.ascender + self.file.descender)
+            else:
+                self.unit = self.size / self.file.units_per_em
+            self.oblique = SFNT_OBLIQUE_SHEAR if self.italic and not self.file.italic else 0
+            return
 
+        load_backend()
         if sys.platform == "win32":
             # Create device context
             self.dc = win32gui.CreateCompatibleDC(None)
@@ -81,6 +269,10 @@ class Font:
             }
             self.pycfont = win32ui.CreateFont(font_spec)
             win32gui.SelectObject(self.dc, self.pycfont.GetSafeHandle())
+
+            if info is None:
+                face = win32gui.GetTextFace(self.dc)
+                info = _font_info(self.key, face, face.lower() != self.family.lower(), None)
         elif sys.platform == "linux":
             surface = cairo.ImageSurface(cairo.Format.A8, 1, 1)
 
@@ -94,22 +286,44 @@ class Font:
             font_description.set_style(Pango.Style.ITALIC if self.italic else Pango.Style.NORMAL)
 
             self.layout.set_font_description(font_description)
-            self.metrics = Pango.Context.get_metrics(self.layout.get_context(), self.layout.get_font_description())
+
+            # Font lookup and metrics are done by fontconfig and Pango only once for every font
+            if info is None:
+                context = self.layout.get_context()
+                metrics = Pango.Context.get_metrics(context, font_description)
+                resolved = context.load_font(font_description).describe().get_family()
+                info = _font_info(self.key, resolved, resolved.lower() != self.family.lower(), (metrics.get_ascent(), metrics.get_descent()))
+            self.ascent, self.descent = info.data
 
             if LIBASS_FONTHACK:
-                self.fonthack_scale = self.size / ((self.metrics.get_ascent() + self.metrics.get_descent()) / PANGO_SCALE * self.downscale)
+                self.fonthack_scale = self.size / ((self.ascent + self.descent) / PANGO_SCALE * self.downscale)
             else:
                 self.fonthack_scale = 1
         else:
             raise NotImplementedError
+        self.resolved, self.fallback = info.resolved, info.fallback
 
     def __del__(self):
-        if sys.platform == "win32":
+        if sys.platform == "win32" and getattr(self, "backend", None) == "native" and hasattr(self, "dc"):
             win32gui.DeleteObject(self.pycfont.GetSafeHandle())
             win32gui.DeleteDC(self.dc)
 
     def get_metrics(self):
-        if sys.platform == "win32":
+        # Same for every font with the same key and vertical scale
+        metrics = _metrics_cache.get((self.key, self.yscale))
+        if metrics is None:
+            metrics = _metrics_cache[(self.key, self.yscale)] = self.__get_metrics()
+        return metrics
+
+    def __get_metrics(self):
+        if self.backend == "sfnt":
+            return (
+                self.file.ascender * self.unit * self.yscale,
+                self.file.descender * self.unit * self.yscale,
+                0.0,
+                0.0
+            )
+        elif sys.platform == "win32":
             metrics = win32gui.GetTextMetrics(self.dc)
 
             return (
@@ -121,17 +335,45 @@ class Font:
             )
         elif sys.platform == "linux":
             return (
-                # 'height': (self.metrics.get_ascent() + self.metrics.get_descent()) / PANGO_SCALE * self.downscale * self.yscale * self.fonthack_scale,
-                self.metrics.get_ascent() / PANGO_SCALE * self.downscale * self.yscale * self.fonthack_scale,
-                self.metrics.get_descent() / PANGO_SCALE * self.downscale * self.yscale * self.fonthack_scale,
+                # 'height': (self.ascent + self.descent) / PANGO_SCALE * self.downscale * self.yscale * self.fonthack_scale,
+                self.ascent / PANGO_SCALE * self.downscale * self.yscale * self.fonthack_scale,
+                self.descent / PANGO_SCALE * self.downscale * self.yscale * self.fonthack_scale,
                 0.0,
                 self.layout.get_spacing() / PANGO_SCALE * self.downscale * self.yscale * self.fonthack_scale
             )
         else:
             raise NotImplementedError
 
+    def _advance(self, char):
+        # Width of a single char in units of the backend (font units for "sfnt", Pango pixels at FONT_PRECISION for "native" on Linux),
+        # cached for all the fonts of the process with the same key (see warm_up_fonts)
+        width = self.advances.get(char)
+        if width is None:
+            if self.backend == "sfnt":
+                width = self.file.advance(self.file.glyph_index(char))
+            elif sys.platform == "linux":
+                self.layout.set_markup(html.escape(char), -1)
+                width = self.layout.get_pixel_extents()[1].width
+            else:
+                raise NotImplementedError
+            self.advances[char] = width
+        return width
+
     def get_text_extents(self, text):
-        if sys.platform == "win32":
+        if self.backend == "sfnt":
+            if not text:
+                return 0.0, 0.0
+
+            width = sum(self._advance(char) for char in text)
+            if SFNT_KERNING:
+                gids = [self.file.glyph_index(char) for char in text]
+                width += sum(self.file.kerning(left, right) for left, right in zip(gids, gids[1:]))
+
+            return (
+                (width * self.unit + self.hspace * (len(text) - 1)) * self.xscale,
+                (self.file.ascender + self.file.descender) * self.unit * self.yscale
+            )
+        elif sys.platform == "win32":
             cx, cy = win32gui.GetTextExtentPoint32(self.dc, text)
 
             return (
@@ -152,10 +394,7 @@ class Font:
                                        -1)
                 return self.layout.get_pixel_extents()[1]
 
-            width = 0
-            
-            for char in text:
-                width += get_rect(char).width
+            width = sum(self._advance(char) for char in text)
 
             return (
                 (width * self.downscale * self.fonthack_scale + self.hspace * (len(text) - 1)) * self.xscale,
@@ -165,7 +404,48 @@ class Font:
             raise NotImplementedError
 
     def text_to_shape(self, text):
-        if sys.platform == "win32":
+        if self.backend == "sfnt":
+            f = self.file
+            mult_x, mult_y = self.unit * self.xscale, self.unit * self.yscale
+            shape, values = [], []
+
+            def add(x, y):
+                # From font units (y going up from the baseline) to pixels (y going down from the top)
+                values.append((x + y * self.oblique) * mult_x + x_add)
+                values.append((f.ascender - y) * mult_y)
+
+            x_add, prev = 0.0, None
+            for i, char in enumerate(text):
+                gid = f.glyph_index(char)
+                if SFNT_KERNING and prev is not None:
+                    x_add += f.kerning(prev, gid) * mult_x
+                prev = gid
+
+                for figure in f.outline(gid):
+                    for command in figure:
+                        shape.append(command[0])
+                        for j in range(1, len(command), 2):
+                            add(command[j], command[j + 1])
+                # Lines of underline and strikeout, as wide as the advance of the glyph
+                advance = f.advance(gid)
+                for enabled, top, thickness in ((self.underline, f.underline_position, f.underline_thickness),
+                                                (self.strikeout, f.strikeout_position, f.strikeout_thickness)):
+                    if enabled:
+                        shape.extend(("m", "l", "l", "l"))
+                        add(0, top), add(advance, top), add(advance, top - thickness), add(0, top - thickness)
+
+                x_add += advance * mult_x + self.hspace * self.xscale
+
+            # Joining commands with their formatted coordinates, omitting repeated commands
+            coords = iter(format_list(values))
+            cmds, last = [], None
+            for cmd in shape:
+                if cmd != last:
+                    cmds.append(cmd)
+                    last = cmd
+                cmds.extend(next(coords) for _ in range(6 if cmd == "b" else 2))
+            return Shape(' '.join(cmds))
+        elif sys.platform == "win32":
             # Calcultating distance between origins of character cells (just in case of spacing)
             # TO BE DONE
 
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+# PyonFX: An easy way to do KFX and complex typesetting based on subtitle format ASS (Advanced Substation Alpha).
+# Copyright (C) 2019 Antonio Strippoli (CoffeeStraw/YellowFlash)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyonFX is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see http://www.gnu.org/licenses/.
+"""
+This file contains a small PNG decoder, used by Convert to read images
+without depending on any image library
+"""
+import os
+import io
+import zlib
+import struct
+import contextlib
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Samples per pixel and allowed bit depths of every color type
+_COLOR_TYPES = {
+    0: (1, (1, 2, 4, 8, 16)), # Grayscale
+    2: (3, (8, 16)), # RGB
+    3: (1, (1, 2, 4, 8)), # Palette
+    4: (2, (8, 16)), # Grayscale + alpha
+    6: (4, (8, 16)), # RGB + alpha
+}
+
+# Starting point and step (x0, y0, dx, dy) of the seven passes of an Adam7 interlaced image
+_ADAM7 = ((0, 0, 8, 8), (4, 0, 8, 8), (0, 4, 4, 8), (2, 0, 4, 4), (0, 2, 2, 4), (1, 0, 2, 2), (0, 1, 1, 2))
+
+
+@contextlib.contextmanager
+def _borrowed(f):
+    # File object of the caller, left open (like contextlib.nullcontext, which is missing in Python 3.6)
+    yield f
+
+
+def read_png(image):
+    """Decodes a PNG image to 8 bits RGBA rows.
+
+    Compressed data is decompressed and unfiltered scanline by scanline while the chunks are read,
+    so the whole compressed stream is never kept in memory.
+    Every color type, bit depth, transparency chunk (tRNS) and Adam7 interlacing is supported.
+
+    Parameters:
+        image (str, bytes or file object): Path of the image, its content or a binary file object to read it from.
+
+    Returns:
+        A tuple (width, height, rows), where every row is a bytearray with the R, G, B, A values of its pixels.
+
+    Examples:
+        ..  code-block:: python3
+
+            width, height, rows = read_png("logo.png")
+            r, g, b, a = rows[0][0:4]
+    """
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(image)
+    elif isinstance(image, (str, os.PathLike)):
+        source = open(image, "rb")
+    else:
+        source = _borrowed(image)
+
+    with source as f:
+        header = palette = trns = decoder = None
+
+        for kind, data in _chunks(f):
+            if kind == b"IHDR":
+                header = _read_header(data)
+            elif header is None:
+                raise ValueError("Invalid PNG image: the first chunk must be IHDR")
+            elif kind == b"PLTE":
+                palette = data
+            elif kind == b"tRNS":
+                trns = data
+            elif kind == b"IDAT":
+                if decoder is None:
+                    decoder = _Decoder(header, palette, trns)
+                decoder.feed(data)
+
+        if decoder is None:
+            raise ValueError("Invalid PNG image: no image data found")
+        return header[0], header[1], decoder.finish()
+
+
+def _chunks(f):
+    if f.read(8) != PNG_SIGNATURE:
+        raise ValueError("Invalid PNG image: wrong signature")
+
+    while True:
+        head = f.read(8)
+        if len(head) < 8:
+            raise ValueError("Invalid PNG image: unexpected end of file")
+        length, kind = struct.unpack(">I4s", head)
+        data, crc = f.read(length), f.read(4)
+        if len(data) < length or len(crc) < 4:
+            raise ValueError("Invalid PNG image: unexpected end of file")
+        if zlib.crc32(kind + data) != struct.unpack(">I", crc)[0]:
+            raise ValueError(f"Invalid PNG image: chunk {kind.decode('latin-1')} is corrupted")
+
+        yield kind, data
+        if kind == b"IEND":
+            return
+
+
+def _read_header(data):
+    if len(data) != 13:
+        raise ValueError("Invalid PNG image: wrong IHDR length")
+    width, height, depth, color_type, compression, filter_method, interlace = struct.unpack(">IIBBBBB", data)
+
+    if width == 0 or height == 0:
+        raise ValueError("Invalid PNG image: empty size")
+    if color_type not in _COLOR_TYPES or depth not in _COLOR_TYPES[color_type][1]:
+        raise ValueError(f"Invalid PNG image: bit depth {depth} is not allowed for color type {color_type}")
+    if compression != 0 or filter_method != 0 or interlace not in (0, 1):
+        raise ValueError("Invalid PNG image: unknown compression, filter or interlace method")
+
+    return width, height, depth, color_type, interlace
+
+
+class _Decoder:
+    # Decompresses the image data incrementally and writes the scanlines to the RGBA rows as soon as they are complete
+
+    def __init__(self, header, palette, trns):
+        self.width, self.height, self.depth, self.color_type, interlace = header
+        self.channels = _COLOR_TYPES[self.color_type][0]
+        self.bpp = max(1, self.channels * self.depth // 8)
+        self.rows = [bytearray(4 * self.width) for _ in range(self.height)]
+        self.zlib = zlib.decompressobj()
+        self.buffer = bytearray()
+
+        # Sub-images to read, one for not interlaced images, up to seven for Adam7
+        self.passes = []
+        for x0, y0, dx, dy in (_ADAM7 if interlace else ((0, 0, 1, 1),)):
+            w, h = -(-(self.width - x0) // dx), -(-(self.height - y0) // dy)
+            if w > 0 and h > 0:
+                self.passes.append((x0, y0, dx, dy, w, h))
+        self.current, self.y = 0, 0
+        self.prev = bytearray(self._row_size())
+
+        # Translation tables from samples to RGBA values
+        self.tables = None
+        self.key = None
+        if self.color_type == 3:
+            if palette is None:
+                raise ValueError("Invalid PNG image: palette not found")
+            colors = len(palette) // 3
+            alphas = trns or b""
+            self.tables = [
+                bytes(palette[3*i + c] if i < colors else 0 for i in range(256)) for c in range(3)
+            ] + [bytes(alphas[i] if i < len(alphas) else 255 for i in range(256))]
+            self.colors = colors
+        elif self.depth < 8:
+            maxval = (1 << self.depth) - 1
+            self.tables = [bytes(min(255, i * 255 // maxval) for i in range(256))]
+        if trns is not None and self.color_type in (0, 2):
+            # Pixels of this exact value are fully transparent
+            self.key = bytes(trns[:2*self.channels]) if self.depth == 16 else bytes(trns[1:2*self.channels:2])
+
+    def _row_size(self):
+        return (self.passes[self.current][4] * self.channels * self.depth + 7) // 8 if self.current < len(self.passes) else 0
+
+    def feed(self, data):
+        try:
+            self.buffer += self.zlib.decompress(data)
+        except zlib.error:
+            raise ValueError("Invalid PNG image: image data is corrupted") from None
+        self._read_rows()
+
+    def finish(self):
+        self.buffer += self.zlib.flush()
+        self._read_rows()
+        if self.current < len(self.passes):
+            raise ValueError("Invalid PNG image: image data is truncated")
+        return self.rows
+
+    def _read_rows(self):
+        size = self._row_size()
+        start = 0
+        while self.current < len(self.passes) and len(self.buffer) - start > size:
+            line = self.buffer[start + 1:start + 1 + size]
+            _unfilter(self.buffer[start], line, self.prev, self.bpp)
+            self._write(line)
+            start += size + 1
+
+            self.prev = line
+            self.y += 1
+            if self.y == self.passes[self.current][5]:
+                self.current, self.y = self.current + 1, 0
+                size = self._row_size()
+                self.prev = bytearray(size)
+        del self.buffer[:start]
+
+    def _write(self, line):
+        x0, y0, dx, dy, w, _ = self.passes[self.current]
+        rgba = self._to_rgba(line, w)
+        row = self.rows[y0 + self.y * dy]
+        if dx == 1:
+            row[:] = rgba
+        else:
+            for c in range(4):
+                row[4*x0 + c::4*dx] = rgba[c::4]
+
+    def _to_rgba(self, line, w):
+        depth, channels = self.depth, self.channels
+
+        # One byte for every sample
+        if depth < 8:
+            per_byte, mask = 8 // depth, (1 << depth) - 1
+            samples = bytearray(
+                (line[i // per_byte] >> (8 - depth * (i % per_byte + 1))) & mask for i in range(w)
+            )
+        elif depth == 16:
+            samples = line[0::2]
+        else:
+            samples = line
+
+        rgba = bytearray(4 * w)
+        if self.color_type == 3:
+            if max(samples) >= self.colors:
+                raise ValueError("Invalid PNG image: color index out of palette")
+            for c in range(4):
+                rgba[c::4] = samples.translate(self.tables[c])
+            return rgba
+
+        raw = samples
+        if self.tables is not None:
+            samples = samples.translate(self.tables[0])
+        if channels <= 2:
+            for c in range(3):
+                rgba[c::4] = samples[0::channels]
+        else:
+            for c in range(3):
+                rgba[c::4] = samples[c::channels]
+        rgba[3::4] = samples[channels - 1::channels] if channels in (2, 4) else b"\xff" * w
+
+        if self.key is not None:
+            # Compared with the original samples, before any conversion to 8 bits
+            size = len(self.key)
+            pixels = raw if depth < 8 else line
+            for i in range(w):
+                if pixels[i*size:(i + 1)*size] == self.key:
+                    rgba[4*i + 3] = 0
+        return rgba
+
+
+def _unfilter(kind, line, prev, bpp):
+    n = len(line)
+    if kind == 0:
+        return
+    elif kind == 1: # Sub
+        for i in range(bpp, n):
+            line[i] = (line[i] + line[i - bpp]) & 255
+    elif kind == 2: # Up
+        for i in range(n):
+            line[i] = (line[i] + prev[i]) & 255
+    elif kind == 3: # Average
+        for i in range(bpp):
+            line[i] = (line[i] + (prev[i] >> 1)) & 255
+        for i in range(bpp, n):
+            line[i] = (line[i] + ((line[i - bpp] + prev[i]) >> 1)) & 255
+    elif kind == 4: # Paeth
+        for i in range(bpp):
+            line[i] = (line[i] + prev[i]) & 255
+        for i in range(bpp, n):
+            a, b, c = line[i - bpp], prev[i], prev[i - bpp]
+            p = a + b - c
+            pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+            if pa <= pb and pa <= pc:
+                line[i] = (line[i] + a) & 255
+            elif pb <= pc:
+                line[i] = (line[i] + b) & 255
+            else:
+                line[i] = (line[i] + c) & 255
+    else:
+        raise ValueError(f"Invalid PNG image: unknown filter type {kind}")
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# PyonFX: An easy way to do KFX and complex typesetting based on subtitle format ASS (Advanced Substation Alpha).
+# Copyright (C) 2019 Antonio Strippoli (CoffeeStraw/YellowFlash)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyonFX is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see http://www.gnu.org/licenses/.
+
+"""
+This file contains the functions used to write numbers in ASS format (coordinates of shapes, values of tags),
+formatting lots of them at once when possible.
+"""
+import math
+
+
+def format_value(x, prec=3):
+    """Formats a number with at most prec decimal digits, without trailing zeros.
+
+    Parameters:
+        x (int or float): The number to format.
+        prec (int, optional): Max number of decimal digits.
+
+    Returns:
+        The number formatted as a string.
+
+    Examples:
+        ..  code-block:: python3
+
+            print( format_value(10.5), format_value(3.14159), format_value(7.0) )
+
+        >>> 10.5 3.142 7
+    """
+    if prec <= 0:
+        return f"{x:.0f}"
+    return f"{x:.{prec}f}".rstrip('0').rstrip('.')
+
+
+def format_values(values, prec=3, snap=None, sep=" "):
+    """Formats a sequence of numbers at once, like :func:`format_value` would do for every number, joining them in a single string.
+
+    | All the numbers are written by a single %-formatting of the whole sequence, then the trailing zeros of all of them are removed
+      with a few replaces over the whole string. This is much faster than formatting and stripping the numbers one by one.
+    | Optionally, numbers very near to integers can be snapped to them, to get shorter output.
+
+    **Tips:** *Useful for tags too, f.e. "\\\\pos(%s)" % format_values((x, y), sep=",").*
+
+    Parameters:
+        values (list or tuple of int or float): The numbers to format.
+        prec (int, optional): Max number of decimal digits.
+        snap (float, optional): If given, numbers at most this far from an integer are written as that integer.
+        sep (str, optional): The separator written between numbers.
+
+    Returns:
+        The numbers formatted and joined in a string.
+
+    Examples:
+        ..  code-block:: python3
+
+            print( format_values([0, 1.5, 2.25, -0.0001, 3.0004]) )
+            print( format_values([0, 1.5, 2.25, -0.0001, 3.0004], snap=0.001) )
+            print( "\\\\pos(%s)" % format_values((100.25, 50), sep=",") )
+
+        >>> 0 1.5 2.25 -0 3
+        >>> 0 1.5 2.25 0 3
+        >>> \\pos(100.25,50)
+    """
+    if snap:
+        values = [
+            round(x) if math.isfinite(x) and abs(x - round(x)) <= snap else x
+            for x in values
+        ]
+    if not values:
+        return ""
+
+    if prec <= 0:
+        text = ("%.0f " * len(values)) % tuple(values)
+    else:
+        # Every number has exactly prec decimal digits: numbers with only zeros are marked (their integer part ends with zeros too),
+        # then the trailing zeros of the other ones are removed, longest runs first
+        text = ("%%.%df " % prec * len(values)) % tuple(values)
+        text = text.replace("." + "0" * prec + " ", "\0 ")
+        for zeros in range(prec - 1, 0, -1):
+            text = text.replace("0" * zeros + " ", " ")
+        text = text.replace("\0", "")
+
+    text = text[:-1]
+    return text if sep == " " else text.replace(" ", sep)
+
+
+def format_list(values, prec=3, snap=None):
+    """Like :func:`format_values`, but returns a list with every number formatted as a string.
+
+    Parameters:
+        values (list or tuple of int or float): The numbers to format.
+        prec (int, optional): Max number of decimal digits.
+        snap (float, optional): If given, numbers at most this far from an integer are written as that integer.
+
+    Returns:
+        A list of strings.
+    """
+    return format_values(values, prec, snap).split(" ") if values else []
@@ -0,0 +1,935 @@
+# -*- coding: utf-8 -*-
+# PyonFX: An easy way to do KFX and complex typesetting based on subtitle format ASS (Advanced Substation Alpha).
+# Copyright (C) 2019 Antonio Strippoli (CoffeeStraw/YellowFlash)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyonFX is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see http://www.gnu.org/licenses/.
+"""
+This file contains a reader of TrueType/OpenType font files written in pure Python,
+used by the "sfnt" backend of Font to work without any native font system
+"""
+import os
+import sys
+import mmap
+import bisect
+import struct
+import functools
+
+# CONFIGURATION
+# Directories searched (recursively) for font files by find_font
+if sys.platform == "win32":
+    FONT_DIRS = [
+        os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts"),
+        os.path.join(os.environ.get("LOCALAPPDATA", ""), "Microsoft", "Windows", "Fonts"),
+    ]
+elif sys.platform == "darwin":
+    FONT_DIRS = ["/System/Library/Fonts", "/Library/Fonts", os.path.expanduser("~/Library/Fonts")]
+else:
+    FONT_DIRS = ["/usr/share/fonts", "/usr/local/share/fonts", os.path.expanduser("~/.local/share/fonts"), os.path.expanduser("~/.fonts")]
+FALLBACK_FAMILIES = ["Arial", "Liberation Sans", "DejaVu Sans", "Noto Sans"] # Families used when the requested one is not found
+FONT_EXTENSIONS = (".ttf", ".otf", ".ttc", ".otc")
+
+_u16 = struct.Struct(">H").unpack_from
+_i16 = struct.Struct(">h").unpack_from
+_u32 = struct.Struct(">I").unpack_from
+
+
+class FontFile:
+    """
+    A TrueType/OpenType font (or a font of a collection), read from a memory-mapped file.
+
+    Glyph outlines (both TrueType and CFF ones), horizontal metrics and kerning pairs (from the kern table
+    or from the 'kern' feature of the GPOS table) are read only when needed, in font units (y going up).
+
+    Objects of this class can be pickled (f.e. to be sent to other processes): the file is mapped again when loaded.
+
+    Args:
+        path (str): Path of the font file.
+        index (int, optional): Index of the font, for font collections (.ttc/.otc).
+
+    Attributes:
+        path (str): Path of the font file.
+        index (int): Index of the font in the file.
+        family (str): Family name.
+        subfamily (str): Subfamily name (f.e. "Bold Italic").
+        full_name (str): Full name of the font.
+        names (set of str): Every family, full and PostScript name of the font, in lowercase.
+        weight (int): Weight class (400 is regular, 700 is bold).
+        italic (bool): True if the font is italic or oblique.
+        units_per_em (int): Font units in an em.
+        ascender (int): Typographic ascender (positive, above the baseline).
+        descender (int): Typographic descender (positive, below the baseline).
+        line_gap (int): Typographic line gap.
+        underline_position (int): Position of the top of the underline (negative, below the baseline).
+        underline_thickness (int): Thickness of the underline.
+        strikeout_position (int): Position of the top of the strikeout.
+        strikeout_thickness (int): Thickness of the strikeout.
+        num_glyphs (int): Number of glyphs in the font.
+
+    Examples:
+        ..  code-block:: python3
+
+            font = FontFile("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+            gid = font.glyph_index("A")
+            print( font.family, font.units_per_em, font.advance(gid) )
+
+        >>> DejaVu Sans 2048 1401
+    """
+    def __init__(self, path, index=0):
+        self.path, self.index = path, index
+        self.__load()
+
+    def __getstate__(self):
+        return self.path, self.index
+
+    def __setstate__(self, state):
+        self.path, self.index = state
+        self.__load()
+
+    def __repr__(self):
+        return "FontFile(%r, %d)" % (self.path, self.index)
+
+    def close(self):
+        """Releases the memory map of the file (the object can't be used anymore)."""
+        self.data.close()
+
+    def __load(self):
+        with open(self.path, "rb") as f:
+            self.data = data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        offset = 0
+        if data[:4] == b"ttcf":
+            if self.index >= _u32(data, 8)[0]:
+                raise ValueError("Font index %d not found in collection '%s'" % (self.index, self.path))
+            offset = _u32(data, 12 + 4 * self.index)[0]
+        elif self.index != 0:
+            raise ValueError("Font index %d not found in '%s'" % (self.index, self.path))
+        if data[offset:offset + 4] not in (b"\x00\x01\x00\x00", b"OTTO", b"true"):
+            raise ValueError("'%s' is not a TrueType/OpenType font" % self.path)
+
+        self.tables = {}
+        for i in range(_u16(data, offset + 4)[0]):
+            tag, _, table_offset, length = struct.unpack_from(">4sIII", data, offset + 12 + 16 * i)
+            self.tables[tag.decode("latin-1")] = (table_offset, length)
+        for tag in ("head", "hhea", "maxp", "hmtx", "cmap"):
+            if tag not in self.tables:
+                raise ValueError("Table '%s' not found in font '%s'" % (tag, self.path))
+
+        head = self.tables["head"][0]
+        self.units_per_em = _u16(data, head + 18)[0]
+        mac_style = _u16(data, head + 44)[0]
+        self.__long_loca = _i16(data, head + 50)[0] == 1
+
+        hhea = self.tables["hhea"][0]
+        self.ascender, self.descender, self.line_gap = struct.unpack_from(">hhh", data, hhea + 4)
+        self.descender = -self.descender
+        self.__num_hmetrics = _u16(data, hhea + 34)[0]
+        self.num_glyphs = _u16(data, self.tables["maxp"][0] + 4)[0]
+
+        # Defaults when the optional tables are missing
+        self.weight, self.italic = (700 if mac_style & 1 else 400), bool(mac_style & 2)
+        self.underline_thickness = self.strikeout_thickness = max(1, self.units_per_em // 20)
+        self.underline_position = -self.units_per_em // 10
+        self.strikeout_position = self.units_per_em // 4
+        self.win_ascent, self.win_descent = self.ascender, self.descender
+
+        if "OS/2" in self.tables:
+            os2 = self.tables["OS/2"][0]
+            self.weight = _u16(data, os2 + 4)[0]
+            self.strikeout_thickness, self.strikeout_position = struct.unpack_from(">hh", data, os2 + 26)
+            fs_selection = _u16(data, os2 + 62)[0]
+            self.italic = bool(fs_selection & 0x201) # ITALIC or OBLIQUE
+            typo_ascender, typo_descender, typo_line_gap, self.win_ascent, self.win_descent = struct.unpack_from(">hhhHH", data, os2 + 68)
+            # Same rules of FreeType: typographic metrics if asked by the font (USE_TYPO_METRICS) or if hhea has none
+            if fs_selection & 0x80 or (self.ascender == 0 and self.descender == 0):
+                self.ascender, self.descender, self.line_gap = typo_ascender, -typo_descender, typo_line_gap
+            if self.ascender == 0 and self.descender == 0:
+                self.ascender, self.descender = self.win_ascent, self.win_descent
+        if "post" in self.tables:
+            position, thickness = struct.unpack_from(">hh", data, self.tables["post"][0] + 8)
+            if thickness > 0:
+                self.underline_position, self.underline_thickness = position, thickness
+
+        self.__read_names()
+        self.__read_cmap()
+        self.__outlines, self.__kerning, self.__pairs = {}, {}, None
+        self.__cff = None
+
+    def __read_names(self):
+        names = {}
+        if "name" in self.tables:
+            data, name = self.data, self.tables["name"][0]
+            count, strings = _u16(data, name + 2)[0], name + _u16(data, name + 4)[0]
+            for i in range(count):
+                platform, encoding, language, name_id, length, offset = struct.unpack_from(">6H", data, name + 6 + 12 * i)
+                if name_id not in (1, 2, 4, 6, 16, 17):
+                    continue
+                raw = data[strings + offset:strings + offset + length]
+                if platform in (0, 3):
+                    value = raw.decode("utf-16-be", "replace")
+                elif platform == 1 and encoding == 0:
+                    value = raw.decode("mac_roman", "replace")
+                else:
+                    continue
+                # English names first (the ones shown by most programs), then all the others
+                english = (platform == 3 and language == 0x409) or (platform == 1 and language == 0)
+                names.setdefault(name_id, [])
+                names[name_id].insert(0, value) if english else names[name_id].append(value)
+
+        self.family = (names.get(16) or names.get(1) or [os.path.splitext(os.path.basename(self.path))[0]])[0]
+        self.subfamily = (names.get(17) or names.get(2) or ["Regular"])[0]
+        self.full_name = (names.get(4) or [self.family + " " + self.subfamily])[0]
+        self.names = {value.lower() for name_id in (1, 4, 6, 16) for value in names.get(name_id, [])}
+        self.names.add(self.family.lower())
+
+    def __read_cmap(self):
+        data, cmap = self.data, self.tables["cmap"][0]
+        subtables = {}
+        for i in range(_u16(data, cmap + 2)[0]):
+            platform, encoding, offset = struct.unpack_from(">HHI", data, cmap + 4 + 8 * i)
+            subtables[(platform, encoding)] = cmap + offset
+
+        # Full Unicode subtables first, then BMP ones, then symbol fonts
+        self.__cmap_symbol = False
+        for key in ((3, 10), (0, 6), (0, 4), (3, 1), (0, 3), (0, 2), (0, 1), (0, 0), (3, 0), (1, 0)):
+            if key in subtables and _u16(data, subtables[key])[0] in (0, 4, 6, 12):
+                offset = subtables[key]
+                self.__cmap_symbol = key == (3, 0)
+                break
+        else:
+            raise ValueError("No supported character map found in font '%s'" % self.path)
+
+        self.__cmap_format = fmt = _u16(data, offset)[0]
+        self.__cmap_offset = offset
+        if fmt == 4:
+            segments = _u16(data, offset + 6)[0] // 2
+            self.__cmap_ends = struct.unpack_from(">%dH" % segments, data, offset + 14)
+            self.__cmap_starts = struct.unpack_from(">%dH" % segments, data, offset + 16 + 2 * segments)
+            self.__cmap_deltas = struct.unpack_from(">%dH" % segments, data, offset + 16 + 4 * segments)
+            self.__cmap_ranges = offset + 16 + 6 * segments
+        elif fmt == 12:
+            groups = _u32(data, offset + 12)[0]
+            values = struct.unpack_from(">%dI" % (3 * groups), data, offset + 16)
+            self.__cmap_starts, self.__cmap_ends, self.__cmap_deltas = values[0::3], values[1::3], values[2::3]
+        self.__cmap_cache = {}
+
+    def glyph_index(self, char):
+        """Returns the index of the glyph of a character (0, the "missing glyph", if the font doesn't have it).
+
+        Parameters:
+            char (str): A single character.
+
+        Returns:
+            The glyph index.
+        """
+        gid = self.__cmap_cache.get(char)
+        if gid is None:
+            code = ord(char)
+            gid = self.__cmap_lookup(code)
+            if gid == 0 and self.__cmap_symbol and code < 0x100:
+                gid = self.__cmap_lookup(code + 0xF000)
+            self.__cmap_cache[char] = gid
+        return gid
+
+    def __cmap_lookup(self, code):
+        data, offset, fmt = self.data, self.__cmap_offset, self.__cmap_format
+        if fmt == 4:
+            i = bisect.bisect_left(self.__cmap_ends, code)
+            if i == len(self.__cmap_ends) or self.__cmap_starts[i] > code:
+                return 0
+            address = self.__cmap_ranges + 2 * i
+            range_offset = _u16(data, address)[0]
+            if range_offset == 0:
+                return (code + self.__cmap_deltas[i]) & 0xFFFF
+            gid = _u16(data, address + range_offset + 2 * (code - self.__cmap_starts[i]))[0]
+            return (gid + self.__cmap_deltas[i]) & 0xFFFF if gid else 0
+        elif fmt == 12:
+            i = bisect.bisect_left(self.__cmap_ends, code)
+            if i == len(self.__cmap_ends) or self.__cmap_starts[i] > code:
+                return 0
+            return self.__cmap_deltas[i] + code - self.__cmap_starts[i]
+        elif fmt == 6:
+            first, count = struct.unpack_from(">HH", data, offset + 6)
+            return _u16(data, offset + 10 + 2 * (code - first))[0] if first <= code < first + count else 0
+        else:
+            return data[offset + 6 + code] if code < 256 else 0
+
+    def advance(self, gid):
+        """Returns the horizontal advance of a glyph, in font units.
+
+        Parameters:
+            gid (int): Glyph index.
+
+        Returns:
+            The advance width.
+        """
+        return _u16(self.data, self.tables["hmtx"][0] + 4 * min(gid, self.__num_hmetrics - 1))[0]
+
+    def kerning(self, left, right):
+        """Returns the kerning between two glyphs, in font units.
+
+        Pairs are taken from the 'kern' feature of the GPOS table (pair adjustments) if the font has it, else from the kern table.
+
+        Parameters:
+            left (int): Glyph index of the first glyph.
+            right (int): Glyph index of the second glyph.
+
+        Returns:
+            The adjustment to the advance of the first glyph (usually negative).
+        """
+        key = (left, right)
+        value = self.__kerning.get(key)
+        if value is None:
+            if self.__pairs is None:
+                self.__pairs = self.__gpos_pair_subtables()
+                if not self.__pairs:
+                    self.__kern_table = self.__read_kern_table()
+            if self.__pairs:
+                value = self.__gpos_kerning(left, right)
+            else:
+                value = self.__kern_table.get(key, 0)
+            self.__kerning[key] = value
+        return value
+
+    def __read_kern_table(self):
+        pairs = {}
+        if "kern" not in self.tables:
+            return pairs
+        data, kern = self.data, self.tables["kern"][0]
+        if _u16(data, kern)[0] == 0:
+            count, offset, mac = _u16(data, kern + 2)[0], kern + 4, False
+        else:
+            count, offset, mac = _u32(data, kern + 4)[0], kern + 8, True
+        for _ in range(count):
+            if mac:
+                length, coverage = _u32(data, offset)[0], _u16(data, offset + 4)[0]
+                fmt, horizontal, header = coverage & 0xFF, not coverage & 0xC000, 8
+            else:
+                length, coverage = _u16(data, offset + 2)[0], _u16(data, offset + 4)[0]
+                fmt, horizontal, header = coverage >> 8, coverage & 1 and not coverage & 6, 6
+            if fmt == 0 and horizontal:
+                n = _u16(data, offset + header)[0]
+                values = struct.unpack_from(">" + "HHh" * n, data, offset + header + 8)
+                for i in range(0, 3 * n, 3):
+                    pairs[(values[i], values[i + 1])] = pairs.get((values[i], values[i + 1]), 0) + values[i + 2]
+            offset += length
+        return pairs
+
+    def __gpos_pair_subtables(self):
+        # Pair adjustment subtables (lookup type 2) of the lookups of every 'kern' feature
+        if "GPOS" not in self.tables:
+            return []
+        data, gpos = self.data, self.tables["GPOS"][0]
+        features, lookups = gpos + _u16(data, gpos + 6)[0], gpos + _u16(data, gpos + 8)[0]
+
+        indices = set()
+        for i in range(_u16(data, features)[0]):
+            tag, offset = struct.unpack_from(">4sH", data, features + 2 + 6 * i)
+            if tag == b"kern":
+                feature = features + offset
+                count = _u16(data, feature + 2)[0]
+                indices.update(struct.unpack_from(">%dH" % count, data, feature + 4))
+
+        subtables = []
+        for index in sorted(indices):
+            lookup = lookups + _u16(data, lookups + 2 + 2 * index)[0]
+            kind, _, count = struct.unpack_from(">HHH", data, lookup)
+            group = []
+            for j in range(count):
+                subtable = lookup + _u16(data, lookup + 6 + 2 * j)[0]
+                sub_kind = kind
+                if kind == 9: # Extension
+                    sub_kind = _u16(data, subtable + 2)[0]
+                    subtable += _u32(data, subtable + 4)[0]
+                if sub_kind == 2:
+                    group.append(subtable)
+            if group:
+                subtables.append(group)
+        return subtables
+
+    def __gpos_kerning(self, left, right):
+        data = self.data
+        total = 0
+        # The first subtable of a lookup covering the pair applies, lookups add their values
+        for group in self.__pairs:
+            for subtable in group:
+                fmt, coverage, format1, format2 = struct.unpack_from(">4H", data, subtable)
+                index = _coverage_index(data, subtable + coverage, left)
+                if index < 0:
+                    continue
+                size1, size2 = 2 * bin(format1).count("1"), 2 * bin(format2).count("1")
+                record = None
+                if fmt == 1:
+                    pair_set = subtable + _u16(data, subtable + 10 + 2 * index)[0]
+                    count = _u16(data, pair_set)[0]
+                    size = 2 + size1 + size2
+                    lo, hi = 0, count
+                    while lo < hi:
+                        mid = (lo + hi) // 2
+                        second = _u16(data, pair_set + 2 + size * mid)[0]
+                        if second < right:
+                            lo = mid + 1
+                        elif second > right:
+                            hi = mid
+                        else:
+                            record = pair_set + 2 + size * mid + 2
+                            break
+                elif fmt == 2:
+                    class_def1, class_def2, count1, count2 = struct.unpack_from(">4H", data, subtable + 8)
+                    class1 = _class_of(data, subtable + class_def1, left)
+                    class2 = _class_of(data, subtable + class_def2, right)
+                    if class1 < count1 and class2 < count2:
+                        record = subtable + 16 + (class1 * count2 + class2) * (size1 + size2)
+                if record is not None:
+                    if format1 & 4: # XAdvance of the first glyph
+                        total += _i16(data, record + 2 * bin(format1 & 3).count("1"))[0]
+                    break
+        return total
+
+    def outline(self, gid):
+        """Returns the outline of a glyph, in font units (y going up).
+
+        Parameters:
+            gid (int): Glyph index.
+
+        Returns:
+            A list of figures, each one a list of commands: ("m", x, y), ("l", x, y) or ("b", x1, y1, x2, y2, x3, y3).
+        """
+        figures = self.__outlines.get(gid)
+        if figures is None:
+            if "glyf" in self.tables:
+                figures = [_quadratic_to_commands(contour) for contour in self.__glyf_contours(gid, 0) if contour]
+            elif "CFF " in self.tables:
+                figures = self.__cff_outline(gid)
+            else:
+                figures = []
+            self.__outlines[gid] = figures
+        return figures
+
+    def __glyf_contours(self, gid, depth):
+        # Contours of a TrueType glyph, as lists of points (x, y, on curve)
+        if gid >= self.num_glyphs or depth > 8:
+            return []
+        data, loca, glyf = self.data, self.tables["loca"][0], self.tables["glyf"][0]
+        if self.__long_loca:
+            start, end = struct.unpack_from(">II", data, loca + 4 * gid)
+        else:
+            start, end = (2 * v for v in struct.unpack_from(">HH", data, loca + 2 * gid))
+        if start >= end:
+            return []
+
+        offset = glyf + start
+        num_contours = _i16(data, offset)[0]
+        offset += 10
+
+        if num_contours >= 0:
+            end_points = struct.unpack_from(">%dH" % num_contours, data, offset)
+            offset += 2 * num_contours
+            offset += 2 + _u16(data, offset)[0] # Instructions are skipped
+            n = end_points[-1] + 1 if end_points else 0
+
+            flags = []
+            while len(flags) < n:
+                flag = data[offset]
+                offset += 1
+                if flag & 8:
+                    flags.extend([flag] * (data[offset] + 1))
+                    offset += 1
+                else:
+                    flags.append(flag)
+
+            coords = []
+            for short, same in ((2, 16), (4, 32)):
+                values, value = [], 0
+                for flag in flags[:n]:
+                    if flag & short:
+                        value += data[offset] if flag & same else -data[offset]
+                        offset += 1
+                    elif not flag & same:
+                        value += _i16(data, offset)[0]
+                        offset += 2
+                    values.append(value)
+                coords.append(values)
+
+            points = [(x, y, flag & 1) for x, y, flag in zip(coords[0], coords[1], flags)]
+            contours, first = [], 0
+            for last in end_points:
+                contours.append(points[first:last + 1])
+                first = last + 1
+            return contours
+
+        # Composite glyph: components with their transformation
+        contours, more = [], True
+        while more:
+            flags, component = struct.unpack_from(">HH", data, offset)
+            offset += 4
+            if flags & 1:
+                arg1, arg2 = struct.unpack_from(">hh" if flags & 2 else ">HH", data, offset)
+                offset += 4
+            else:
+                arg1, arg2 = struct.unpack_from(">bb" if flags & 2 else ">BB", data, offset)
+                offset += 2
+            a, b, c, d = 1.0, 0.0, 0.0, 1.0
+            if flags & 8:
+                a = d = _i16(data, offset)[0] / 16384
+                offset += 2
+            elif flags & 0x40:
+                a, d = (v / 16384 for v in struct.unpack_from(">hh", data, offset))
+                offset += 4
+            elif flags & 0x80:
+                a, b, c, d = (v / 16384 for v in struct.unpack_from(">hhhh", data, offset))
+                offset += 8
+            # Offsets given as points to match are not supported (rare and only used for hinting-like adjustments)
+            dx, dy = (arg1, arg2) if flags & 2 else (0, 0)
+            for contour in self.__glyf_contours(component, depth + 1):
+                contours.append([(a * x + c * y + dx, b * x + d * y + dy, on) for x, y, on in contour])
+            more = flags & 0x20
+        return contours
+
+    def __cff_outline(self, gid):
+        if self.__cff is None:
+            self.__cff = _CFF(self.data, self.tables["CFF "][0])
+        return self.__cff.outline(gid)
+
+
+def _coverage_index(data, coverage, gid):
+    # Index of a glyph in an OpenType coverage table, or -1
+    fmt, count = struct.unpack_from(">HH", data, coverage)
+    if fmt == 1:
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = _u16(data, coverage + 4 + 2 * mid)[0]
+            if value < gid:
+                lo = mid + 1
+            elif value > gid:
+                hi = mid
+            else:
+                return mid
+    elif fmt == 2:
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start, end, index = struct.unpack_from(">HHH", data, coverage + 4 + 6 * mid)
+            if end < gid:
+                lo = mid + 1
+            elif start > gid:
+                hi = mid
+            else:
+                return index + gid - start
+    return -1
+
+
+def _class_of(data, class_def, gid):
+    # Class of a glyph in an OpenType class definition table (0 if not listed)
+    fmt = _u16(data, class_def)[0]
+    if fmt == 1:
+        start, count = struct.unpack_from(">HH", data, class_def + 2)
+        return _u16(data, class_def + 6 + 2 * (gid - start))[0] if start <= gid < start + count else 0
+    elif fmt == 2:
+        lo, hi = 0, _u16(data, class_def + 2)[0]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start, end, value = struct.unpack_from(">HHH", data, class_def + 4 + 6 * mid)
+            if end < gid:
+                lo = mid + 1
+            elif start > gid:
+                hi = mid
+            else:
+                return value
+    return 0
+
+
+def _quadratic_to_commands(points):
+    # Commands of a TrueType contour: quadratic curves are converted exactly to cubic ones
+    for i in range(len(points)):
+        if points[i][2]:
+            points = points[i:] + points[:i]
+            break
+    else:
+        # Only off curve points: starting from the implied on curve point between the last and the first one
+        points = [((points[-1][0] + points[0][0]) / 2, (points[-1][1] + points[0][1]) / 2, 1)] + points
+
+    x0, y0 = points[0][0], points[0][1]
+    commands = [("m", x0, y0)]
+    control = None
+    for x, y, on in points[1:] + points[:1]:
+        if on:
+            if control is None:
+                commands.append(("l", x, y))
+            else:
+                commands.append(_quad_to_cubic(x0, y0, control[0], control[1], x, y))
+                control = None
+            x0, y0 = x, y
+        else:
+            if control is not None:
+                # Two off curve points in a row: there's an implied on curve point between them
+                mx, my = (control[0] + x) / 2, (control[1] + y) / 2
+                commands.append(_quad_to_cubic(x0, y0, control[0], control[1], mx, my))
+                x0, y0 = mx, my
+            control = (x, y)
+    return commands
+
+
+def _quad_to_cubic(x0, y0, qx, qy, x1, y1):
+    return ("b", x0 + 2 / 3 * (qx - x0), y0 + 2 / 3 * (qy - y0), x1 + 2 / 3 * (qx - x1), y1 + 2 / 3 * (qy - y1), x1, y1)
+
+
+class _CFF:
+    # Compact Font Format outlines (the ones of .otf fonts), with an interpreter of Type 2 charstrings
+
+    def __init__(self, data, offset):
+        self.data = data
+        header_size = data[offset + 2]
+        names, position = _cff_index(data, offset + header_size)
+        top_dicts, position = _cff_index(data, position)
+        _, position = _cff_index(data, position) # Strings
+        self.global_subrs, _ = _cff_index(data, position)
+
+        top = _cff_dict(data, *top_dicts[0])
+        self.char_strings, _ = _cff_index(data, offset + int(top[17][0]))
+
+        if (12, 36) in top:
+            # CID-keyed font: every glyph has its own private dictionary, selected by FDSelect
+            font_dicts, _ = _cff_index(data, offset + int(top[(12, 36)][0]))
+            self.private_subrs = [self.__private_subrs(offset, _cff_dict(data, *fd)) for fd in font_dicts]
+            self.fd_select = self.__fd_select(offset + int(top[(12, 37)][0]), len(self.char_strings))
+        else:
+            self.private_subrs = [self.__private_subrs(offset, top)]
+            self.fd_select = None
+
+    def __private_subrs(self, offset, font_dict):
+        if 18 not in font_dict:
+            return []
+        size, private = (int(v) for v in font_dict[18])
+        private_dict = _cff_dict(self.data, offset + private, offset + private + size)
+        if 19 not in private_dict:
+            return []
+        return _cff_index(self.data, offset + private + int(private_dict[19][0]))[0]
+
+    def __fd_select(self, offset, count):
+        data = self.data
+        if data[offset] == 0:
+            return list(data[offset + 1:offset + 1 + count])
+        # Format 3: ranges
+        ranges = _u16(data, offset + 1)[0]
+        select = [0] * count
+        for i in range(ranges):
+            first, fd = struct.unpack_from(">HB", data, offset + 3 + 3 * i)
+            last = _u16(data, offset + 3 + 3 * (i + 1))[0]
+            select[first:last] = [fd] * (last - first)
+        return select
+
+    def outline(self, gid):
+        if gid >= len(self.char_strings):
+            return []
+        local_subrs = self.private_subrs[self.fd_select[gid] if self.fd_select else 0]
+        global_subrs = self.global_subrs
+        data = self.data
+
+        figures, commands = [], []
+        stack, stems = [], 0
+        x = y = 0.0
+        width_parsed = False
+
+        def bias(subrs):
+            return 107 if len(subrs) < 1240 else 1131 if len(subrs) < 33900 else 32768
+
+        def move_to(dx, dy):
+            nonlocal x, y, commands
+            x, y = x + dx, y + dy
+            commands = [("m", x, y)]
+            figures.append(commands)
+
+        def line_to(dx, dy):
+            nonlocal x, y
+            x, y = x + dx, y + dy
+            commands.append(("l", x, y))
+
+        def curve_to(dxa, dya, dxb, dyb, dxc, dyc):
+            nonlocal x, y
+            xa, ya = x + dxa, y + dya
+            xb, yb = xa + dxb, ya + dyb
+            x, y = xb + dxc, yb + dyc
+            commands.append(("b", xa, ya, xb, yb, x, y))
+
+        def run(start, end, depth):
+            nonlocal stack, stems, width_parsed
+            i = start
+            while i < end:
+                b0 = data[i]
+                # Operands
+                if b0 >= 32 or b0 == 28:
+                    if b0 == 28:
+                        stack.append(_i16(data, i + 1)[0])
+                        i += 3
+                    elif b0 <= 246:
+                        stack.append(b0 - 139)
+                        i += 1
+                    elif b0 <= 250:
+                        stack.append((b0 - 247) * 256 + data[i + 1] + 108)
+                        i += 2
+                    elif b0 <= 254:
+                        stack.append(-(b0 - 251) * 256 - data[i + 1] - 108)
+                        i += 2
+                    else:
+                        stack.append(struct.unpack_from(">i", data, i + 1)[0] / 65536)
+                        i += 5
+                    continue
+
+                i += 1
+                # The first stack-clearing operator can have the advance width as first operand (ignored, hmtx is used)
+                if not width_parsed and b0 in (1, 3, 18, 23, 19, 20, 21, 22, 4, 14):
+                    width_parsed = True
+                    if len(stack) % 2 != (1 if b0 in (22, 4) else 0):
+                        stack = stack[1:]
+
+                if b0 in (1, 3, 18, 23): # hstem, vstem, hstemhm, vstemhm
+                    stems += len(stack) // 2
+                    stack = []
+                elif b0 in (19, 20): # hintmask, cntrmask (with implied vstem operands)
+                    stems += len(stack) // 2
+                    stack = []
+                    i += (stems + 7) // 8
+                elif b0 == 21: # rmoveto
+                    move_to(stack[-2], stack[-1])
+                    stack = []
+                elif b0 == 22: # hmoveto
+                    move_to(stack[-1], 0)
+                    stack = []
+                elif b0 == 4: # vmoveto
+                    move_to(0, stack[-1])
+                    stack = []
+                elif b0 == 5: # rlineto
+                    for j in range(0, len(stack) - 1, 2):
+                        line_to(stack[j], stack[j + 1])
+                    stack = []
+                elif b0 in (6, 7): # hlineto, vlineto
+                    horizontal = b0 == 6
+                    for value in stack:
+                        line_to(value, 0) if horizontal else line_to(0, value)
+                        horizontal = not horizontal
+                    stack = []
+                elif b0 == 8: # rrcurveto
+                    for j in range(0, len(stack) - 5, 6):
+                        curve_to(*stack[j:j + 6])
+                    stack = []
+                elif b0 == 24: # rcurveline
+                    j = 0
+                    while j + 6 <= len(stack) - 2:
+                        curve_to(*stack[j:j + 6])
+                        j += 6
+                    line_to(stack[j], stack[j + 1])
+                    stack = []
+                elif b0 == 25: # rlinecurve
+                    j = 0
+                    while j + 2 <= len(stack) - 6:
+                        line_to(stack[j], stack[j + 1])
+                        j += 2
+                    curve_to(*stack[j:j + 6])
+                    stack = []
+                elif b0 in (26, 27): # vvcurveto, hhcurveto
+                    j, d = 0, 0
+                    if len(stack) % 4 == 1:
+                        d, j = stack[0], 1
+                    while j + 4 <= len(stack):
+                        if b0 == 26:
+                            curve_to(d, stack[j], stack[j + 1], stack[j + 2], 0, stack[j + 3])
+                        else:
+                            curve_to(stack[j], d, stack[j + 1], stack[j + 2], stack[j + 3], 0)
+                        d, j = 0, j + 4
+                    stack = []
+                elif b0 in (30, 31): # vhcurveto, hvcurveto
+                    horizontal = b0 == 31
+                    j = 0
+                    while j + 4 <= len(stack):
+                        last = stack[j + 4] if len(stack) - j == 5 else 0
+                        if horizontal:
+                            curve_to(stack[j], 0, stack[j + 1], stack[j + 2], last, stack[j + 3])
+                        else:
+                            curve_to(0, stack[j], stack[j + 1], stack[j + 2], stack[j + 3], last)
+                        horizontal = not horizontal
+                        j += 4
+                    stack = []
+                elif b0 in (10, 29): # callsubr, callgsubr
+                    subrs = local_subrs if b0 == 10 else global_subrs
+                    index = int(stack.pop()) + bias(subrs)
+                    if depth < 10 and 0 <= index < len(subrs):
+                        if run(subrs[index][0], subrs[index][1], depth + 1):
+                            return True
+                elif b0 == 11: # return
+                    return False
+                elif b0 == 14: # endchar
+                    return True
+                elif b0 == 12:
+                    b1 = data[i]
+                    i += 1
+                    s = stack
+                    if b1 == 35: # flex
+                        curve_to(*s[0:6])
+                        curve_to(*s[6:12])
+                    elif b1 == 34: # hflex
+                        curve_to(s[0], 0, s[1], s[2], s[3], 0)
+                        curve_to(s[4], 0, s[5], -s[2], s[6], 0)
+                    elif b1 == 36: # hflex1
+                        curve_to(s[0], s[1], s[2], s[3], s[4], 0)
+                        curve_to(s[5], 0, s[6], s[7], s[8], -(s[1] + s[3] + s[7]))
+                    elif b1 == 37: # flex1
+                        dx = s[0] + s[2] + s[4] + s[6] + s[8]
+                        dy = s[1] + s[3] + s[5] + s[7] + s[9]
+                        curve_to(*s[0:6])
+                        if abs(dx) > abs(dy):
+                            curve_to(s[6], s[7], s[8], s[9], s[10], -dy)
+                        else:
+                            curve_to(s[6], s[7], s[8], s[9], -dx, s[10])
+                    stack = []
+                else:
+                    stack = []
+            return False
+
+        start, end = self.char_strings[gid]
+        run(start, end, 0)
+        return [figure for figure in figures if len(figure) > 1]
+
+
+def _cff_index(data, offset):
+    # Items of a CFF INDEX as (start, end) positions, and the position after it
+    count = _u16(data, offset)[0]
+    if count == 0:
+        return [], offset + 2
+    size = data[offset + 2]
+    offsets = [int.from_bytes(data[offset + 3 + size * i:offset + 3 + size * (i + 1)], "big") for i in range(count + 1)]
+    base = offset + 2 + size * (count + 1)
+    return [(base + offsets[i], base + offsets[i + 1]) for i in range(count)], base + offsets[-1]
+
+
+def _cff_dict(data, start, end):
+    # Operators of a CFF DICT with their operands
+    result, operands = {}, []
+    i = start
+    while i < end:
+        b0 = data[i]
+        if b0 <= 21:
+            if b0 == 12:
+                key, i = (12, data[i + 1]), i + 2
+            else:
+                key, i = b0, i + 1
+            result[key], operands = operands, []
+        elif b0 == 28:
+            operands.append(_i16(data, i + 1)[0])
+            i += 3
+        elif b0 == 29:
+            operands.append(struct.unpack_from(">i", data, i + 1)[0])
+            i += 5
+        elif b0 == 30:
+            # Real number, as nibbles
+            chars, i = "", i + 1
+            while True:
+                byte = data[i]
+                i += 1
+                done = False
+                for nibble in (byte >> 4, byte & 15):
+                    if nibble == 15:
+                        done = True
+                        break
+                    chars += "0123456789.EE?-"[nibble] + ("-" if nibble == 12 else "")
+                if done:
+                    break
+            operands.append(float(chars or 0))
+        elif b0 <= 246:
+            operands.append(b0 - 139)
+            i += 1
+        elif b0 <= 250:
+            operands.append((b0 - 247) * 256 + data[i + 1] + 108)
+            i += 2
+        elif b0 <= 254:
+            operands.append(-(b0 - 251) * 256 - data[i + 1] - 108)
+            i += 2
+        else:
+            i += 1
+    return result
+
+
+@functools.lru_cache(maxsize=None)
+def _font_index(dirs):
+    # (names, weight, italic, path, index) of every font found in the given directories
+    index = []
+    for directory in dirs:
+        for root, _, files in os.walk(directory):
+            for name in sorted(files):
+                if not name.lower().endswith(FONT_EXTENSIONS):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    with open(path, "rb") as f:
+                        header = f.read(12)
+                    count = _u32(header, 8)[0] if header[:4] == b"ttcf" else 1
+                    for i in range(count):
+                        font = FontFile(path, i)
+                        index.append((font.names, font.weight, font.italic, path, i))
+                        font.close()
+                except (OSError, ValueError, struct.error, IndexError):
+                    continue # Not a font we can read
+    return index
+
+
+@functools.lru_cache(maxsize=64)
+def open_font(path, index=0):
+    """Returns the :class:`FontFile` of a font file, opening every file only once per process.
+
+    Parameters:
+        path (str): Path of the font file.
+        index (int, optional): Index of the font, for font collections.
+
+    Returns:
+        A :class:`FontFile` object.
+    """
+    return FontFile(path, index)
+
+
+def find_font(family, bold=False, italic=False):
+    """Finds the font file of a family in the font directories (see ``FONT_DIRS``), like fontconfig does.
+
+    | The family is compared (ignoring case) with the family, full and PostScript names of the fonts found.
+    | Among the fonts of the family, the one with nearest weight and same slant is taken.
+    | If the family is not found, one of ``FALLBACK_FAMILIES`` is used (or any font, as last resort).
+
+    Parameters:
+        family (str): Font family name (f.e. "Arial"), or the path of a font file.
+        bold (bool, optional): Look for a bold font.
+        italic (bool, optional): Look for an italic font.
+
+    Returns:
+        The :class:`FontFile` found, or None if no font is available at all.
+
+    Examples:
+        ..  code-block:: python3
+
+            font = find_font("DejaVu Sans", bold=True)
+            print( font.full_name )
+
+        >>> DejaVu Sans Bold
+    """
+    if os.path.isfile(family):
+        return open_font(family)
+
+    fonts = _font_index(tuple(FONT_DIRS))
+    weight = 700 if bold else 400
+    for name in [family] + FALLBACK_FAMILIES:
+        name = name.lower()
+        candidates = [font for font in fonts if name in font[0]]
+        if candidates:
+            # Slant is more important than weight, like in fontconfig
+            best = min(candidates, key=lambda font: (font[2] != bool(italic), abs(font[1] - weight)))
+            return open_font(best[3], best[4])
+    return open_font(fonts[0][3], fonts[0][4]) if fonts else None
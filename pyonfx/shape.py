@@ -17,8 +17,14 @@
 
 import re
 import math
-from pyquaternion import Quaternion
+import bisect
+import random
+import functools
 from inspect import signature
+from .serialization import format_value, format_values, format_list
+
+# CONFIGURATION
+TEMPLATES_CACHE_SIZE = 1024 # How many drawing commands of generated shapes (ring, ellipse, star...) to keep for each kind of shape
 
 
 class Shape:
@@ -35,6 +41,28 @@ class Shape:
             raise TypeError("A string containing the shape's drawing commands is expected, but you passed a " + str(type(drawing_cmds)))
         self.drawing_cmds = drawing_cmds
 
+    @property
+    def drawing_cmds(self):
+        """The shape's drawing commands in ASS format as a string (pending transformations, if any, are applied before returning them)."""
+        if self.__matrix is not None:
+            # Applying all the transformations requested so far in a single pass
+            a, b, c, d, e, f = self.__matrix
+            self.__matrix = None
+            if a == 1 and b == 0 and c == 0 and d == 1:
+                self.map(lambda x, y: (x + e, y + f))
+            else:
+                self.map(lambda x, y: (a*x + c*y + e, b*x + d*y + f))
+        return self.__drawing_cmds
+
+    @drawing_cmds.setter
+    def drawing_cmds(self, drawing_cmds):
+        self.__drawing_cmds = drawing_cmds
+        self.__matrix = None
+        # Parsed drawing commands (see __parse), cleared every time the shape changes
+        self.__parsed = None
+        # Cached bounding boxes (exact and not), cleared every time the shape changes
+        self.__bounding = {}
+
     def __repr__(self):
         # We return drawing commands as a string rapresentation of the object
         return self.drawing_cmds
@@ -46,96 +74,37 @@ class Shape:
         else:
             return False
 
-    @staticmethod
-    def format_value(x, prec=3):
-        # Utility function to properly format values for shapes also returning them as a string
-        return f"{x:.{prec}f}".rstrip('0').rstrip('.')
+    # Utility function to properly format values for shapes also returning them as a string (see serialization.format_value)
+    format_value = staticmethod(format_value)
 
     def has_error(self):
         """Utility function that checks if the shape is valid.
 
         Returns:
-            False if no error has been found, else a string with the first error encountered.
-        """
-        # Obtain commands and points
-        cad = self.drawing_cmds.split()
-        n = len(cad)
-        mode = ""
+            False if no error has been found, else a string with the first error encountered (and its position in the drawing commands).
 
-        # Prepare usefull lists
-        two_args_cmds = ['m', 'n', 'l', 'p']
-        six_args_cmds = ['b', 's']
+        Examples:
+            ..  code-block:: python3
 
-        # Iterate over commands and points
-        i = 0
-        while i < n:
-            if cad[i] in two_args_cmds:
-                # Check if we have an unexpected and of the shape
-                if n-i < 3:
-                    return f"Unexpected end of shape ('{cad[i]}' expect at least two args)"
+                print( Shape("m 0 0 l 10 0 10").has_error() )
 
-                # Check if we have two numeric values after command
-                try:
-                    float(cad[i+1])
-                    float(cad[i+2])
-                except ValueError:
-                    return f"Expected numeric value at: '{cad[i]} {cad[i+1]} {cad[i+2]}'"
-
-                # Valid, go on
-                mode = cad[i]
-                i += 3
-            elif cad[i] in six_args_cmds:
-                # Check if we have an unexpected and of the shape
-                if n-i < 7:
-                    return f"Unexpected end of shape ('{cad[i]}' expect at least six args)"
-
-                # Check if we have six numeric values after command
-                try:
-                    for x in range(1, 7):
-                        float(cad[i+x])
-                except ValueError:
-                    return f"Expected numeric value at: '{cad[i]} {' '.join(cad[i+1:i+7])}'"
-
-                # Valid, go on
-                mode = cad[i]
-                i += 7
-            elif cad[i] == 'c':
-                # 'c' expect no arguments, skip
-                mode = ""
-                i += 1
-            elif mode in two_args_cmds:
-                # Check if we have an unexpected and of the shape
-                if n-i < 2:
-                    return f"Unexpected end of shape ('{cad[i]}' expect at least two args)"
-
-                # Check if we have two numeric values
-                try:
-                    float(cad[i])
-                    float(cad[i+1])
-                except ValueError:
-                    return f"Expected numeric value at: '{mode} ... {cad[i]} {cad[i+1]}'"
-
-                # Valid, go on
-                i += 2
-            elif mode in six_args_cmds:
-                # Check if we have an unexpected and of the shape
-                if n-i < 6:
-                    return f"Unexpected end of shape ('{cad[i]}' expect at least six args)"
-
-                # Check if we have six numeric values
-                try:
-                    for x in range(6):
-                        float(cad[i+x])
-                except ValueError:
-                    return f"Expected numeric value at: '{mode} ... {' '.join(cad[i:i+6])}'"
+            >>> Unexpected end of 'l' command at position 15 ('l' expects two values per point)
+        """
+        try:
+            _parse_drawing(self.drawing_cmds, strict=True)
+        except ValueError as e:
+            return str(e)
+        return False
 
-                # Valid, go on
-                i += 6
-            else:
-                # Wtf is this?
-                return f"Unexpected command '{cad[i]}'"
+    def __parse(self):
+        # Tokens and commands of the shape (see _parse_drawing), parsed once and kept until the shape changes
+        # (leniently, like shape methods always did: only has_error reports malformed drawings)
+        # Applying pending transformations (this will clear the cache if needed)
+        drawing_cmds = self.drawing_cmds
 
-        return False
+        if self.__parsed is None:
+            self.__parsed = _parse_drawing(drawing_cmds)
+        return self.__parsed
 
     def map(self, fun):
         """Sends every point of a shape through given transformation function to change them.
@@ -159,62 +128,144 @@ class Shape:
         if not callable(fun):
             raise TypeError("(Lambda) function expected")
 
-        # Getting all points and commands in a list
-        cmds_and_points = self.drawing_cmds.split()
-        i = 0
-        n = len(cmds_and_points)
+        # Getting all points and commands
+        tokens, commands = self.__parse()
+        cmds_and_points = tokens[:]
+        indexes, results = [], []
 
         # Checking whether the function take the typ parameter or not
-        if len(signature(fun).parameters) == 2:
-            while i < n:
-                try:
-                    # Applying transformation
-                    x, y = fun(float(cmds_and_points[i]), float(cmds_and_points[i+1]))
-                except TypeError:
-                    # Values weren't returned, so we don't need to modify them
-                    i += 2
-                    continue
-                except ValueError:
-                    # We have found a string, let's skip this
-                    i += 1
-                    continue
-                except IndexError:
-                    raise ValueError("Unexpected end of the shape")
+        with_typ = len(signature(fun).parameters) != 2
 
-                # Convert back to string the results for later
-                cmds_and_points[i:i+2] = Shape.format_value(x), Shape.format_value(y)
-                i += 2
-        else:
-            typ = ""
-            while i < n:
+        for typ, first, values in commands:
+            for i in range(0, len(values), 2):
                 try:
                     # Applying transformation
-                    x, y = fun(float(cmds_and_points[i]), float(cmds_and_points[i+1]), typ)
+                    if with_typ:
+                        x, y = fun(values[i], values[i+1], typ)
+                    else:
+                        x, y = fun(values[i], values[i+1])
                 except TypeError:
                     # Values weren't returned, so we don't need to modify them
-                    i += 2
                     continue
-                except ValueError:
-                    # We have found a string, let's skip this
-                    typ = cmds_and_points[i]
-                    i += 1
-                    continue
-                except IndexError:
-                    raise ValueError("Unexpected end of the shape")
 
-                # Convert back to string the results for later
-                cmds_and_points[i:i+2] = Shape.format_value(x), Shape.format_value(y)
-                i += 2
+                indexes.append(first + i)
+                results.append(x)
+                results.append(y)
+
+        # Convert back to string all the results at once
+        for i, x, y in zip(indexes, *[iter(format_list(results))] * 2):
+            cmds_and_points[i], cmds_and_points[i+1] = x, y
 
         # Sew up everything back and update shape
         self.drawing_cmds = ' '.join(cmds_and_points)
         return self
 
-    def bounding(self):
+    def transform(self, matrix):
+        """Applies an affine transformation to the shape's points.
+
+        | The transformation is not applied immediately: consecutive calls to :func:`transform` (and to the helpers :func:`translate`, :func:`scale`, :func:`rotate`, :func:`shear` and :func:`move`)
+          are composed in a single matrix, which is applied to the points in a single pass only when the drawing commands are needed.
+        | So chaining a lot of transformations costs just like applying one.
+
+        Parameters:
+            matrix (list of lists): The affine transformation matrix, as a 3x3 ``[[a, c, e], [b, d, f], [0, 0, 1]]`` or a 2x3 ``[[a, c, e], [b, d, f]]`` matrix, with new points being x' = a*x + c*y + e and y' = b*x + d*y + f.
+
+        Returns:
+            A pointer to the current object.
+
+        Examples:
+            ..  code-block:: python3
+
+                print( Shape("m 0 0 l 20 0 20 10 0 10").transform([[2, 0, 10], [0, 1, 5], [0, 0, 1]]) )
+
+            >>> m 10 5 l 50 5 50 15 10 15
+        """
+        try:
+            (a, c, e), (b, d, f) = matrix[0], matrix[1]
+            a, b, c, d, e, f = float(a), float(b), float(c), float(d), float(e), float(f)
+        except (TypeError, ValueError, IndexError):
+            raise TypeError("A 3x3 or 2x3 matrix of numbers expected")
+
+        # Composing the new transformation after the pending one
+        if self.__matrix is not None:
+            a0, b0, c0, d0, e0, f0 = self.__matrix
+            a, b, c, d, e, f = a*a0 + c*b0, b*a0 + d*b0, a*c0 + c*d0, b*c0 + d*d0, a*e0 + c*f0 + e, b*e0 + d*f0 + f
+        self.__matrix = (a, b, c, d, e, f)
+        return self
+
+    def translate(self, x=0, y=0):
+        """Translates the shape's points (lazily, see :func:`transform`).
+
+        Parameters:
+            x (int or float): Displacement along the x-axis.
+            y (int or float): Displacement along the y-axis.
+
+        Returns:
+            A pointer to the current object.
+        """
+        return self.transform([[1, 0, x], [0, 1, y]])
+
+    def scale(self, x=1, y=None):
+        """Scales the shape's points from the origin (0,0) (lazily, see :func:`transform`).
+
+        Parameters:
+            x (int or float): Horizontal scale factor (1 = no scale).
+            y (int or float, optional): Vertical scale factor (1 = no scale). If not given, it will be the same as x.
+
+        Returns:
+            A pointer to the current object.
+        """
+        if y is None:
+            y = x
+        return self.transform([[x, 0, 0], [0, y, 0]])
+
+    def rotate(self, angle):
+        """Rotates the shape's points around the origin (0,0) (lazily, see :func:`transform`).
+
+        Parameters:
+            angle (int or float): Rotation angle in degrees. Just like \\frz, positive values rotate counter-clockwise.
+
+        Returns:
+            A pointer to the current object.
+        """
+        try:
+            rad = math.radians(angle)
+        except TypeError:
+            raise TypeError("Number expected")
+        # Snapping values to avoid things like "-0" for multiples of 90 degrees
+        cos, sin = round(math.cos(rad), 15), round(math.sin(rad), 15)
+        return self.transform([[cos, sin, 0], [-sin, cos, 0]])
+
+    def shear(self, x=0, y=0):
+        """Shears the shape's points (lazily, see :func:`transform`).
+
+        Parameters:
+            x (int or float): Horizontal shearing factor, like \\fax (x' = x + factor * y).
+            y (int or float): Vertical shearing factor, like \\fay (y' = y + factor * x).
+
+        Returns:
+            A pointer to the current object.
+        """
+        return self.transform([[1, x, 0], [y, 1, 0]])
+
+    def __points(self):
+        # Yields every point of the shape as (x, y, type), in the same order map does
+        for typ, _, values in self.__parse()[1]:
+            for i in range(0, len(values), 2):
+                yield values[i], values[i+1], typ
+
+    def bounding(self, exact=False):
         """Calculates shape bounding box.
 
+        | The result is cached, so calling this function again on a shape that hasn't changed in the meanwhile costs nothing.
+        | By default, the control points of bezier curves are part of the box. If you need the tight box of the curves
+          (without having to :func:`flatten` the shape), use exact=True: the extrema of the curves will be calculated analytically.
+
         **Tips:** *Using this you can get more precise information about a shape (width, height, position).*
 
+        Parameters:
+            exact (bool, optional): If True, the box will contain the curves, but not their control points (b-splines will still use their control points).
+
         Returns:
             A tuple (x0, y0, x1, y1) containing coordinates of the bounding box.
 
@@ -222,10 +273,18 @@ class Shape:
             ..  code-block:: python3
 
                 print("Left-top: %d %d\\nRight-bottom: %d %d" % ( Shape("m 10 5 l 25 5 25 42 10 42").bounding() ) )
+                print( Shape("m 0 0 b 0 -10 10 -10 10 0").bounding(exact=True) )
 
             >>> Left-top: 10 5
             >>> Right-bottom: 25 42
+            >>> (0.0, -7.5, 10.0, 0.0)
         """
+        # Applying pending transformations (this will clear the cache if needed)
+        self.drawing_cmds
+
+        exact = bool(exact)
+        if exact in self.__bounding:
+            return self.__bounding[exact]
 
         # Bounding data
         x0, y0, x1, y1 = None, None, None, None
@@ -237,16 +296,58 @@ class Shape:
                 x0, y0, x1, y1 = min(x0, x), min(y0, y), max(x1, x), max(y1, y)
             else:
                 x0, y0, x1, y1 = x, y, x, y
-            return x, y
 
-        self.map(compute_edges)
+        if not exact:
+            for x, y, _ in self.__points():
+                compute_edges(x, y)
+        else:
+            # Values of t in (0, 1) where a coordinate of a bezier curve has a minimum or a maximum
+            def curve_extrema(p0, p1, p2, p3):
+                # Derivative of the curve (divided by 3): a*t^2 + b*t + c
+                a, b, c = -p0 + 3*p1 - 3*p2 + p3, 2 * (p0 - 2*p1 + p2), p1 - p0
+                if abs(a) < 1e-12:
+                    roots = [-c / b] if abs(b) > 1e-12 else []
+                else:
+                    delta = b*b - 4*a*c
+                    if delta < 0:
+                        return []
+                    delta = math.sqrt(delta)
+                    roots = [(-b + delta) / (2*a), (-b - delta) / (2*a)]
+                return [t for t in roots if 0 < t < 1]
+
+            def curve_point(p0, p1, p2, p3, t):
+                mt = 1 - t
+                return mt*mt*mt*p0 + 3*mt*mt*t*p1 + 3*mt*t*t*p2 + t*t*t*p3
+
+            last_point, curve = None, []
+            for x, y, typ in self.__points():
+                if typ == "b" and last_point is not None:
+                    # Collecting the 3 points of the curve
+                    curve.extend((x, y))
+                    if len(curve) < 6:
+                        continue
+
+                    (px0, py0), (px1, py1, px2, py2, px3, py3) = last_point, curve
+                    # The start point is already in the box, so we can pair it with the extrema
+                    for t in curve_extrema(px0, px1, px2, px3):
+                        compute_edges(curve_point(px0, px1, px2, px3, t), py0)
+                    for t in curve_extrema(py0, py1, py2, py3):
+                        compute_edges(px0, curve_point(py0, py1, py2, py3, t))
+                    x, y, curve = px3, py3, []
+                else:
+                    curve = []
+
+                compute_edges(x, y)
+                last_point = x, y
+
+        self.__bounding[exact] = x0, y0, x1, y1
         return x0, y0, x1, y1
 
     def move(self, x=None, y=None):
         """Moves shape coordinates in given direction.
 
         | If neither x and y are passed, it will automatically center the shape to the origin (0,0).
-        | This function is an high level function, it just uses Shape.map, which is more advanced. Additionally, it is an easy way to center a shape.
+        | This function is an high level function, it just uses :func:`translate`. Additionally, it is an easy way to center a shape.
 
         Parameters:
             x (int or float): Displacement along the x-axis.
@@ -270,8 +371,7 @@ class Shape:
             y = 0
 
         # Update shape
-        self.map(lambda cx, cy: (cx+x, cy+y))
-        return self
+        return self.translate(x, y)
 
     def flatten(self, tolerance=1.0):
         """Splits shape's bezier curves into lines.
@@ -330,14 +430,13 @@ class Shape:
         # Inner function to convert 4th degree curve to line points
         def curve4_to_lines(x0, y0, x1, y1, x2, y2, x3, y3):
             # Line points buffer
-            pts = ""
+            pts = []
 
             # Conversion in recursive processing
             def convert_recursive(x0, y0, x1, y1, x2, y2, x3, y3):
                 if curve4_is_flat(x0, y0, x1, y1, x2, y2, x3, y3):
-                    nonlocal pts
-                    x3, y3 = Shape.format_value(x3), Shape.format_value(y3)
-                    pts += f"{x3} {y3} "
+                    pts.append(x3)
+                    pts.append(y3)
                     return
 
                 x10, y10, x11, y11, x12, y12, x13, y13, x20, y20, x21, y21, x22, y22, x23, y23 = curve4_subdivide(x0, y0, x1, y1, x2, y2, x3, y3, 0.5)
@@ -346,67 +445,49 @@ class Shape:
 
             # Splitting curve recursively until we're not satisfied (angle <= tolerance)
             convert_recursive(x0, y0, x1, y1, x2, y2, x3, y3)
-            # Return resulting points
-            return ' '.join(pts[:-1].split(' ')[:-2])  # Delete last space and last two float values
-
-        # Getting all points and commands in a list
-        cmds_and_points = self.drawing_cmds.split()
-        i = 0
-        n = len(cmds_and_points)
-
-        # Scanning all commands and points (improvable)
-        while i < n:
-            if cmds_and_points[i] == "b":  # We've found a curve, let's split it into lines
-                try:
-                    # Getting all the points: if we don't have exactly 8 points, shape is not valid
-                    x0, y0 = float(cmds_and_points[i-2]), float(cmds_and_points[i-1])
-                    x1, y1 = float(cmds_and_points[i+1]), float(cmds_and_points[i+2])
-                    x2, y2 = float(cmds_and_points[i+3]), float(cmds_and_points[i+4])
-                    x3, y3 = float(cmds_and_points[i+5]), float(cmds_and_points[i+6])
-                except IndexError:
-                    raise ValueError("Shape providen is not valid (not enough points for a curve)")
-
-                # Obtaining the converted curve and saving it for later
-                cmds_and_points[i] = "l"
-                cmds_and_points[i+1] = curve4_to_lines(x0, y0, x1, y1, x2, y2, x3, y3)
-
-                i += 2
-                n -= 3
-
-                # Deleting the remaining points
-                for _ in range(3):
-                    del cmds_and_points[i]
-
-                # Going to the next point
-                i += 2
-
-                # Check if we're at the end of the shape
-                if i < n:
-                    # Check for implicit bezier curve
-                    try:
-                        float(cmds_and_points[i])  # Next number is a float?
-                        cmds_and_points.insert(i, "b")
-                        n += 1
-                    except ValueError:
-                        pass
-            elif cmds_and_points[i] == "c": # Deleting c tag?
-                del cmds_and_points[i]
-                n -= 1
-            else:
-                i += 1
+            # Return resulting points, without the last one
+            return format_values(pts[:-2])
+
+        # Getting all points and commands
+        tokens, commands = self.__parse()
+        cmds_and_points = []
+        x0, y0 = 0.0, 0.0 # Current point
+
+        for typ, first, values in commands:
+            if typ == "b": # We've found curves, let's split them into lines
+                n = len(values) - len(values) % 6
+                for i in range(0, n, 6):
+                    x1, y1, x2, y2, x3, y3 = values[i:i+6]
+                    # Converted curve (without its last point, which is written as it was)
+                    cmds_and_points.extend(("l", curve4_to_lines(x0, y0, x1, y1, x2, y2, x3, y3), tokens[first+i+4], tokens[first+i+5]))
+                    x0, y0 = x3, y3
+                # Points of an incomplete curve are left as they are
+                if n < len(values):
+                    cmds_and_points.append("b")
+                    cmds_and_points.extend(tokens[first+n:first+len(values)])
+                    x0, y0 = values[-2], values[-1]
+            elif typ != "c": # Deleting c tag
+                cmds_and_points.append(typ)
+                cmds_and_points.extend(tokens[first:first+len(values)])
+                if values:
+                    x0, y0 = values[-2], values[-1]
 
         # Update shape
         self.drawing_cmds = ' '.join(cmds_and_points)
         return self
 
-    def split(self, max_len=16, tolerance=1.0):
+    def split(self, max_len=16, tolerance=1.0, points=None):
         """Splits shape bezier curves into lines and splits lines into shorter segments with maximum given length.
 
+        | If points is given, every figure is instead resampled to exactly that number of points, evenly spaced along its outline
+          (useful to morph between shapes, or to emit particles along them).
+
         **Tips:** *You can call this before using :func:`map` to work with more outline points for smoother deforming.*
 
         Parameters:
             tolerance (float): Angle in degree to define a bezier curve as flat (increasing it will boost performance during reproduction, but lower accuracy)
             max_len (int or float): The max length that you want all the lines to be
+            points (int, optional): If given, the number of evenly spaced points of every figure (max_len is ignored).
 
         Returns:
             A pointer to the current object.
@@ -418,111 +499,431 @@ class Shape:
 
             >>> m -100.5 0 l -100 0 -90 0 -80 0 -70 0 -60 0 -50 0 -40 0 -30 0 -20 0 -10 0 0 0 10 0 20 0 30 0 40 0 50 0 60 0 70 0 80 0 90 0 100 0 l 99.964 2.325 99.855 4.614 99.676 6.866 99.426 9.082 99.108 11.261 98.723 13.403 98.271 15.509 97.754 17.578 97.173 19.611 96.528 21.606 95.822 23.566 95.056 25.488 94.23 27.374 93.345 29.224 92.403 31.036 91.405 32.812 90.352 34.552 89.246 36.255 88.086 37.921 86.876 39.551 85.614 41.144 84.304 42.7 82.945 44.22 81.54 45.703 80.088 47.15 78.592 48.56 77.053 49.933 75.471 51.27 73.848 52.57 72.184 53.833 70.482 55.06 68.742 56.25 66.965 57.404 65.153 58.521 63.307 59.601 61.427 60.645 59.515 61.652 57.572 62.622 55.599 63.556 53.598 64.453 51.569 65.314 49.514 66.138 47.433 66.925 45.329 67.676 43.201 68.39 41.052 69.067 38.882 69.708 36.692 70.312 34.484 70.88 32.259 71.411 27.762 72.363 23.209 73.169 18.61 73.828 13.975 74.341 9.311 74.707 4.629 74.927 -0.062 75 -4.755 74.927 -9.438 74.707 -14.103 74.341 -18.741 73.828 -23.343 73.169 -27.9 72.363 -32.402 71.411 -34.63 70.88 -36.841 70.312 -39.033 69.708 -41.207 69.067 -43.359 68.39 -45.49 67.676 -47.599 66.925 -49.683 66.138 -51.743 65.314 -53.776 64.453 -55.782 63.556 -57.759 62.622 -59.707 61.652 -61.624 60.645 -63.509 59.601 -65.361 58.521 -67.178 57.404 -68.961 56.25 -70.707 55.06 -72.415 53.833 -74.085 52.57 -75.714 51.27 -77.303 49.933 -78.85 48.56 -80.353 47.15 -81.811 45.703 -83.224 44.22 -84.59 42.7 -85.909 41.144 -87.178 39.551 -88.397 37.921 -89.564 36.255 -90.68 34.552 -91.741 32.812 -92.748 31.036 -93.699 29.224 -94.593 27.374 -95.428 25.488 -96.205 23.566 -96.92 21.606 -97.575 19.611 -98.166 17.578 -98.693 15.509 -99.156 13.403 -99.552 11.261 -99.881 9.082 -100.141 6.866 -100.332 4.614 -100.452 2.325 -100.5 0
         """
+        if points is not None:
+            if not isinstance(points, int) or points < 2:
+                raise ValueError("The number of points must be an integer greater than 1")
+            self.drawing_cmds = _figures_to_cmds([_resample(pts, points) for pts in self._contours(tolerance)])
+            return self
+
         if max_len <= 0:
             raise ValueError("The length of segments must be a positive and non-zero value")
 
-        # Internal function to help splitting a line
         def line_split(x0, y0, x1, y1):
+            # Points splitting a line (first one excluded), going backwards from its end every max_len pixels
             x0, y0, x1, y1 = float(x0), float(y0), float(x1), float(y1)
-            # Line direction & length
             rel_x, rel_y = x1 - x0, y1 - y0
             distance = math.sqrt(rel_x*rel_x + rel_y*rel_y)
-            # If the line is too long -> split
             if distance > max_len:
-                lines, distance_rest = [], distance % max_len
+                distance_rest = distance % max_len
                 cur_distance = distance_rest if distance_rest > 0 else max_len
 
+                coords = []
                 while cur_distance <= distance:
                     pct = cur_distance / distance
-                    x, y = Shape.format_value(x0 + rel_x * pct), Shape.format_value(y0 + rel_y * pct)
-
-                    lines.append(f"{x} {y}")
+                    coords.append(x0 + rel_x * pct)
+                    coords.append(y0 + rel_y * pct)
                     cur_distance += max_len
+                out.extend(format_list(coords))
+            else:
+                out.append(Shape.format_value(x1))
+                out.append(Shape.format_value(y1))
+            # The next line starts from the last point written
+            return out[-2], out[-1]
+
+        # Reading the flattened shape once, writing the new one in a new list
+        tokens, commands = self.flatten(tolerance).__parse()
+        out = []
+        last_point = None # Last point written, as strings
+        last_move = None # First point of the current figure, as strings
+
+        for typ, first, values in commands:
+            if typ == 'm' and last_move and last_point != last_move:
+                # Closing last figure (its points are added to the last command)
+                line_split(*last_point, *last_move)
+            out.append(typ)
+
+            for i in range(first, first + len(values), 2):
+                x, y = tokens[i], tokens[i+1]
+                if typ == 'l' and last_point:
+                    last_point = line_split(*last_point, x, y)
+                else:
+                    if typ == 'm' and i == first:
+                        last_move = (x, y)
+                    out.append(x)
+                    out.append(y)
+                    last_point = (x, y)
+
+        # Closing last figure
+        if last_move and last_point and last_point != last_move:
+            out.append("l")
+            line_split(*last_point, *last_move)
 
-                return " ".join(lines), lines[-1].split()
-            else: # No line split
-                x1, y1 = Shape.format_value(x1), Shape.format_value(y1)
-                return f"{x1} {y1}", [x1, y1]
-
-        # Getting all points and commands in a list
-        cmds_and_points = self.flatten().drawing_cmds.split()
-        i = 0
-        n = len(cmds_and_points)
-
-        # Utility variables
-        is_line = False
-        previous_two = None
-        last_move = None
-
-        # Splitting everything splittable, probably improvable
-        while i < n:
-            current = cmds_and_points[i]
-            if current == 'l':
-                # Activate line mode, save previous two points
-                is_line = True
-                if not previous_two: # If we're not running into contiguous line, we need to save the previous two
-                    previous_two = [cmds_and_points[i-2], cmds_and_points[i-1]]
-                i += 1
-            elif current == 'm' or current == 'n' or current == 'b' or current == 's' or current == 'p' or current == 'c':
-                if current == 'm':
-                    if last_move: # If we had a previous move, we need to close the previous figure before proceding
-                        x0, y0 = None, None
-                        if previous_two: # If I don't have previous point, I can read them on cmds_and_points, else I wil take 'em
-                            x0, y0 = previous_two[0], previous_two[1]
-                        else:
-                            x0, y0 = cmds_and_points[i-2], cmds_and_points[i-1]
-
-                        if not(x0 == last_move[0] and y0 == last_move[1]): # Closing last figure
-                            cmds_and_points[i] = line_split(x0, y0, last_move[0], last_move[1])[0] + " m"
-                    last_move = [cmds_and_points[i+1], cmds_and_points[i+2]]
-
-                # Disabling line mode, removing previous two points
-                is_line = False
-                previous_two = None
-                i += 1
-            elif is_line:
-                # Do the work with the two points found and the previous two
-                cmds_and_points[i], previous_two = line_split(previous_two[0], previous_two[1], cmds_and_points[i], cmds_and_points[i+1])
-                del cmds_and_points[i+1]
-                # Let's go to the next two points or tag
-                i += 1
-                n -= 1
-            else: # We're working with points that are not lines points, let's go forward
-                i += 2
-
-        # Close last figure of new shape, taking two last points and two last points of move
-        i = n
-        if not previous_two:
-            while i >= 0:
-                current = cmds_and_points[i]
-                current_prev = cmds_and_points[i-1]
-                if current != 'm' and current != 'n' and current != 'b' and current != 's' and current != 'p' and current != 'c' and \
-                   current_prev != 'm' and current_prev != 'n' and current_prev != 'b' and current_prev != 's' and current_prev != 'p' and current_prev != 'c':
-                    previous_two = [current, current_prev]
-                    break
-                i -= 1
-        if not(previous_two[0] == last_move[0] and previous_two[1] == last_move[1]): # Split!
-            cmds_and_points.append("l " + line_split(previous_two[0], previous_two[1], last_move[0], last_move[1])[0])
+        # Update shape
+        self.drawing_cmds = ' '.join(out)
+        return self
 
-        # Sew up everything back and update shape
-        self.drawing_cmds = ' '.join(cmds_and_points)
+    def simplify(self, tolerance=0.5, refit=False, report=False):
+        """Removes the points of the shape which are not needed to draw it with given precision.
+
+        | Every run of consecutive lines is simplified with the Ramer-Douglas-Peucker algorithm, keeping the points which are more than
+          tolerance pixels away from the simplified lines. Bezier curves are left untouched.
+        | With refit, long runs of lines (like the ones made by :func:`flatten` and :func:`split`) are also fitted back into bezier curves
+          (least squares fitting, splitting the run until every point is at most tolerance pixels away), when that needs less points.
+
+        **Tips:** *Sub-pixel tolerances are not visible, but they make the output lighter and faster to render.*
+
+        Parameters:
+            tolerance (int or float, optional): Max distance in pixels between the original points and the simplified shape.
+            refit (bool, optional): If True, runs of lines can be converted to bezier curves.
+            report (bool, optional): If True, the number of points before and after the simplification are returned too.
+
+        Returns:
+            A pointer to the current object, or a tuple (shape, points before, points after) if report is True.
+
+        Examples:
+            ..  code-block:: python3
+
+                print( Shape("m 0 0 l 5 0.1 10 0 10 5 10 10 0 10").simplify(0.5) )
+
+            >>> m 0 0 l 10 0 10 10 0 10
+
+            ..  code-block:: python3
+
+                shape, n_before, n_after = Shape("m 0 0 l 5 0.1 10 0 10 5 10 10 0 10").simplify(0.5, report=True)
+                print(n_before, n_after)
+
+            >>> 6 4
+        """
+        try:
+            tolerance = float(tolerance)
+        except (TypeError, ValueError):
+            raise TypeError("Number expected")
+        if tolerance < 0:
+            raise ValueError("Tolerance must be a positive value")
+
+        def rdp(pts):
+            # Ramer-Douglas-Peucker, returning the indexes of the points to keep (first and last point are always kept)
+            keep = [False] * len(pts)
+            keep[0] = keep[-1] = True
+            stack = [(0, len(pts) - 1)]
+            while stack:
+                first, last = stack.pop()
+                (x0, y0), (x1, y1) = pts[first], pts[last]
+                dx, dy = x1 - x0, y1 - y0
+                length = math.hypot(dx, dy)
+                max_dist, index = -1, 0
+                for i in range(first + 1, last):
+                    x, y = pts[i]
+                    if length > 0:
+                        dist = abs(dx * (y0 - y) - dy * (x0 - x)) / length
+                    else:
+                        dist = math.hypot(x - x0, y - y0)
+                    if dist > max_dist:
+                        max_dist, index = dist, i
+                if max_dist > tolerance:
+                    keep[index] = True
+                    stack.append((first, index))
+                    stack.append((index, last))
+            return [i for i in range(len(pts)) if keep[i]]
+
+        def simplify_run(pts):
+            # Simplifies a run of lines starting from pts[0], returns the new pieces as [(command, points), ...]
+            lines = [("l", [pts[i]]) for i in rdp(pts)[1:]]
+            if not refit or len(pts) < 4:
+                return lines
+
+            # Corners stay corners: the run is fitted in parts, separated by sharp turns
+            pieces, start = [], 0
+            for i in range(1, len(pts)):
+                if i == len(pts) - 1 or _turn_angle(pts[i-1], pts[i], pts[i+1]) > math.pi / 4:
+                    part = pts[start:i+1]
+                    part_lines = [("l", [part[j]]) for j in rdp(part)[1:]]
+                    if len(part) >= 4:
+                        curves = [("b", bez[1:]) for bez in _fit_cubic(part, tolerance)]
+                        pieces.extend(curves if len(curves) * 3 < len(part_lines) else part_lines)
+                    else:
+                        pieces.extend(part_lines)
+                    start = i
+            return pieces if sum(len(p) for _, p in pieces) < len(lines) else lines
+
+        # Reading the shape as figures of pieces (command, [points...])
+        n_before = 0
+        figures, pieces = [], None
+        for typ, _, values in self.__parse()[1]:
+            if typ == "c" and pieces is not None:
+                pieces.append(("c", []))
+            for i in range(0, len(values), 2):
+                point = values[i], values[i+1]
+                n_before += 1
+
+                if typ == "m" or typ == "n" or pieces is None:
+                    pieces = [(typ, [point])]
+                    figures.append(pieces)
+                elif typ == "b" and pieces[-1][0] == "b" and len(pieces[-1][1]) < 3:
+                    pieces[-1][1].append(point)
+                else:
+                    pieces.append((typ, [point]))
+
+        # Simplifying every run of lines
+        shape, n_after, last_typ = [], 0, None
+        f = Shape.format_value
+        for pieces in figures:
+            new_pieces, run, last_point = [], [], None
+            for piece in pieces + [("end", [])]:
+                if piece[0] == "l":
+                    run.append(piece[1][0])
+                    continue
+                if run:
+                    new_pieces.extend(simplify_run([last_point] + run))
+                    last_point, run = run[-1], []
+                if piece[0] != "end":
+                    new_pieces.append(piece)
+                    if piece[1]:
+                        last_point = piece[1][-1]
+
+            for typ, points in new_pieces:
+                if typ != last_typ:
+                    shape.append(typ)
+                    last_typ = typ
+                for x, y in points:
+                    shape.extend((f(x), f(y)))
+                n_after += len(points)
+            # A new figure always needs its move command
+            last_typ = None
+
+        self.drawing_cmds = " ".join(shape)
+        if report:
+            return self, n_before, n_after
         return self
 
-    def __to_outline(self, bord_xy, bord_y=None, mode="round"):
+    def _contours(self, tolerance=1.0, closed=True):
+        # Returns the figures of the shape, with curves flattened, as lists of points [(x, y), ...]
+        # (if closed, without repeating the first point at the end)
+        contours, contour = [], []
+
+        for x, y, typ in Shape(self.drawing_cmds).flatten(tolerance).__points():
+            if typ == "m" or typ == "n":
+                if len(contour) > 1:
+                    contours.append(contour)
+                contour = [(x, y)]
+            elif not contour or contour[-1] != (x, y):
+                contour.append((x, y))
+
+        if len(contour) > 1:
+            contours.append(contour)
+
+        # Figures are implicitly closed
+        if closed:
+            for contour in contours:
+                if len(contour) > 1 and contour[0] == contour[-1]:
+                    contour.pop()
+
+        return contours
+
+    def to_outline(self, bord_xy, bord_y=None, mode="round", tolerance=1.0):
         """Converts shape command for filling to a shape command for stroking.
 
+        | Every figure of the (flattened) shape is offset outwards and inwards by the border width, giving its border as a filled shape
+          (so that the renderer doesn't need to compute it with \\bord).
+        | Like \\bord and \\xbord/\\ybord, horizontal and vertical border widths can be different.
+
         **Tips:** *You could use this for border textures.*
 
         Parameters:
-            shape (str): The shape in ASS format as a string.
+            bord_xy (int or float): Border width (if bord_y is given, horizontal border width).
+            bord_y (int or float, optional): Vertical border width. If not given, it will be the same as bord_xy.
+            mode (str, optional): How corners are joined: "round", "miter" or "bevel".
+            tolerance (float, optional): Angle in degree to define a curve as flat (see :func:`flatten`).
 
         Returns:
             A pointer to the current object.
 
+        Examples:
+            ..  code-block:: python3
+
+                print( Shape("m 0 0 l 10 0 10 10 0 10").to_outline(2, mode="miter") )
+
+            >>> m -2 -2 l 12 -2 12 12 -2 12 m 2 8 l 8 8 8 2 2 2
+        """
+        if bord_y is None:
+            bord_y = bord_xy
+        try:
+            bord_x, bord_y = float(bord_xy), float(bord_y)
+        except (TypeError, ValueError):
+            raise TypeError("Number(s) expected")
+        if bord_x <= 0 or bord_y <= 0:
+            raise ValueError("Border widths must be positive and non-zero values")
+        if mode not in ("round", "miter", "bevel"):
+            raise ValueError("Mode must be either 'round', 'miter' or 'bevel'")
+
+        # Max length of miter joins, as multiple of border width (beyond this, a bevel join is used)
+        miter_limit = 4
+        # Angle between points of round joins, to keep them at most 0.25 pixels away from the exact arc
+        bord_max = max(bord_x, bord_y)
+        arc_step = 2 * math.acos(1 - 0.25 / bord_max) if bord_max > 0.25 else math.pi / 2
+
+        def offset_contour(pts, dirs, side):
+            # Offsets a closed contour on one side (1 = left, -1 = right of the direction of the figure)
+            out = []
+            n = len(pts)
+            # Normals of every segment (segment i goes from point i to point i+1)
+            normals = [(dy * side, -dx * side) for dx, dy in dirs]
+
+            for i in range(n):
+                cx, cy = pts[i]
+                (dx_in, dy_in), (dx_out, dy_out) = dirs[i-1], dirs[i]
+                (nx_in, ny_in), (nx_out, ny_out) = normals[i-1], normals[i]
+                cross = dx_in * dy_out - dy_in * dx_out
+                dot = dx_in * dx_out + dy_in * dy_out
+
+                # (Almost) collinear segments
+                if abs(cross) < 1e-9 and dot > 0:
+                    out.append((cx + nx_out * bord_x, cy + ny_out * bord_y))
+                    continue
+
+                # Miter point (intersection of the two offset segments), relative to the normals
+                m = 1 + nx_in * nx_out + ny_in * ny_out
+                mx, my = ((nx_in + nx_out) / m, (ny_in + ny_out) / m) if m > 1e-9 else (None, None)
+
+                if cross * side < 0 and not (abs(cross) < 1e-9):
+                    # Inner corner: the offset segments intersect (for very sharp corners, let's pass through the corner itself)
+                    if mx is not None and math.hypot(mx, my) <= miter_limit:
+                        out.append((cx + mx * bord_x, cy + my * bord_y))
+                    else:
+                        out.extend(((cx + nx_in * bord_x, cy + ny_in * bord_y), (cx, cy), (cx + nx_out * bord_x, cy + ny_out * bord_y)))
+                elif mode == "miter" and mx is not None and math.hypot(mx, my) <= miter_limit:
+                    out.append((cx + mx * bord_x, cy + my * bord_y))
+                elif mode == "round":
+                    # Arc between the two normals, passing outside of the corner
+                    a_in = math.atan2(ny_in, nx_in)
+                    delta = math.atan2(ny_out, nx_out) - a_in
+                    if abs(cross) < 1e-9:
+                        delta = math.pi * side
+                    else:
+                        delta = (delta + math.pi) % (2 * math.pi) - math.pi
+                    steps = max(1, math.ceil(abs(delta) / arc_step))
+                    for step in range(steps + 1):
+                        a = a_in + delta * step / steps
+                        out.append((cx + math.cos(a) * bord_x, cy + math.sin(a) * bord_y))
+                else:
+                    # Bevel (also used for miter joins too long)
+                    out.extend(((cx + nx_in * bord_x, cy + ny_in * bord_y), (cx + nx_out * bord_x, cy + ny_out * bord_y)))
+            return out
+
+        shape = []
+        for pts in self._contours(tolerance):
+            # Directions and lengths of every segment of the figure
+            n = len(pts)
+            lens = [math.hypot(pts[(i+1) % n][0] - pts[i][0], pts[(i+1) % n][1] - pts[i][1]) for i in range(n)]
+            dirs = [((pts[(i+1) % n][0] - pts[i][0]) / lens[i], (pts[(i+1) % n][1] - pts[i][1]) / lens[i]) for i in range(n)]
+
+            # Border is the area between the two offset figures, so the second one goes the other way around
+            for side in (1, -1):
+                offset = offset_contour(pts, dirs, side)
+                if side == -1:
+                    offset.reverse()
+                shape.append(offset)
+
+        self.drawing_cmds = _figures_to_cmds(shape)
+        return self
+
+    def boolean(self, other, op="union", fill_rule="nonzero", tolerance=1.0):
+        """Combines the shape with another one, using a polygon boolean operation.
+
+        | Both shapes are flattened (see :func:`flatten`), then the crossing points of their edges are found with a sweep over the x axis,
+          and only the pieces of edges that border the resulting area are kept and linked together again.
+        | Overlapping figures inside the same shape are resolved too, so the result never has overlapping parts.
+
+        **Tips:** *Merging lots of small shapes (pixels, particles...) into a single drawing means less lines to render for libass.*
+
+        Parameters:
+            other (Shape): The other shape of the operation.
+            op (str, optional): The operation: "union", "intersection", "difference" (self minus other) or "xor".
+            fill_rule (str, optional): How to decide if a point is inside of a shape: "nonzero" (the rule used by libass) or "evenodd".
+            tolerance (float, optional): Angle in degree to define a curve as flat (see :func:`flatten`).
+
         Returns:
-            A new shape as string, representing the border of the input.
+            A pointer to the current object.
+
+        Examples:
+            ..  code-block:: python3
+
+                print( Shape("m 0 0 l 10 0 10 10 0 10").boolean(Shape("m 5 5 l 15 5 15 15 5 15"), "intersection") )
+
+            >>> m 5 5 l 10 5 10 10 5 10
         """
-        raise NotImplementedError
+        if not isinstance(other, Shape):
+            raise TypeError("A Shape object is expected, but you passed a " + str(type(other)))
+        ops = {
+            "union": lambda a, b: a or b,
+            "intersection": lambda a, b: a and b,
+            "difference": lambda a, b: a and not b,
+            "xor": lambda a, b: a != b,
+        }
+        if op not in ops:
+            raise ValueError("Operation must be either 'union', 'intersection', 'difference' or 'xor'")
+        if fill_rule not in ("nonzero", "evenodd"):
+            raise ValueError("Fill rule must be either 'nonzero' or 'evenodd'")
+
+        contours = _boolean_contours(self._contours(tolerance), other._contours(tolerance), ops[op], fill_rule)
+
+        self.drawing_cmds = _figures_to_cmds(contours)
+        return self
+
+    def union(self, other, fill_rule="nonzero", tolerance=1.0):
+        """Merges the area of another shape into the shape. See :func:`boolean` for the parameters.
+
+        Returns:
+            A pointer to the current object.
+        """
+        return self.boolean(other, "union", fill_rule, tolerance)
+
+    def intersection(self, other, fill_rule="nonzero", tolerance=1.0):
+        """Keeps only the area of the shape which is inside of another shape too. See :func:`boolean` for the parameters.
+
+        Returns:
+            A pointer to the current object.
+        """
+        return self.boolean(other, "intersection", fill_rule, tolerance)
+
+    def difference(self, other, fill_rule="nonzero", tolerance=1.0):
+        """Removes the area of another shape from the shape. See :func:`boolean` for the parameters.
+
+        Returns:
+            A pointer to the current object.
+        """
+        return self.boolean(other, "difference", fill_rule, tolerance)
+
+    def xor(self, other, fill_rule="nonzero", tolerance=1.0):
+        """Keeps only the area which is inside of exactly one of the two shapes. See :func:`boolean` for the parameters.
+
+        Returns:
+            A pointer to the current object.
+        """
+        return self.boolean(other, "xor", fill_rule, tolerance)
+
+    @staticmethod
+    def merge(shapes, fill_rule="nonzero", tolerance=1.0):
+        """Returns a shape object of the union of many shapes, e.g. the pixels given by :func:`Convert.shape_to_pixels`.
+
+        Parameters:
+            shapes (list of Shape or str): The shapes (or their drawing commands) to merge.
+            fill_rule (str, optional): How to decide if a point is inside of a shape: "nonzero" or "evenodd".
+            tolerance (float, optional): Angle in degree to define a curve as flat (see :func:`flatten`).
+
+        Returns:
+            A shape object with all the shapes merged, without overlapping parts.
+
+        Examples:
+            ..  code-block:: python3
+
+                print( Shape.merge([Shape.rectangle(), Shape.rectangle().move(1, 0)]) )
+
+            >>> m 0 0 l 2 0 2 1 0 1
+        """
+        # A single shape with all the figures, united with nothing, resolves every overlap
+        merged = Shape(" ".join(s.drawing_cmds if isinstance(s, Shape) else s for s in shapes))
+        return merged.boolean(Shape(""), "union", fill_rule, tolerance)
 
     @staticmethod
     def ring(out_r, in_r):
@@ -537,6 +938,12 @@ class Shape:
         Returns:
             A shape object representing a ring.
         """
+        return Shape(Shape.__ring(out_r, in_r))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=TEMPLATES_CACHE_SIZE)
+    def __ring(out_r, in_r):
+        # Drawing commands of a ring (cached, see TEMPLATES_CACHE_SIZE)
         try:
             out_r2, in_r2 = out_r*2, in_r*2
             off = out_r - in_r
@@ -549,7 +956,7 @@ class Shape:
             raise ValueError("Valid number expected. Inner radius must be less than outer radius")
 
         f = Shape.format_value
-        return Shape("m 0 %s "\
+        return "m 0 %s "\
         "b 0 %s 0 0 %s 0 "\
         "%s 0 %s 0 %s %s "\
         "%s %s %s %s %s %s "\
@@ -569,7 +976,7 @@ class Shape:
             f(off_in_r),  f(off_in_r2), f(off_in_r2), f(off_in_r2), f(off_in_r2), f(off_in_r),	# inner curve 2
             f(off_in_r2), f(off_in_r),  f(off_in_r2), f(off),       f(off_in_r),  f(off),       # inner curve 3
             f(off_in_r),  f(off),       f(off),       f(off),       f(off),       f(off_in_r)   # inner curve 4
-        ))
+        )
 
     @staticmethod
     def ellipse(w, h):
@@ -584,6 +991,12 @@ class Shape:
         Returns:
             A shape object representing an ellipse.
         """
+        return Shape(Shape.__ellipse(w, h))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=TEMPLATES_CACHE_SIZE)
+    def __ellipse(w, h):
+        # Drawing commands of an ellipse (cached, see TEMPLATES_CACHE_SIZE)
         try:
             w2, h2 = w/2, h/2
         except TypeError:
@@ -591,7 +1004,7 @@ class Shape:
 
         f = Shape.format_value
 
-        return Shape("m 0 %s "\
+        return "m 0 %s "\
         "b 0 %s 0 0 %s 0 "\
         "%s 0 %s 0 %s %s "\
         "%s %s %s %s %s %s "\
@@ -601,7 +1014,7 @@ class Shape:
             f(w2), f(w),  f(w), f(h2),				# curve 2
             f(w),  f(h2), f(w), f(h), f(w2), f(h),	# curve 3
             f(w2), f(h),  f(h), f(h2)				# curve 4
-        ))
+        )
 
     @staticmethod
     def heart(size, offset=0):
@@ -616,6 +1029,12 @@ class Shape:
         Returns:
             A shape object representing an heart.
         """
+        return Shape(Shape.__heart(size, offset))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=TEMPLATES_CACHE_SIZE)
+    def __heart(size, offset):
+        # Drawing commands of a heart (cached, see TEMPLATES_CACHE_SIZE)
         try:
             mult = size / 30
         except TypeError:
@@ -637,39 +1056,41 @@ class Shape:
             return x, y
 
         # Return result
-        return shape.map(shift_mid_point)
+        return shape.map(shift_mid_point).drawing_cmds
 
     @staticmethod
+    @functools.lru_cache(maxsize=TEMPLATES_CACHE_SIZE)
     def __glance_or_star(edges, inner_size, outer_size, g_or_s):
         """
-        General function to create a shape object representing star or glance.
+        General function to create the drawing commands of a star or a glance (cached, see TEMPLATES_CACHE_SIZE).
         """
         # Alias for utility functions
         f = Shape.format_value
-        def rotate_on_axis_z(point, theta):
-            # Internal function to rotate a point around z axis by a given angle.
-            theta = math.radians(theta)
-            return Quaternion(axis=[0, 0, 1],angle=theta).rotate(point)
+
+        # Sine and cosine of the angles of inner and outer edges, to rotate points (0, -size) around the center
+        inner_angles = [math.radians(((i - 0.5) / edges) * 360) for i in range(1, edges+1)]
+        outer_angles = [math.radians((i / edges) * 360) for i in range(1, edges+1)]
+        inner_sin, inner_cos = [math.sin(a) for a in inner_angles], [math.cos(a) for a in inner_angles]
+        outer_sin, outer_cos = [math.sin(a) for a in outer_angles], [math.cos(a) for a in outer_angles]
 
         # Building shape
         shape = ["m 0 %s %s" % (-outer_size, g_or_s)]
-        inner_p, outer_p = 0, 0
 
-        for i in range(1, edges+1):
+        for i in range(edges):
             # Inner edge
-            inner_p = rotate_on_axis_z([0, -inner_size, 0], ((i - 0.5) / edges) * 360)
+            inner_x, inner_y = f(inner_size * inner_sin[i]), f(-inner_size * inner_cos[i])
             # Outer edge
-            outer_p = rotate_on_axis_z([0, -outer_size, 0], (i / edges) * 360)
+            outer_x, outer_y = f(outer_size * outer_sin[i]), f(-outer_size * outer_cos[i])
             # Add curve / line
             if g_or_s == "l":
-                shape.append("%s %s %s %s" % (f(inner_p[0]), f(inner_p[1]), f(outer_p[0]), f(outer_p[1])))
+                shape.append("%s %s %s %s" % (inner_x, inner_y, outer_x, outer_y))
             else:
-                shape.append("%s %s %s %s %s %s" % (f(inner_p[0]), f(inner_p[1]), f(inner_p[0]), f(inner_p[1]), f(outer_p[0]), f(outer_p[1])))
+                shape.append("%s %s %s %s %s %s" % (inner_x, inner_y, inner_x, inner_y, outer_x, outer_y))
 
         shape = Shape(" ".join(shape))
 
         # Return result centered
-        return shape.move()
+        return shape.move().drawing_cmds
 
     @staticmethod
     def star(edges, inner_size, outer_size):
@@ -685,7 +1106,7 @@ class Shape:
         Returns:
             A shape object as a string representing a star.
         """
-        return Shape.__glance_or_star(edges, inner_size, outer_size, "l")
+        return Shape(Shape.__glance_or_star(edges, inner_size, outer_size, "l"))
 
     @staticmethod
     def glance(edges, inner_size, outer_size):
@@ -701,7 +1122,7 @@ class Shape:
         Returns:
             A shape object as a string representing a glance.
         """
-        return Shape.__glance_or_star(edges, inner_size, outer_size, "b")
+        return Shape(Shape.__glance_or_star(edges, inner_size, outer_size, "b"))
 
     @staticmethod
     def rectangle(w=1, h=1):
@@ -716,9 +1137,15 @@ class Shape:
         Returns:
             A shape object representing an rectangle.
         """
+        return Shape(Shape.__rectangle(w, h))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=TEMPLATES_CACHE_SIZE)
+    def __rectangle(w, h):
+        # Drawing commands of a rectangle (cached, see TEMPLATES_CACHE_SIZE)
         try:
             f = Shape.format_value
-            return Shape("m 0 0 l %s 0 %s %s 0 %s 0 0" % (f(w), f(w), f(h), f(h)))
+            return "m 0 0 l %s 0 %s %s 0 %s 0 0" % (f(w), f(w), f(h), f(h))
         except TypeError:
             raise TypeError("Number(s) expected")
 
@@ -732,6 +1159,12 @@ class Shape:
         Returns:
             A shape object representing an triangle.
         """
+        return Shape(Shape.__triangle(size))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=TEMPLATES_CACHE_SIZE)
+    def __triangle(size):
+        # Drawing commands of a triangle (cached, see TEMPLATES_CACHE_SIZE)
         try:
             h = math.sqrt(3) * size / 2
             base = -h / 6
@@ -739,4 +1172,894 @@ class Shape:
             raise TypeError("Number expected")
 
         f = Shape.format_value
-        return Shape("m %s %s l %s %s 0 %s %s %s" % (f(size/2), f(base), f(size), f(base+h), f(base+h), f(size/2), f(base)))
+        return "m %s %s l %s %s 0 %s %s %s" % (f(size/2), f(base), f(size), f(base+h), f(base+h), f(size/2), f(base))
+
+
+class ShapePath:
+    """
+    This class can be used to walk along the outline of a Shape object, f.e. to place text on a path or to move something along a shape.
+
+    | The shape is flattened once, and the arc length from the start of the path to every point is stored, so that every lookup is a binary search.
+    | Figures of the shape are walked one after the other, as if they were a single path.
+
+    Args:
+        shape (Shape or str): The shape (or its drawing commands) to walk along.
+        closed (bool, optional): If True, every figure also has its closing segment, back to its first point.
+        tolerance (float, optional): Angle in degree to define a curve as flat (see :func:`Shape.flatten`).
+
+    Attributes:
+        length (float): Total length of the path.
+        lengths (list of float): Length of every figure of the path.
+
+    Examples:
+        ..  code-block:: python3
+
+            path = ShapePath(Shape("m 0 0 l 100 0 100 100"))
+            print( path.length, path.point_at(150), path.tangent_at(150) )
+            print( path.point_at([0, 50, 100]) )
+
+        >>> 200.0 (100.0, 50.0) (0.0, 1.0)
+        >>> [(0.0, 0.0), (50.0, 0.0), (100.0, 0.0)]
+    """
+    def __init__(self, shape, closed=False, tolerance=1.0):
+        if isinstance(shape, str):
+            shape = Shape(shape)
+        elif not isinstance(shape, Shape):
+            raise TypeError("A Shape object is expected, but you passed a " + str(type(shape)))
+
+        # Every segment (with non-zero length) is stored with the distance of its start from the start of the path
+        self.__starts, self.__segments = [], []
+        self.lengths = []
+        total = 0.0
+        for pts in shape._contours(tolerance, closed):
+            lengths = _cumulative_lengths(pts, closed)
+            ring = pts + pts[:1] if closed else pts
+            for i in range(len(lengths) - 1):
+                seg_len = lengths[i+1] - lengths[i]
+                if seg_len > 0:
+                    (x0, y0), (x1, y1) = ring[i], ring[i+1]
+                    self.__starts.append(total + lengths[i])
+                    self.__segments.append((x0, y0, (x1 - x0) / seg_len, (y1 - y0) / seg_len))
+            self.lengths.append(lengths[-1])
+            total += lengths[-1]
+        self.length = total
+
+    def __repr__(self):
+        return "ShapePath(length=%s, figures=%d)" % (Shape.format_value(self.length), len(self.lengths))
+
+    def __segment(self, distance):
+        # Index of the segment at given distance (clamped to the path) and distance from its start
+        if not self.__segments:
+            raise ValueError("The path is empty")
+        try:
+            distance = min(max(float(distance), 0.0), self.length)
+        except (TypeError, ValueError):
+            raise TypeError("Number(s) expected")
+        i = max(0, bisect.bisect_right(self.__starts, distance) - 1)
+        return i, distance - self.__starts[i]
+
+    def point_at(self, distance):
+        """Returns the point of the path at given distance from its start.
+
+        Distances out of the path are clamped to its start or end.
+
+        Parameters:
+            distance (int or float or list of int or float): Distance from the start of the path, or a list of distances.
+
+        Returns:
+            A tuple (x, y), or a list of tuples if a list of distances was given.
+        """
+        if isinstance(distance, (list, tuple, range)):
+            return [self.point_at(d) for d in distance]
+
+        i, d = self.__segment(distance)
+        x0, y0, dx, dy = self.__segments[i]
+        return (x0 + dx * d, y0 + dy * d)
+
+    def tangent_at(self, distance):
+        """Returns the direction of the path at given distance from its start.
+
+        **Tips:** *To rotate something along the path, use* ``math.degrees(math.atan2(-dy, dx))`` *as value of \\frz.*
+
+        Parameters:
+            distance (int or float or list of int or float): Distance from the start of the path, or a list of distances.
+
+        Returns:
+            A tuple (dx, dy) with the unit vector of the direction, or a list of tuples if a list of distances was given.
+        """
+        if isinstance(distance, (list, tuple, range)):
+            return [self.tangent_at(d) for d in distance]
+
+        i, d = self.__segment(distance)
+        return self.__segments[i][2:]
+
+
+class ShapeMorph:
+    """
+    This class can be used to morph a Shape object into another one (f.e. a syllable into a star).
+
+    | The hard work is done only once: figures of the two shapes are paired (bigger with bigger, the ones left without a pair grow from/shrink into their center),
+      then every pair is resampled to the same number of evenly spaced points, with the same direction and the nearest starting points.
+    | After that, every in-between shape is just a linear interpolation of the points.
+
+    Args:
+        a (Shape or str): The starting shape.
+        b (Shape or str): The ending shape.
+        points (int, optional): Number of points of every figure. If not given, it depends on the number of points of the figures.
+        tolerance (float, optional): Angle in degree to define a curve as flat (see :func:`Shape.flatten`).
+
+    Examples:
+        ..  code-block:: python3
+
+            morph = ShapeMorph(Shape.rectangle(10, 10), Shape.rectangle(20, 20), points=4)
+            print( morph.at(0.5) )
+            for s, e, i, n in FrameUtility(line.start_time, line.end_time):
+                l.text = "{\\p1}%s" % morph.at(i / n)
+
+        >>> m 0 0 l 15 0 15 15 0 15
+    """
+    def __init__(self, a, b, points=None, tolerance=1.0):
+        a = Shape(a) if isinstance(a, str) else a
+        b = Shape(b) if isinstance(b, str) else b
+        if not isinstance(a, Shape) or not isinstance(b, Shape):
+            raise TypeError("Shape objects are expected")
+        if points is not None and (not isinstance(points, int) or points < 3):
+            raise ValueError("The number of points must be an integer greater than 2")
+
+        def area(pts):
+            # Signed area (shoelace formula)
+            return sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(pts, pts[1:] + pts[:1])) / 2
+
+        def center(pts):
+            return (sum(x for x, y in pts) / len(pts), sum(y for x, y in pts) / len(pts))
+
+        # Figures are paired from the biggest to the smallest
+        contours_a = sorted(a._contours(tolerance), key=lambda pts: -abs(area(pts)))
+        contours_b = sorted(b._contours(tolerance), key=lambda pts: -abs(area(pts)))
+
+        self.__a, self.__b, self.__sizes = [], [], []
+        for i in range(max(len(contours_a), len(contours_b))):
+            pts_a = contours_a[i] if i < len(contours_a) else None
+            pts_b = contours_b[i] if i < len(contours_b) else None
+            n = points or max(32, 2 * max(len(pts_a or ()), len(pts_b or ())))
+
+            if pts_a is None or pts_b is None:
+                # Without a pair, the figure grows from (or shrinks into) its center
+                pts = _resample(pts_a or pts_b, n)
+                collapsed = [center(pts)] * n
+                pts_a, pts_b = (collapsed, pts) if pts_a is None else (pts, collapsed)
+            else:
+                pts_a, pts_b = _resample(pts_a, n), _resample(pts_b, n)
+                if (area(pts_a) < 0) != (area(pts_b) < 0):
+                    pts_b.reverse()
+
+                # Starting point of b nearest to the one of a, comparing the figures around their centers
+                (cax, cay), (cbx, cby) = center(pts_a), center(pts_b)
+                rel_a = [(x - cax, y - cay) for x, y in pts_a]
+                rel_b = [(x - cbx, y - cby) for x, y in pts_b]
+                best = min(range(n), key=lambda k: sum(
+                    (ax - bx) ** 2 + (ay - by) ** 2 for (ax, ay), (bx, by) in zip(rel_a, rel_b[k:] + rel_b[:k])
+                ))
+                pts_b = pts_b[best:] + pts_b[:best]
+
+            self.__a.extend(pts_a)
+            self.__b.extend(pts_b)
+            self.__sizes.append(n)
+
+    def at(self, t):
+        """Returns the in-between shape at given progress of the morph.
+
+        Parameters:
+            t (int or float or list of int or float): Progress of the morph, from 0 (first shape) to 1 (second shape), or a list of them.
+
+        Returns:
+            A shape object, or a list of shape objects if a list of progresses was given.
+        """
+        if isinstance(t, (list, tuple, range)):
+            return [self.at(value) for value in t]
+        try:
+            t = float(t)
+        except (TypeError, ValueError):
+            raise TypeError("Number(s) expected")
+
+        pts = [(ax + (bx - ax) * t, ay + (by - ay) * t) for (ax, ay), (bx, by) in zip(self.__a, self.__b)]
+
+        figures, start = [], 0
+        for n in self.__sizes:
+            figures.append(pts[start:start+n])
+            start += n
+        return Shape(_figures_to_cmds(figures))
+
+
+class ShapeIndex:
+    """
+    This class can be used to test a lot of points against a Shape object, f.e. to emit particles only inside of some text.
+
+    | The edges of the flattened shape are bucketed in horizontal bands once (the same structure used by :func:`Shape.boolean`),
+      so that every test only looks at the few edges near to the point.
+
+    Args:
+        shape (Shape or str): The shape (or its drawing commands) to test points against.
+        fill_rule (str, optional): How to decide if a point is inside of the shape: "nonzero" (the rule used by libass) or "evenodd".
+        tolerance (float, optional): Angle in degree to define a curve as flat (see :func:`Shape.flatten`).
+
+    Attributes:
+        bounding (tuple): Bounding box of the shape (see :func:`Shape.bounding`).
+
+    Examples:
+        ..  code-block:: python3
+
+            index = ShapeIndex(Shape.heart(100))
+            print( index.contains(50, 50), index.contains([0, 50], [0, 50]) )
+            for x, y in index.sample_inside(100):
+                ...
+
+        >>> True [False, True]
+    """
+    def __init__(self, shape, fill_rule="nonzero", tolerance=1.0):
+        if isinstance(shape, str):
+            shape = Shape(shape)
+        elif not isinstance(shape, Shape):
+            raise TypeError("A Shape object is expected, but you passed a " + str(type(shape)))
+        if fill_rule not in ("nonzero", "evenodd"):
+            raise ValueError("Fill rule must be either 'nonzero' or 'evenodd'")
+
+        contours = shape._contours(tolerance)
+        self.__edges = _EdgeTable(contours)
+        self.__evenodd = fill_rule == "evenodd"
+        if contours:
+            xs, ys = [x for pts in contours for x, y in pts], [y for pts in contours for x, y in pts]
+            self.bounding = (min(xs), min(ys), max(xs), max(ys))
+        else:
+            self.bounding = (0, 0, 0, 0)
+
+    def contains(self, x, y):
+        """Tests if points are inside of the shape.
+
+        Parameters:
+            x (int or float or list of int or float): Horizontal position of the point, or a list of them.
+            y (int or float or list of int or float): Vertical position of the point, or a list of them (same length of x).
+
+        Returns:
+            True if the point is inside of the shape, else False. A list of them if lists of positions were given.
+        """
+        if isinstance(x, (list, tuple, range)):
+            if len(x) != len(y):
+                raise ValueError("Lists of positions must have the same length")
+            return [self.contains(px, py) for px, py in zip(x, y)]
+
+        w = self.__edges.winding(x, y)
+        return w % 2 == 1 if self.__evenodd else w != 0
+
+    def sample_inside(self, n, rng=None):
+        """Returns random points inside of the shape, uniformly distributed over its area.
+
+        Parameters:
+            n (int): Number of points.
+            rng (random.Random, optional): Random number generator to use (f.e. with a fixed seed, to always get the same points).
+                If not given, the one of the module random is used.
+
+        Returns:
+            A list of n tuples (x, y).
+        """
+        rng = rng or random
+        x1, y1, x2, y2 = self.bounding
+        points, tries = [], 0
+        while len(points) < n:
+            # Random points in the bounding box are kept only if inside of the shape
+            x, y = rng.uniform(x1, x2), rng.uniform(y1, y2)
+            if self.contains(x, y):
+                points.append((x, y))
+            else:
+                tries += 1
+                if tries > 1000 * max(n, 1) and not points:
+                    raise ValueError("The shape seems to have no area")
+        return points
+
+
+class DistanceField:
+    """
+    This class holds the signed distance of the points of a grid from the outline of a Shape object,
+    negative inside of the shape and positive outside.
+
+    | Exact distances are computed near to the outline, then the nearest outline point of every grid point
+      is propagated to the others with a two-pass sweep (8SSEDT).
+    | Outlines at any distance can then be taken from the grid in one pass, giving inset/outset layers of a shape
+      without stacking \\blur or \\bord in many lines (see also :func:`Convert.shape_to_distance_field`).
+
+    Args:
+        shape (Shape or str): The shape (or its drawing commands).
+        resolution (int or float, optional): Distance between the points of the grid.
+        margin (int or float, optional): Space around the shape covered by the grid (the highest outset distance that can be used).
+        fill_rule (str, optional): How to decide if a point is inside of the shape: "nonzero" (the rule used by libass) or "evenodd".
+        tolerance (float, optional): Angle in degree to define a curve as flat (see :func:`Shape.flatten`).
+
+    Attributes:
+        x (float): Horizontal position of the first point of the grid.
+        y (float): Vertical position of the first point of the grid.
+        width (int): Number of points in every row of the grid.
+        height (int): Number of rows of the grid.
+        resolution (float): Distance between the points of the grid.
+        values (list of float): Signed distances of the grid points, row by row.
+
+    Examples:
+        ..  code-block:: python3
+
+            field = DistanceField(Shape.rectangle(20, 10), margin=5)
+            print( field.at(10, 5), field.at(25, 5) )
+            print( field.contour(3).bounding() )
+
+        >>> -5.0 5.0
+        >>> (-3.0, -3.0, 23.0, 13.0)
+    """
+    def __init__(self, shape, resolution=1.0, margin=10.0, fill_rule="nonzero", tolerance=1.0):
+        if isinstance(shape, str):
+            shape = Shape(shape)
+        elif not isinstance(shape, Shape):
+            raise TypeError("A Shape object is expected, but you passed a " + str(type(shape)))
+        if fill_rule not in ("nonzero", "evenodd"):
+            raise ValueError("Fill rule must be either 'nonzero' or 'evenodd'")
+        if resolution <= 0 or margin < 0:
+            raise ValueError("Resolution must be positive and margin can't be negative")
+
+        contours = shape._contours(tolerance)
+        if not contours:
+            raise ValueError("The shape seems to have no area")
+        xs, ys = [x for pts in contours for x, y in pts], [y for pts in contours for x, y in pts]
+        self.resolution = res = float(resolution)
+        self.x, self.y = min(xs) - margin, min(ys) - margin
+        self.width = w = math.ceil((max(xs) + margin - self.x) / res) + 1
+        self.height = h = math.ceil((max(ys) + margin - self.y) / res) + 1
+        x0, y0 = self.x, self.y
+
+        # Nearest outline point of every grid point, exact for the points near to the outline
+        inf = float("inf")
+        near_x, near_y, d2 = [0.0] * (w * h), [0.0] * (w * h), [inf] * (w * h)
+        for pts in contours:
+            n = len(pts)
+            for k in range(n):
+                (ax, ay), (bx, by) = pts[k], pts[(k+1) % n]
+                vx, vy = bx - ax, by - ay
+                vv = vx * vx + vy * vy
+                i_min, i_max = max(0, math.floor((min(ax, bx) - x0) / res) - 1), min(w - 1, math.ceil((max(ax, bx) - x0) / res) + 1)
+                j_min, j_max = max(0, math.floor((min(ay, by) - y0) / res) - 1), min(h - 1, math.ceil((max(ay, by) - y0) / res) + 1)
+                for j in range(j_min, j_max + 1):
+                    py = y0 + j * res
+                    for i in range(i_min, i_max + 1):
+                        px = x0 + i * res
+                        t = 0.0 if vv == 0 else min(1.0, max(0.0, ((px - ax) * vx + (py - ay) * vy) / vv))
+                        qx, qy = ax + t * vx, ay + t * vy
+                        d = (px - qx) ** 2 + (py - qy) ** 2
+                        c = j * w + i
+                        if d < d2[c]:
+                            near_x[c], near_y[c], d2[c] = qx, qy, d
+
+        # Two sweeps over the grid, every point takes the nearest outline point of its neighbours if closer
+        def take(c, o, px, py):
+            if d2[o] < inf:
+                d = (px - near_x[o]) ** 2 + (py - near_y[o]) ** 2
+                if d < d2[c]:
+                    near_x[c], near_y[c], d2[c] = near_x[o], near_y[o], d
+
+        for j in range(h):
+            py = y0 + j * res
+            for i in range(w):
+                c, px = j * w + i, x0 + i * res
+                if i > 0:
+                    take(c, c - 1, px, py)
+                if j > 0:
+                    take(c, c - w, px, py)
+                    if i > 0:
+                        take(c, c - w - 1, px, py)
+                    if i < w - 1:
+                        take(c, c - w + 1, px, py)
+            for i in range(w - 2, -1, -1):
+                take(j * w + i, j * w + i + 1, x0 + i * res, py)
+        for j in range(h - 1, -1, -1):
+            py = y0 + j * res
+            for i in range(w - 1, -1, -1):
+                c, px = j * w + i, x0 + i * res
+                if i < w - 1:
+                    take(c, c + 1, px, py)
+                if j < h - 1:
+                    take(c, c + w, px, py)
+                    if i < w - 1:
+                        take(c, c + w + 1, px, py)
+                    if i > 0:
+                        take(c, c + w - 1, px, py)
+            for i in range(1, w):
+                take(j * w + i, j * w + i - 1, x0 + i * res, py)
+
+        # Sign from the winding number of the points, one row at a time
+        edges = _EdgeTable(contours)
+        evenodd = fill_rule == "evenodd"
+        values = [math.sqrt(d) for d in d2]
+        for j in range(h):
+            crossings = sorted(edges.crossings(y0 + j * res))
+            winding, k = 0, 0
+            for i in range(w):
+                px = x0 + i * res
+                while k < len(crossings) and crossings[k][0] <= px:
+                    winding += crossings[k][1]
+                    k += 1
+                if (winding % 2 == 1) if evenodd else (winding != 0):
+                    values[j * w + i] = -values[j * w + i]
+        self.values = values
+
+    def at(self, x, y):
+        """Returns the signed distance of a point from the outline of the shape, interpolating the values of the grid.
+
+        Points outside of the grid take the value of the nearest grid point.
+
+        Parameters:
+            x (int or float): Horizontal position of the point.
+            y (int or float): Vertical position of the point.
+
+        Returns:
+            The distance, negative if the point is inside of the shape.
+        """
+        fx = min(self.width - 1, max(0.0, (x - self.x) / self.resolution))
+        fy = min(self.height - 1, max(0.0, (y - self.y) / self.resolution))
+        i, j = min(self.width - 2, int(fx)), min(self.height - 2, int(fy))
+        if self.width < 2 or self.height < 2:
+            return self.values[int(fy) * self.width + int(fx)]
+        tx, ty = fx - i, fy - j
+        v, c = self.values, j * self.width + i
+        top = v[c] + (v[c + 1] - v[c]) * tx
+        bottom = v[c + self.width] + (v[c + self.width + 1] - v[c + self.width]) * tx
+        return top + (bottom - top) * ty
+
+    def contour(self, distance=0.0):
+        """Traces the outline of the points at the given distance from the shape (marching squares).
+
+        Positive distances give an outset version of the shape, negative ones an inset version.
+        The outline is clipped to the grid, so outset distances should not be higher than its margin.
+
+        Parameters:
+            distance (int or float, optional): Signed distance of the outline from the shape.
+
+        Returns:
+            A Shape object, with the area inside of the outline filled (empty if no point is inside).
+        """
+        w, h, res, values = self.width, self.height, self.resolution, self.values
+        inf = float("inf")
+
+        def value(i, j):
+            # Points around the grid are far away from the shape, so that every outline is closed
+            return values[j * w + i] if 0 <= i < w and 0 <= j < h else inf
+
+        def point(key, va, vb):
+            kind, i, j = key
+            t = 0.0 if vb == inf else 1.0 if va == inf else (distance - va) / (vb - va)
+            return (self.x + (i + t) * res, self.y + j * res) if kind == 0 else (self.x + i * res, self.y + (j + t) * res)
+
+        # Every crossed edge of a cell gets linked to the next one, with the inside of the outline on the right
+        following, points = {}, {}
+        for j in range(-1, h):
+            for i in range(-1, w):
+                # Corners clockwise from top-left, edges from each corner to the next one
+                corners = (value(i, j), value(i + 1, j), value(i + 1, j + 1), value(i, j + 1))
+                inside = [v < distance for v in corners]
+                crossed = [k for k in range(4) if inside[k] != inside[(k + 1) % 4]]
+                if not crossed:
+                    continue
+                keys = ((0, i, j), (1, i + 1, j), (0, i, j + 1), (1, i, j))
+                for k in crossed:
+                    if keys[k] not in points:
+                        a, b = (corners[k], corners[(k + 1) % 4]) if k < 2 else (corners[(k + 1) % 4], corners[k])
+                        points[keys[k]] = point(keys[k], a, b)
+
+                if len(crossed) == 2:
+                    pairs = [(crossed[0], crossed[1])]
+                else:
+                    # Saddle: the corners different from the center of the cell are cut off
+                    center = sum(corners) / 4 < distance
+                    pairs = [(0, 1), (2, 3)] if inside[1] != center else [(3, 0), (1, 2)]
+                for a, b in pairs:
+                    # Corners from edge a to edge b are on the left side going from a to b
+                    if inside[(a + 1) % 4]:
+                        a, b = b, a
+                    following[keys[a]] = keys[b]
+
+        figures = []
+        while following:
+            start, key = following.popitem()
+            figure = [points[start]]
+            while key != start:
+                if points[key] != figure[-1]:
+                    figure.append(points[key])
+                key = following.pop(key)
+            if len(figure) > 2:
+                figures.append(figure)
+        return Shape(_figures_to_cmds(figures))
+
+
+class _EdgeTable:
+    # Edges of a set of closed figures, bucketed in horizontal bands, to find the edges crossing a row (or the winding number of a point)
+    # without looking at every edge. Used by the boolean operations too.
+    def __init__(self, contours):
+        edges = []
+        for pts in contours:
+            n = len(pts)
+            for i in range(n):
+                (x0, y0), (x1, y1) = pts[i], pts[(i+1) % n]
+                if y0 == y1:
+                    continue # Horizontal edges never cross a horizontal ray
+                # (top y, bottom y, starting point, vector, vertical direction)
+                edges.append((min(y0, y1), max(y0, y1), x0, y0, x1 - x0, y1 - y0, 1 if y1 > y0 else -1))
+
+        self.edges = edges
+        self.bands = []
+        if not edges:
+            return
+
+        self.y_min = min(e[0] for e in edges)
+        self.y_max = max(e[1] for e in edges)
+        n_bands = max(1, int(math.sqrt(len(edges))))
+        self.band_h = (self.y_max - self.y_min) / n_bands or 1
+        self.bands = [[] for _ in range(n_bands)]
+        for e in edges:
+            first = min(n_bands - 1, int((e[0] - self.y_min) / self.band_h))
+            last = min(n_bands - 1, int((e[1] - self.y_min) / self.band_h))
+            for band in range(first, last + 1):
+                self.bands[band].append(e)
+
+    def crossings(self, y):
+        # Horizontal positions and vertical directions of the edges crossing the row at given y (edges are half-open in y)
+        if not self.bands or y < self.y_min or y >= self.y_max:
+            return []
+        return [
+            (x + (y - y0) / vy * vx, direction)
+            for y_top, y_bottom, x, y0, vx, vy, direction in self.bands[min(len(self.bands) - 1, int((y - self.y_min) / self.band_h))]
+            if y_top <= y < y_bottom
+        ]
+
+    def winding(self, x, y):
+        # Winding number of point (x, y), counting the edges crossed by a ray going to the right
+        w = 0
+        for cx, direction in self.crossings(y):
+            if cx > x:
+                w += direction
+        return w
+
+
+def _boolean_contours(contours_a, contours_b, op, fill_rule):
+    # Polygon boolean operation between two sets of closed figures, returning the figures of the result
+    # (every figure is oriented so that the filled area is on the right side, going around it in ASS coordinates)
+    def snap(p):
+        # Points are snapped to a fine grid, so that equal points coming from different computations are recognized as equal
+        return (round(p[0], 6) + 0.0, round(p[1], 6) + 0.0)
+
+    contours_a = [[snap(p) for p in pts] for pts in contours_a]
+    contours_b = [[snap(p) for p in pts] for pts in contours_b]
+    edges = [
+        (pts[i], pts[(i+1) % len(pts)])
+        for pts in contours_a + contours_b
+        for i in range(len(pts))
+        if pts[i] != pts[(i+1) % len(pts)]
+    ]
+
+    # Find the crossing points of the edges, sweeping over x: only edges overlapping in x are tested against each other
+    splits = [[] for _ in edges]
+    eps = 1e-9
+    active = []
+    for i in sorted(range(len(edges)), key=lambda i: min(edges[i][0][0], edges[i][1][0])):
+        (px0, py0), (px1, py1) = p0, p1 = edges[i]
+        p_min_x, p_min_y, p_max_y = min(px0, px1), min(py0, py1), max(py0, py1)
+        active = [j for j in active if max(edges[j][0][0], edges[j][1][0]) >= p_min_x]
+
+        rx, ry = px1 - px0, py1 - py0
+        r_len2 = rx * rx + ry * ry
+        for j in active:
+            (qx0, qy0), (qx1, qy1) = q0, q1 = edges[j]
+            if max(qy0, qy1) < p_min_y or min(qy0, qy1) > p_max_y:
+                continue
+            sx, sy = qx1 - qx0, qy1 - qy0
+            s_len2 = sx * sx + sy * sy
+            denom = rx * sy - ry * sx
+            qpx, qpy = qx0 - px0, qy0 - py0
+
+            if abs(denom) <= eps * math.sqrt(r_len2 * s_len2):
+                # Parallel edges: if they lie on the same line, every edge is split at the ends of the other one
+                if abs(qpx * ry - qpy * rx) > 1e-7 * math.sqrt(r_len2):
+                    continue
+                for q in (q0, q1):
+                    t = ((q[0] - px0) * rx + (q[1] - py0) * ry) / r_len2
+                    if eps < t < 1 - eps:
+                        splits[i].append((t, q))
+                for p in (p0, p1):
+                    u = ((p[0] - qx0) * sx + (p[1] - qy0) * sy) / s_len2
+                    if eps < u < 1 - eps:
+                        splits[j].append((u, p))
+                continue
+
+            t = (qpx * sy - qpy * sx) / denom
+            u = (qpx * ry - qpy * rx) / denom
+            if not (-eps <= t <= 1 + eps and -eps <= u <= 1 + eps):
+                continue
+            # Crossing at an end of an edge uses exactly that point
+            t_inner, u_inner = eps < t < 1 - eps, eps < u < 1 - eps
+            if not t_inner:
+                point = p0 if t < 0.5 else p1
+            elif not u_inner:
+                point = q0 if u < 0.5 else q1
+            else:
+                point = snap((px0 + t * rx, py0 + t * ry))
+            if t_inner:
+                splits[i].append((t, point))
+            if u_inner:
+                splits[j].append((u, point))
+        active.append(i)
+
+    # Winding numbers of both operands, to know on which sides of every piece of edge the result is filled
+    table_a, table_b = _EdgeTable(contours_a), _EdgeTable(contours_b)
+    if fill_rule == "nonzero":
+        inside = lambda x, y: op(table_a.winding(x, y) != 0, table_b.winding(x, y) != 0)
+    else:
+        inside = lambda x, y: op(table_a.winding(x, y) % 2 == 1, table_b.winding(x, y) % 2 == 1)
+
+    kept = set()
+    for (p0, p1), split in zip(edges, splits):
+        chain = [p0] + [p for t, p in sorted(split)] + [p1]
+        for a, b in zip(chain, chain[1:]):
+            if a == b:
+                continue
+            dx, dy = b[0] - a[0], b[1] - a[1]
+            length = math.hypot(dx, dy)
+            # Test two points very near to the middle of the piece, one per side
+            off = min(1e-4, length / 4)
+            nx, ny = -dy / length * off, dx / length * off
+            mx, my = (a[0] + b[0]) / 2, (a[1] + b[1]) / 2
+            in_left, in_right = inside(mx + nx, my + ny), inside(mx - nx, my - ny)
+            if in_left != in_right:
+                kept.add((a, b) if in_left else (b, a))
+
+    # Link the kept pieces of edges in figures
+    outgoing = {}
+    for a, b in sorted(kept):
+        outgoing.setdefault(a, []).append(b)
+
+    contours = []
+    for start in sorted(outgoing):
+        while outgoing[start]:
+            pts = [start]
+            cur = outgoing[start].pop()
+            while cur != start and outgoing.get(cur):
+                pts.append(cur)
+                cur = outgoing[cur].pop()
+
+            # Remove the points in the middle of straight lines
+            i = 0
+            while i < len(pts) and len(pts) > 2:
+                (x0, y0), (x1, y1), (x2, y2) = pts[i-1], pts[i], pts[(i+1) % len(pts)]
+                if abs((x1 - x0) * (y2 - y1) - (y1 - y0) * (x2 - x1)) < 1e-9 and (x1 - x0) * (x2 - x1) + (y1 - y0) * (y2 - y1) >= 0:
+                    pts.pop(i)
+                else:
+                    i += 1
+            if len(pts) > 2:
+                contours.append(pts)
+
+    return contours
+
+
+def _turn_angle(p0, p1, p2):
+    # Angle (in radians, from 0 to pi) between the directions of segments p0->p1 and p1->p2
+    a = math.atan2(p1[1] - p0[1], p1[0] - p0[0])
+    b = math.atan2(p2[1] - p1[1], p2[0] - p1[0])
+    return abs((b - a + math.pi) % (2 * math.pi) - math.pi)
+
+
+def _fit_cubic(pts, tolerance):
+    # Fits cubic bezier curves to a run of points (least squares, after P. J. Schneider, "An Algorithm for Automatically Fitting Digitized Curves"),
+    # returns a list of curves [p0, c1, c2, p3] passing through the first and last point, with every point at most tolerance pixels away
+    def normalize(x, y):
+        length = math.hypot(x, y)
+        return (x / length, y / length) if length > 0 else (0.0, 0.0)
+
+    def bezier(bez, t):
+        mt = 1 - t
+        a, b, c, d = mt * mt * mt, 3 * mt * mt * t, 3 * mt * t * t, t * t * t
+        return (a * bez[0][0] + b * bez[1][0] + c * bez[2][0] + d * bez[3][0],
+                a * bez[0][1] + b * bez[1][1] + c * bez[2][1] + d * bez[3][1])
+
+    def generate(pts, u, tan1, tan2):
+        # Least squares for the lengths of the two tangents, with fixed end points
+        (x0, y0), (x3, y3) = pts[0], pts[-1]
+        c00 = c01 = c11 = x0_ = x1_ = 0.0
+        for (px, py), t in zip(pts, u):
+            mt = 1 - t
+            b0, b1, b2, b3 = mt * mt * mt, 3 * mt * mt * t, 3 * mt * t * t, t * t * t
+            a1x, a1y, a2x, a2y = tan1[0] * b1, tan1[1] * b1, tan2[0] * b2, tan2[1] * b2
+            c00 += a1x * a1x + a1y * a1y
+            c01 += a1x * a2x + a1y * a2y
+            c11 += a2x * a2x + a2y * a2y
+            tx = px - (x0 * (b0 + b1) + x3 * (b2 + b3))
+            ty = py - (y0 * (b0 + b1) + y3 * (b2 + b3))
+            x0_ += a1x * tx + a1y * ty
+            x1_ += a2x * tx + a2y * ty
+
+        det = c00 * c11 - c01 * c01
+        alpha1 = alpha2 = 0.0
+        if abs(det) > 1e-12:
+            alpha1 = (x0_ * c11 - c01 * x1_) / det
+            alpha2 = (c00 * x1_ - c01 * x0_) / det
+        dist = math.hypot(x3 - x0, y3 - y0)
+        if alpha1 < dist * 1e-6 or alpha2 < dist * 1e-6:
+            # Fallback, the least squares solution isn't usable
+            alpha1 = alpha2 = dist / 3
+        return [(x0, y0), (x0 + tan1[0] * alpha1, y0 + tan1[1] * alpha1), (x3 + tan2[0] * alpha2, y3 + tan2[1] * alpha2), (x3, y3)]
+
+    def max_error(pts, bez, u):
+        max_dist, index = 0.0, len(pts) // 2
+        for i in range(1, len(pts) - 1):
+            x, y = bezier(bez, u[i])
+            dist = (x - pts[i][0]) ** 2 + (y - pts[i][1]) ** 2
+            if dist >= max_dist:
+                max_dist, index = dist, i
+        return max_dist, index
+
+    def reparameterize(pts, bez, u):
+        # A Newton-Raphson step for every parameter, to find the nearest point of the curve
+        d1 = [(3 * (bez[i+1][0] - bez[i][0]), 3 * (bez[i+1][1] - bez[i][1])) for i in range(3)]
+        d2 = [(2 * (d1[i+1][0] - d1[i][0]), 2 * (d1[i+1][1] - d1[i][1])) for i in range(2)]
+        new_u = []
+        for (px, py), t in zip(pts, u):
+            x, y = bezier(bez, t)
+            mt = 1 - t
+            dx = mt * mt * d1[0][0] + 2 * mt * t * d1[1][0] + t * t * d1[2][0]
+            dy = mt * mt * d1[0][1] + 2 * mt * t * d1[1][1] + t * t * d1[2][1]
+            ddx, ddy = mt * d2[0][0] + t * d2[1][0], mt * d2[0][1] + t * d2[1][1]
+            num = (x - px) * dx + (y - py) * dy
+            den = dx * dx + dy * dy + (x - px) * ddx + (y - py) * ddy
+            new_u.append(min(1.0, max(0.0, t - num / den)) if den != 0 else t)
+        return new_u
+
+    def fit(pts, tan1, tan2):
+        if len(pts) == 2:
+            dist = math.hypot(pts[1][0] - pts[0][0], pts[1][1] - pts[0][1]) / 3
+            return [[pts[0], (pts[0][0] + tan1[0] * dist, pts[0][1] + tan1[1] * dist), (pts[1][0] + tan2[0] * dist, pts[1][1] + tan2[1] * dist), pts[1]]]
+
+        # Chord length parametrization
+        u = [0.0]
+        for i in range(1, len(pts)):
+            u.append(u[-1] + math.hypot(pts[i][0] - pts[i-1][0], pts[i][1] - pts[i-1][1]))
+        u = [t / u[-1] for t in u] if u[-1] > 0 else [i / (len(pts) - 1) for i in range(len(pts))]
+
+        bez = generate(pts, u, tan1, tan2)
+        err, index = max_error(pts, bez, u)
+        if err <= tolerance * tolerance:
+            return [bez]
+        if err <= 4 * tolerance * tolerance:
+            for _ in range(4):
+                u = reparameterize(pts, bez, u)
+                bez = generate(pts, u, tan1, tan2)
+                err, index = max_error(pts, bez, u)
+                if err <= tolerance * tolerance:
+                    return [bez]
+
+        # Split at the worst point, with the same tangent on both sides
+        center = normalize(pts[index-1][0] - pts[index+1][0], pts[index-1][1] - pts[index+1][1])
+        return fit(pts[:index+1], tan1, center) + fit(pts[index:], (-center[0], -center[1]), tan2)
+
+    tan1 = normalize(pts[1][0] - pts[0][0], pts[1][1] - pts[0][1])
+    tan2 = normalize(pts[-2][0] - pts[-1][0], pts[-2][1] - pts[-1][1])
+    return fit(pts, tan1, tan2)
+
+
+def _cumulative_lengths(pts, closed=True):
+    # Arc length from the first point to every point of a figure (with the closing segment back to the first point, if closed)
+    lengths = [0.0]
+    for (x0, y0), (x1, y1) in zip(pts, pts[1:] + pts[:1] if closed else pts[1:]):
+        lengths.append(lengths[-1] + math.hypot(x1 - x0, y1 - y0))
+    return lengths
+
+
+def _resample(pts, n, closed=True):
+    # Returns n points evenly spaced along a figure, starting from its first point
+    lengths = _cumulative_lengths(pts, closed)
+    ring = pts + pts[:1] if closed else pts
+    total = lengths[-1]
+    step = total / n if closed else total / (n - 1)
+
+    out, j = [], 0
+    for k in range(n):
+        d = k * step
+        # Distances are increasing, so the segment can be searched starting from the previous one
+        while j < len(lengths) - 2 and lengths[j+1] < d:
+            j += 1
+        seg = lengths[j+1] - lengths[j]
+        t = (d - lengths[j]) / seg if seg > 0 else 0.0
+        (x0, y0), (x1, y1) = ring[j], ring[j+1]
+        out.append((x0 + (x1 - x0) * t, y0 + (y1 - y0) * t))
+    return out
+
+
+# Drawing commands and what they expect as values
+_DRAWING_CMDS = {
+    'm': "two values per point",
+    'n': "two values per point",
+    'l': "two values per point",
+    'p': "two values per point",
+    'b': "six values per curve",
+    's': "at least six values, then two per point",
+    'c': "no values",
+}
+
+
+def _parse_drawing(drawing_cmds, strict=False):
+    # Tokenizes (and if strict, validates) drawing commands in a single pass.
+    # Returns (tokens, commands): tokens are the drawing commands split on whitespace, commands a list of (command, index in tokens of its first value, [values...]),
+    # where the values of implicit repetitions of a command are in the same list.
+    # If strict, raises a ValueError with the position of the first error. Else every other token is a command, values before the first command
+    # or after 'c' are ignored, and so is a coordinate without its pair before the next command (only the end of the shape can't cut a point).
+    tokens = drawing_cmds.split()
+    commands = []
+    cmd, values = None, None
+
+    if not strict:
+        for i, token in enumerate(tokens):
+            try:
+                value = float(token)
+            except ValueError:
+                cmd, values = token, []
+                commands.append((token, i + 1, values))
+                continue
+            if cmd is not None and cmd != 'c':
+                values.append(value)
+        if commands and len(commands[-1][2]) % 2 and commands[-1][0] != 'c':
+            raise ValueError("Unexpected end of the shape")
+        for _, _, values in commands:
+            if len(values) % 2:
+                values.pop()
+        return tokens, commands
+
+    def position(index):
+        # Position in the string of the token with given index (the end of the string, if there are no more tokens)
+        if index >= len(tokens):
+            return len(drawing_cmds.rstrip())
+        for i, match in enumerate(re.finditer(r"\S+", drawing_cmds)):
+            if i == index:
+                return match.start()
+
+    def complete():
+        n = len(values)
+        if cmd == 'c':
+            return n == 0
+        if cmd == 's':
+            return n >= 6 and n % 2 == 0
+        return n > 0 and n % (6 if cmd == 'b' else 2) == 0
+
+    for i, token in enumerate(tokens):
+        if token in _DRAWING_CMDS:
+            if cmd is not None and not complete():
+                raise ValueError(f"Unexpected end of '{cmd}' command at position {position(i)} ('{cmd}' expects {_DRAWING_CMDS[cmd]})")
+            cmd, values = token, []
+            commands.append((token, i + 1, values))
+            continue
+
+        try:
+            values.append(float(token))
+        except ValueError:
+            if cmd is not None and cmd != 'c' and not complete():
+                raise ValueError(f"Expected numeric value at position {position(i)}, found '{token}'")
+            raise ValueError(f"Unexpected command '{token}' at position {position(i)}")
+        except AttributeError:
+            raise ValueError(f"Unexpected value '{token}' at position {position(i)} (a command is expected)")
+        if cmd == 'c':
+            raise ValueError(f"Unexpected value '{token}' at position {position(i)} ('c' expects no values)")
+
+    if cmd is not None and not complete():
+        raise ValueError(f"Unexpected end of '{cmd}' command at position {position(len(tokens))} ('{cmd}' expects {_DRAWING_CMDS[cmd]})")
+
+    return tokens, commands
+
+
+def _figures_to_cmds(figures):
+    # Drawing commands of figures given as lists of points [(x, y), ...], formatting all the coordinates at once
+    coords = format_list([value for pts in figures for point in pts for value in point])
+    shape, i = [], 0
+    for pts in figures:
+        n = 2 * len(pts)
+        shape.append("m %s %s l %s" % (coords[i], coords[i+1], " ".join(coords[i+2:i+n])))
+        i += n
+    return " ".join(shape)
@@ -26,11 +26,15 @@ setuptools.setup(
     description="An easy way to do KFX and complex typesetting based on subtitle format ASS (Advanced Substation Alpha).",
     long_description=open('README.md', encoding='utf-8').read(),
     packages=['pyonfx'],
+    entry_points={
+        'console_scripts': [
+            'pyonfx = pyonfx.__main__:main',
+        ],
+    },
     install_requires=[
         "pywin32; sys_platform == \"win32\"",
         "pycairo; sys_platform == \"linux\"",
         "PyGObject; sys_platform == \"linux\"",
-        "pyquaternion",
     ],
     extras_require={
         'dev': [
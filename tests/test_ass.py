@@ -117,3 +117,98 @@ def test_line_values():
     # Bold - Vertical Text
     check.almost_equal(lines[12].width, 31.546875, abs=max_deviation)
     check.almost_equal(lines[12].height, 396.0, abs=max_deviation)
+
+
+def test_incremental_parse(tmp_path):
+    # Copy the test file, so that we can edit it
+    path_copy = str(tmp_path / "ass_core.ass")
+    with open(path_ass, encoding="utf-8-sig") as f:
+        content = f.read()
+    with open(path_copy, "w", encoding="utf-8-sig") as f:
+        f.write(content)
+
+    io_first = Ass(path_copy, incremental=True)
+
+    # Edit the text of a single line
+    with open(path_copy, "w", encoding="utf-8-sig") as f:
+        f.write(content.replace("{\\k78}ro ", "{\\k78}ro! "))
+
+    io_second = Ass(path_copy, incremental=True)
+    io_full = Ass(path_copy)
+
+    # Unchanged lines must be reused, changed ones laid out again
+    check.is_true(io_second.lines[1] is io_first.lines[1])
+    check.is_false(io_second.lines[11] is io_first.lines[11])
+    check.equal(repr(io_second.lines), repr(io_full.lines))
+
+    # Reload with nothing changed reuses everything
+    io_full.reload()
+    check.equal(repr(io_second.lines), repr(io_full.lines))
+
+
+def test_parallel_layout():
+    # Lines laid out in other processes must be the same of the ones laid out here
+    io_parallel = Ass(path_ass, workers=2)
+    check.equal(repr(io_parallel.lines), repr(lines))
+
+    # Every object refers to the styles of its own Ass
+    for line in io_parallel.lines:
+        for obj in [line] + getattr(line, "words", []) + getattr(line, "syls", []) + getattr(line, "chars", []):
+            check.is_true(obj.styleref is io_parallel.styles.get(line.style))
+
+
+def test_parallel_layout_spawn(tmp_path, monkeypatch):
+    import subprocess
+    import multiprocessing
+
+    # Processes started with "spawn" run the main module again, which is guarded here
+    monkeypatch.setattr(font_utility, "MP_CONTEXT", multiprocessing.get_context("spawn"))
+    io_parallel = Ass(path_ass, workers=2)
+    check.equal(repr(io_parallel.lines), repr(lines))
+
+    # A script without the guard can't start them, the lines are laid out in its own process
+    script = tmp_path / "unguarded.py"
+    script.write_text(
+        "import multiprocessing\n"
+        "from pyonfx import *\n"
+        "font_utility.MP_CONTEXT = multiprocessing.get_context('spawn')\n"
+        "io = Ass(%r, workers=2, font_backend=%r)\n"
+        "print(repr(io.lines) == repr(Ass(%r, font_backend=%r).lines))\n"
+        % (path_ass, font_utility.FONT_BACKEND, path_ass, font_utility.FONT_BACKEND)
+    )
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(dir_path))
+    result = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, env=env, timeout=300)
+    check.equal(result.returncode, 0)
+    check.is_in("[WARNING] Processes for the layout could not be started", result.stdout)
+    check.equal(result.stdout.splitlines()[-1], "True")
+
+
+def read_shared_line(layout, i):
+    # Runs in another process, attached to the shared layout
+    line = layout.line(i)
+    return repr(line), all(char.styleref is layout.styles.get(line.style) for char in getattr(line, "chars", []))
+
+
+def test_shared_layout():
+    import concurrent.futures
+
+    with io.share_layout() as layout:
+        check.equal(len(layout), len(lines))
+        check.equal(repr(layout.lines()), repr(lines))
+        check.equal(repr(layout.line(-1)), repr(lines[-1]))
+
+        with concurrent.futures.ProcessPoolExecutor(2) as executor:
+            results = list(executor.map(read_shared_line, [layout] * len(layout), range(len(layout))))
+        check.equal([result[0] for result in results], [repr(line) for line in lines])
+        check.is_true(all(result[1] for result in results))
+
+
+def test_shared_layout_unsupported(monkeypatch):
+    import multiprocessing
+    import pytest
+
+    # Python < 3.8 has no multiprocessing.shared_memory
+    monkeypatch.delattr(multiprocessing, "shared_memory", raising=False)
+    monkeypatch.setitem(sys.modules, "multiprocessing.shared_memory", None)
+    with pytest.raises(RuntimeError, match="Python 3.8"):
+        io.share_layout()
@@ -45,3 +45,69 @@ def test_text_to_shape():
         shape.map(equal)
     else:
         raise NotImplementedError
+
+def test_text_to_shape_scale():
+    syl = lines[1].syls[0]
+    scale_x, scale_y = syl.styleref.scale_x, syl.styleref.scale_y
+    shape = Convert.text_to_shape(syl)
+
+    # Scale overrides don't touch the style, and give the same outline scaled
+    scaled = Convert.text_to_shape(syl, fscx=scale_x * 2, fscy=scale_y)
+    assert (syl.styleref.scale_x, syl.styleref.scale_y) == (scale_x, scale_y)
+    x1, y1, x2, y2 = shape.bounding()
+    sx1, sy1, sx2, sy2 = scaled.bounding()
+    check.almost_equal(sx2 - sx1, (x2 - x1) * 2, abs=max_deviation)
+    check.almost_equal(sy2 - sy1, y2 - y1, abs=max_deviation)
+
+    # Same outlines from many threads at once
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(4) as pool:
+        shapes = list(pool.map(lambda fscx: Convert.text_to_shape(syl, fscx=fscx), [scale_x, scale_x * 2] * 8))
+    assert shapes == [shape, scaled] * 8
+
+def test_shape_to_pixels():
+    # Alpha is the exact area of every pixel covered by the shape
+    pixels = Convert.shape_to_pixels(Shape("m 0.5 0.5 l 2.5 0.5 2.5 2.5 0.5 2.5"))
+    assert [(p['x'], p['y']) for p in pixels] == [(x, y) for y in range(3) for x in range(3)]
+    assert [p['alpha'] for p in pixels] == [63.75, 127.5, 63.75, 127.5, 255, 127.5, 63.75, 127.5, 63.75]
+
+    shape = Shape("m 0.3 0.2 l 10.7 0 5 9.9")
+    pixels = Convert.shape_to_pixels(shape)
+    check.almost_equal(sum(p['alpha'] for p in pixels) / 255, 50.91, abs=0.01)
+    # The input shape is not modified
+    assert shape == Shape("m 0.3 0.2 l 10.7 0 5 9.9")
+
+def test_text_to_pixels():
+    syl = lines[1].syls[0]
+    Convert.glyph_cache_clear()
+    pixels = Convert.text_to_pixels(syl)
+    misses = Convert.glyph_cache_info().misses
+
+    # Glyphs assembled from the cache cover the same area of the whole text
+    shape = Convert.text_to_shape(syl).move(syl.left % 1, syl.top % 1)
+    expected = sum(p['alpha'] for p in Convert.shape_to_pixels(shape))
+    check.almost_equal(sum(p['alpha'] for p in pixels), expected, rel=0.05)
+
+    # Rasterizing the same text again only hits the cache
+    assert Convert.text_to_pixels(syl) == pixels
+    assert Convert.glyph_cache_info().misses == misses
+    assert Convert.glyph_cache_info().hits > 0
+
+def test_image_to_pixels():
+    # Raw RGBA data, 3x2: red, transparent, half transparent blue / three times green
+    image = bytes([255, 0, 0, 255, 0, 0, 0, 0, 0, 0, 255, 128] + [0, 255, 0, 255] * 3)
+    assert Convert.image_to_pixels(image, width=3) == [
+        (0, 0, "&H0000FF&", 255), (2, 0, "&HFF0000&", 128),
+        (0, 1, "&H00FF00&", 255), (1, 1, "&H00FF00&", 255), (2, 1, "&H00FF00&", 255)
+    ]
+    assert Convert.image_to_pixels(image, width=3, quantize=64)[1] == (2, 0, "&HFF0000&", 128)
+
+def test_image_to_ass():
+    # A 4x3 green block with a red column in its last two rows
+    red = [0, 255, 0, 255, 255, 0, 0, 255] + [0, 255, 0, 255] * 2
+    image = bytes([0, 255, 0, 255] * 4 + red + red)
+    assert Convert.image_to_ass(image, width=4) == [
+        "{\\p1\\c&H00FF00&}m 0 0 l 4 0 4 1 0 1 m 0 1 l 1 1 1 3 0 3 m 2 1 l 4 1 4 3 2 3",
+        "{\\p1\\c&H0000FF&}m 1 1 l 2 1 2 3 1 3",
+    ]
+    assert len(Convert.image_to_ass(image, width=4, merge=False)[0].split("m")) == 11
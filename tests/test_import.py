@@ -0,0 +1,11 @@
+import sys
+import subprocess
+
+
+def test_lazy_import():
+    # Importing PyonFX must not load the native font system nor other heavy modules
+    heavy_modules = ["cairo", "gi", "win32gui", "win32ui", "pyquaternion"]
+    code = "import sys, pyonfx; print(' '.join(m for m in %r if m in sys.modules))" % heavy_modules
+
+    out = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, check=True, universal_newlines=True)
+    assert out.stdout.strip() == ""
@@ -0,0 +1,78 @@
+import zlib
+import struct
+import pytest
+from pyonfx.png import read_png, PNG_SIGNATURE, _ADAM7
+
+def chunk(kind, data):
+	return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+def encode(width, height, pixel, color_type=6, depth=8, interlace=0, extra=b"", idat_size=7):
+	# Writes a PNG image using every filter type in turn, pixel(x, y) returns the samples of a pixel
+	channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[color_type]
+	bpp = max(1, channels * depth // 8)
+	raw, kind = bytearray(), 0
+	for x0, y0, dx, dy in (_ADAM7 if interlace else ((0, 0, 1, 1),)):
+		if x0 >= width:
+			continue
+		prev = None
+		for y in range(y0, height, dy):
+			bits = "".join(format(s, "0%db" % depth) for x in range(x0, width, dx) for s in pixel(x, y))
+			line = int(bits + "0" * (-len(bits) % 8), 2).to_bytes((len(bits) + 7) // 8, "big")
+			prev = prev or bytes(len(line))
+			out = bytearray()
+			for i, v in enumerate(line):
+				a, b, c = (line[i - bpp] if i >= bpp else 0), prev[i], (prev[i - bpp] if i >= bpp else 0)
+				p = a + b - c
+				paeth = a if abs(p - a) <= abs(p - b) and abs(p - a) <= abs(p - c) else b if abs(p - b) <= abs(p - c) else c
+				out.append((v - (0, a, b, (a + b) // 2, paeth)[kind]) & 255)
+			raw += bytes((kind,)) + out
+			kind, prev = (kind + 1) % 5, line
+	data = zlib.compress(bytes(raw))
+	header = struct.pack(">IIBBBBB", width, height, depth, color_type, 0, 0, interlace)
+	idats = b"".join(chunk(b"IDAT", data[i:i + idat_size]) for i in range(0, len(data), idat_size))
+	return PNG_SIGNATURE + chunk(b"IHDR", header) + extra + idats + chunk(b"IEND", b"")
+
+def rgba(x, y):
+	return ((x * 37) % 256, (y * 91) % 256, (x * y) % 256, (x + y * 13) % 256)
+
+def test_read_png():
+	expected = [bytearray(bytes(v for x in range(13) for v in rgba(x, y))) for y in range(11)]
+	for interlace in (0, 1):
+		assert read_png(encode(13, 11, rgba, interlace=interlace)) == (13, 11, expected)
+
+	# 16 bits samples are reduced to 8 bits
+	width, height, rows = read_png(encode(2, 1, lambda x, y: (x * 65535, 257, 0), color_type=2, depth=16))
+	assert rows == [bytearray([0, 1, 0, 255, 255, 1, 0, 255])]
+
+	# Grayscale with less than 8 bits and a transparent value
+	trns = chunk(b"tRNS", b"\x00\x01")
+	width, height, rows = read_png(encode(3, 2, lambda x, y: ((x + y) % 4,), color_type=0, depth=2, extra=trns, interlace=1))
+	assert rows == [bytearray([0, 0, 0, 255, 85, 85, 85, 0, 170, 170, 170, 255]), bytearray([85, 85, 85, 0, 170, 170, 170, 255, 255, 255, 255, 255])]
+
+	# Palette with transparency
+	extra = chunk(b"PLTE", b"\xff\x00\x00\x00\xff\x00") + chunk(b"tRNS", b"\x80")
+	width, height, rows = read_png(encode(9, 1, lambda x, y: (x % 2,), color_type=3, depth=1, extra=extra))
+	assert rows[0][:8] == bytearray([255, 0, 0, 128, 0, 255, 0, 255]) and len(rows[0]) == 36
+
+def test_read_png_sources(tmp_path):
+	png = encode(3, 2, lambda x, y: (x, y, 0, 255))
+	expected = read_png(png)
+	(tmp_path / "image.png").write_bytes(png)
+	assert read_png(str(tmp_path / "image.png")) == expected
+	assert read_png(tmp_path / "image.png") == expected
+
+	# File objects of the caller are left open
+	with open(tmp_path / "image.png", "rb") as f:
+		assert read_png(f) == expected
+		assert not f.closed
+
+def test_read_png_errors():
+	png = encode(4, 4, rgba)
+	with pytest.raises(ValueError, match="wrong signature"):
+		read_png(b"GIF89a" + png[6:])
+	with pytest.raises(ValueError, match="corrupted"):
+		read_png(png[:40] + bytes((png[40] ^ 1,)) + png[41:])
+	with pytest.raises(ValueError, match="unexpected end of file"):
+		read_png(png[:-20])
+	with pytest.raises(ValueError, match="bit depth 4 is not allowed"):
+		read_png(encode(4, 4, lambda x, y: (1, 2, 3), color_type=2, depth=4))
@@ -0,0 +1,19 @@
+from pyonfx.serialization import format_value, format_values, format_list
+
+def test_format_value():
+	assert format_value(10.5) == "10.5"
+	assert format_value(3.14159) == "3.142"
+	assert format_value(7.0) == "7"
+	assert format_value(-0.0001) == "-0"
+	assert format_value(10, 0) == "10"
+
+def test_format_values():
+	values = [0, 1.5, 2.25, -0.0001, 3.0004, 100, 10.05, 1e20, float("nan")]
+	# Same output of formatting the values one by one
+	assert format_values(values) == " ".join(format_value(x) for x in values)
+	assert format_values(values, 1) == " ".join(format_value(x, 1) for x in values)
+	assert format_list(values) == [format_value(x) for x in values]
+	assert format_values([]) == "" and format_list([]) == []
+
+	assert format_values([0.9999, -0.0001, 2.5], snap=0.001) == "1 0 2.5"
+	assert format_values((100.25, 50), sep=",") == "100.25,50"
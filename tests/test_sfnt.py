@@ -0,0 +1,225 @@
+import os
+import sys
+import pickle
+import subprocess
+import multiprocessing
+import struct
+import pytest
+from pyonfx import sfnt
+from pyonfx.sfnt import FontFile, find_font
+from pyonfx import font_utility
+from pyonfx.font_utility import Font
+from pyonfx.convert import Convert
+from pyonfx.ass_core import Style, Line
+
+# Glyphs of the test font as (advance, contours), with points (x, y, on_curve)
+GLYPHS = [
+	(500, []), # .notdef
+	(600, [[(100, 0, 1), (100, 600, 1), (500, 600, 1), (500, 0, 1)]]), # A, a rectangle
+	(500, [[(0, 0, 1), (250, 600, 0), (500, 0, 1)]]), # B, a quadratic arc
+]
+
+def build_font(family="Test Sans", subfamily="Regular", mac_style=0, kerning=None):
+	# Writes a minimal TrueType font: A and B are mapped to glyphs 1 and 2, em of 1000 units
+	glyf, loca = b"", [0]
+	for _, contours in GLYPHS:
+		if contours:
+			points = [p for contour in contours for p in contour]
+			xs, ys = [p[0] for p in points], [p[1] for p in points]
+			ends, end = [], -1
+			for contour in contours:
+				end += len(contour)
+				ends.append(end)
+			glyph = struct.pack(">hhhhh", len(contours), min(xs), min(ys), max(xs), max(ys))
+			glyph += struct.pack(">%dHH" % len(ends), *ends, 0) + bytes(p[2] for p in points)
+			glyph += struct.pack(">%dh" % len(xs), *(x - px for x, px in zip(xs, [0] + xs)))
+			glyph += struct.pack(">%dh" % len(ys), *(y - py for y, py in zip(ys, [0] + ys)))
+			glyf += glyph + b"\0" * (len(glyph) % 2)
+		loca.append(len(glyf))
+
+	# Format 4 cmap with the segments 65-66 and 0xFFFF
+	segments = struct.pack(">HHH HH hh HH", 66, 0xFFFF, 0, 65, 0xFFFF, -64, 1, 0, 0)
+	cmap4 = struct.pack(">7H", 4, 14 + len(segments), 0, 4, 4, 1, 0) + segments
+	cmap = struct.pack(">HHHHI", 0, 1, 3, 1, 12) + cmap4
+
+	strings = [(1, family), (2, subfamily), (4, family + " " + subfamily)]
+	name = struct.pack(">HHH", 0, len(strings), 6 + 12 * len(strings))
+	data = b""
+	for name_id, value in strings:
+		value = value.encode("utf-16-be")
+		name += struct.pack(">6H", 3, 1, 0x409, name_id, len(value), len(data))
+		data += value
+	name += data
+
+	tables = {
+		"head": struct.pack(">IIIIHH16xhhhhHHhhh", 0x10000, 0, 0, 0x5F0F3CF5, 0, 1000, 0, -200, 600, 800, mac_style, 8, 2, 0, 0),
+		"hhea": struct.pack(">Ihhh24xH", 0x10000, 800, -200, 90, len(GLYPHS)),
+		"maxp": struct.pack(">IH", 0x5000, len(GLYPHS)),
+		"hmtx": b"".join(struct.pack(">Hh", advance, 0) for advance, _ in GLYPHS),
+		"cmap": cmap,
+		"loca": struct.pack(">%dH" % len(loca), *(offset // 2 for offset in loca)),
+		"glyf": glyf,
+		"name": name,
+	}
+	if kerning:
+		# Format 0 kern table with the given {(left, right): value} pairs
+		pairs = b"".join(struct.pack(">HHh", left, right, value) for (left, right), value in sorted(kerning.items()))
+		subtable = struct.pack(">HHHHHHH", 0, 14 + len(pairs), 1, len(kerning), 6, 0, 0) + pairs
+		tables["kern"] = struct.pack(">HH", 0, 1) + subtable
+	font = struct.pack(">IHHHH", 0x10000, len(tables), 0, 0, 0)
+	offset, body = 12 + 16 * len(tables), b""
+	for tag, table in tables.items():
+		font += struct.pack(">4sIII", tag.encode(), 0, offset + len(body), len(table))
+		body += table + b"\0" * (-len(table) % 4)
+	return font + body
+
+def make_style(fontname, fontsize=50):
+	style = Style()
+	style.fontname, style.fontsize = fontname, fontsize
+	style.bold = style.italic = style.underline = style.strikeout = False
+	style.scale_x, style.scale_y, style.spacing = 200, 100, 5
+	style.font_backend = "sfnt"
+	return style
+
+@pytest.fixture
+def font_dir(tmp_path, monkeypatch):
+	(tmp_path / "TestSans.ttf").write_bytes(build_font())
+	(tmp_path / "TestSans-Bold.ttf").write_bytes(build_font(subfamily="Bold", mac_style=1))
+	monkeypatch.setattr(sfnt, "FONT_DIRS", [str(tmp_path)])
+	monkeypatch.setattr(sfnt, "FALLBACK_FAMILIES", [])
+	font_utility.clear_font_caches()
+	return tmp_path
+
+def test_font_file(font_dir):
+	font = FontFile(str(font_dir / "TestSans.ttf"))
+	assert (font.family, font.subfamily, font.full_name) == ("Test Sans", "Regular", "Test Sans Regular")
+	assert (font.units_per_em, font.ascender, font.descender, font.line_gap) == (1000, 800, 200, 90)
+	assert (font.weight, font.italic, font.num_glyphs) == (400, False, 3)
+
+	assert [font.glyph_index(c) for c in "ABC"] == [1, 2, 0]
+	assert [font.advance(gid) for gid in range(3)] == [500, 600, 500]
+	assert font.kerning(1, 2) == 0
+
+	assert font.outline(0) == []
+	assert font.outline(1) == [[("m", 100, 0), ("l", 100, 600), ("l", 500, 600), ("l", 500, 0), ("l", 100, 0)]]
+	# Quadratic curves are converted exactly to cubic ones
+	(figure,) = font.outline(2)
+	assert figure[0] == ("m", 0, 0) and figure[1][0] == "b"
+	assert figure[1][1:] == pytest.approx((500 / 3, 400, 1000 / 3, 400, 500, 0))
+
+	# Pickling maps the file again
+	copy = pickle.loads(pickle.dumps(font))
+	assert copy.outline(2) == font.outline(2) and copy.full_name == font.full_name
+
+	with pytest.raises(ValueError, match="not a TrueType/OpenType font"):
+		(font_dir / "broken.ttf").write_bytes(b"GIF89a" + bytes(100))
+		FontFile(str(font_dir / "broken.ttf"))
+
+def test_find_font(font_dir):
+	assert find_font("test sans").subfamily == "Regular"
+	assert find_font("Test Sans", bold=True).subfamily == "Bold"
+	assert find_font("Test Sans", italic=True).family == "Test Sans"
+	# Unknown families fall back to any font found
+	assert find_font("Missing Family").family == "Test Sans"
+	assert find_font(str(font_dir / "TestSans-Bold.ttf")).weight == 700
+
+def test_font_backend(font_dir):
+	style = make_style("Test Sans")
+	font = Font(style)
+	assert font.get_metrics() == pytest.approx((40, 10, 0, 0))
+	assert font.get_text_extents("") == (0.0, 0.0)
+	assert font.get_text_extents("AB") == pytest.approx(((600 + 500) / 20 * 2 + 5 * 2, 50))
+	assert font.text_to_shape("A").drawing_cmds == "m 10 40 l 10 10 50 10 50 40 10 40"
+
+	# The second glyph starts after the advance of the first one and the spacing
+	shape = font.text_to_shape("AB")
+	assert shape.drawing_cmds.startswith("m 10 40 l 10 10 50 10 50 40 10 40 m 70 40 b ")
+	assert shape.bounding() == pytest.approx((10, 10, 120, 40))
+
+	# Fonts of this backend can be sent to other processes
+	assert pickle.loads(pickle.dumps(font)).text_to_shape("AB").drawing_cmds == shape.drawing_cmds
+
+	# Synthesized italic for a family without italic fonts, lines for underline and strikeout
+	style.italic = style.underline = True
+	shape = Font(style).text_to_shape("A")
+	assert shape.drawing_cmds.startswith("m 10 40 l 22 10 ")
+	assert shape.bounding()[3] == pytest.approx(47.5)
+
+	with pytest.raises(ValueError):
+		Font(style, backend="gdi")
+
+def test_warm_up_fonts(font_dir):
+	# The font is given by path, so that worker processes find it also without the patched font directories
+	style = make_style(str(font_dir / "TestSans.ttf"), 100)
+	assert font_utility.warm_up_fonts([(style, "ABBA C"), (style, "CA")], workers=2) == 4
+	assert font_utility._advance_caches[font_utility._font_key(style)] == {"A": 600, "B": 500, " ": 500, "C": 500}
+	# Already measured chars are skipped
+	assert font_utility.warm_up_fonts([(style, "ABC")], workers=2) == 0
+
+	font = Font(style)
+	assert font.advances is font_utility._advance_caches[font_utility._font_key(style)]
+	assert font.get_text_extents("AB") == pytest.approx((((600 + 500) / 10 + 5) * 2, 100))
+
+def test_warm_up_fonts_spawn(font_dir, monkeypatch, capsys):
+	# Processes started with "spawn" run the main module again, which is guarded here
+	style = make_style(str(font_dir / "TestSans.ttf"), 100)
+	monkeypatch.setattr(font_utility, "MP_CONTEXT", multiprocessing.get_context("spawn"))
+	assert font_utility.warm_up_fonts([(style, "ABC")], workers=2) == 3
+	assert font_utility._advance_caches[font_utility._font_key(style)] == {"A": 600, "B": 500, "C": 500}
+	assert "[WARNING]" not in capsys.readouterr().out
+
+	# A script without the guard can't start them, the chars are measured in its own process
+	script = font_dir / "unguarded.py"
+	script.write_text(
+		"import multiprocessing\n"
+		"from pyonfx import font_utility\n"
+		"from pyonfx.ass_core import Style\n"
+		"style = Style()\n"
+		"style.fontname, style.fontsize, style.font_backend = %r, 100, 'sfnt'\n"
+		"style.bold = style.italic = style.underline = style.strikeout = False\n"
+		"style.scale_x, style.scale_y, style.spacing = 100, 100, 0\n"
+		"font_utility.MP_CONTEXT = multiprocessing.get_context('spawn')\n"
+		"print('measured', font_utility.warm_up_fonts([(style, 'ABC')], workers=2))\n" % str(font_dir / "TestSans.ttf")
+	)
+	env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+	result = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, env=env, timeout=120)
+	assert result.returncode == 0
+	assert "[WARNING] Processes for the font warm-up could not be started" in result.stdout
+	assert "measured 3" in result.stdout
+
+def test_font_resolution(font_dir, capsys):
+	font = Font(make_style("test sans"))
+	assert (font.resolved, font.fallback) == (str(font_dir / "TestSans.ttf"), False)
+	assert Font(make_style("Test Sans", 20)).get_metrics() == pytest.approx((16, 4, 0, 0))
+	assert capsys.readouterr().out == ""
+
+	# Missing families are reported once, whatever the size
+	style = make_style("Missing Family")
+	style.bold = True
+	for style.fontsize in (50, 50, 60):
+		font = Font(style)
+		assert (font.resolved, font.fallback) == (str(font_dir / "TestSans-Bold.ttf"), True)
+	assert capsys.readouterr().out.count("[WARNING] Font 'Missing Family' not found") == 1
+	assert font_utility.resolved_fonts() == {
+		("test sans", False, False): str(font_dir / "TestSans.ttf"),
+		("Test Sans", False, False): str(font_dir / "TestSans.ttf"),
+		("Missing Family", True, False): str(font_dir / "TestSans-Bold.ttf"),
+	}
+
+	font_utility.clear_font_caches()
+	assert font_utility.resolved_fonts() == {}
+
+def test_kerning(font_dir, monkeypatch):
+	(font_dir / "Kerned.ttf").write_bytes(build_font("Kerned Sans", kerning={(1, 2): -200}))
+	style = make_style(str(font_dir / "Kerned.ttf"))
+	line = Line()
+	line.styleref, line.text, line.left, line.top = style, "AB", 0, 0
+	assert FontFile(str(font_dir / "Kerned.ttf")).kerning(1, 2) == -200
+
+	pixels = Convert.text_to_pixels(line)
+	monkeypatch.setattr(font_utility, "SFNT_KERNING", True)
+	kerned = Convert.text_to_pixels(line)
+	# The second glyph moves left by the kerning, like in the text extents of the font
+	assert Font(style).get_text_extents("AB")[0] == pytest.approx((600 + 500 - 200) / 10 + 5 * 2)
+	assert max(p['x'] for p in kerned) == max(p['x'] for p in pixels) - 20
+	assert [p for p in kerned if p['x'] < 50] == [p for p in pixels if p['x'] < 50]
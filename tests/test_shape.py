@@ -87,6 +87,11 @@ def test_split():
 	dest     = Shape("m -100.5 0 l -92 0 -76 0 -60 0 -44 0 -28 0 -12 0 4 0 20 0 36 0 52 0 68 0 84 0 100 0 l 99.964 2.325 99.855 4.614 99.676 6.866 99.426 9.082 99.108 11.261 98.723 13.403 98.271 15.509 97.754 17.578 97.173 19.611 96.528 21.606 95.822 23.566 95.056 25.488 94.23 27.374 93.345 29.224 92.403 31.036 91.405 32.812 90.352 34.552 89.246 36.255 88.086 37.921 86.876 39.551 85.614 41.144 84.304 42.7 82.945 44.22 81.54 45.703 80.088 47.15 78.592 48.56 77.053 49.933 75.471 51.27 73.848 52.57 72.184 53.833 70.482 55.06 68.742 56.25 66.965 57.404 65.153 58.521 63.307 59.601 61.427 60.645 59.515 61.652 57.572 62.622 55.599 63.556 53.598 64.453 51.569 65.314 49.514 66.138 47.433 66.925 45.329 67.676 43.201 68.39 41.052 69.067 38.882 69.708 36.692 70.312 34.484 70.88 32.259 71.411 27.762 72.363 23.209 73.169 18.61 73.828 13.975 74.341 9.311 74.707 4.629 74.927 -0.062 75 -4.755 74.927 -9.438 74.707 -14.103 74.341 -18.741 73.828 -23.343 73.169 -27.9 72.363 -32.402 71.411 -34.63 70.88 -36.841 70.312 -39.033 69.708 -41.207 69.067 -43.359 68.39 -45.49 67.676 -47.599 66.925 -49.683 66.138 -51.743 65.314 -53.776 64.453 -55.782 63.556 -57.759 62.622 -59.707 61.652 -61.624 60.645 -63.509 59.601 -65.361 58.521 -67.178 57.404 -68.961 56.25 -70.707 55.06 -72.415 53.833 -74.085 52.57 -75.714 51.27 -77.303 49.933 -78.85 48.56 -80.353 47.15 -81.811 45.703 -83.224 44.22 -84.59 42.7 -85.909 41.144 -87.178 39.551 -88.397 37.921 -89.564 36.255 -90.68 34.552 -91.741 32.812 -92.748 31.036 -93.699 29.224 -94.593 27.374 -95.428 25.488 -96.205 23.566 -96.92 21.606 -97.575 19.611 -98.166 17.578 -98.693 15.509 -99.156 13.403 -99.552 11.261 -99.881 9.082 -100.141 6.866 -100.332 4.614 -100.452 2.325 -100.5 0")
 	assert original.split() == dest
 
+	# Uniform arc-length mode
+	original = Shape("m 0 0 l 10 0 10 10 0 10 m 20 0 l 30 0 25 5")
+	dest     = Shape("m 0 0 l 8 0 10 6 6 10 0 8 m 20 0 l 24.828 0 29.657 0 26.828 3.172 23.414 3.414")
+	assert original.split(points=5) == dest
+
 def test_generate_shapes():
 	dest = Shape("m 0 50 b 0 50 0 0 50 0 50 0 100 0 100 50 100 50 100 100 50 100 50 100 0 100 0 50 m 30 50 b 30 50 30 70 50 70 50 70 70 70 70 50 70 50 70 30 50 30 50 30 30 30 30 50")
 	assert Shape.ring(50, 20) == dest
@@ -98,4 +103,181 @@ def test_generate_shapes():
 	assert Shape.star(5, 20, 30) == dest
 
 	dest = Shape("m 50 0 b 57.071 42.929 57.071 42.929 100 50 57.071 57.071 57.071 57.071 50 100 42.929 57.071 42.929 57.071 0 50 42.929 42.929 42.929 42.929 50 0")
-	assert Shape.glance(4, 10, 50) == dest
\ No newline at end of file
+	assert Shape.glance(4, 10, 50) == dest
+
+def test_affine():
+	original = Shape("m 0 0 l 20 0 20 10 0 10")
+	dest     = Shape("m 10 5 l 50 5 50 15 10 15")
+	assert original.transform([[2, 0, 10], [0, 1, 5], [0, 0, 1]]) == dest
+
+	# Chained transformations are composed and applied once
+	original = Shape("m 0 0 l 20 0 20 10 0 10")
+	dest     = Shape("m -5 -10 l -25 -50 -5 -50 15 -10")
+	assert original.translate(5, 0).scale(2).rotate(90).shear(0.5) == dest
+
+	original = Shape("m -100.5 0 l 100 0 b 100 100 -100 100 -100.5 0 c")
+	dest     = Shape("m -100.5 0 l 100 0 b 100 100 -100 100 -100.5 0 c")
+	assert original.scale(2, 3).move(10, 10).move(-10, -10).scale(1/2, 1/3) == dest
+
+	# Transformations must be applied before other operations
+	original = Shape("m 0 0 l 20 0 20 10 0 10").scale(2)
+	assert original.bounding() == (0, 0, 40, 20)
+	assert original.map(lambda x, y: (x+1, y)) == Shape("m 1 0 l 41 0 41 20 1 20")
+
+def test_bounding_exact():
+	original = Shape("m -100.5 0 l 100 0 b 100 100 -100 100 -100.5 0 c")
+	assert original.bounding(exact=True) == (-100.5, 0, 100, 75)
+	assert original.bounding() == (-100.5, 0, 100, 100)
+
+	original = Shape("m 0 0 b 0 -10 10 -10 10 0")
+	assert original.bounding(exact=True) == (0, -7.5, 10, 0)
+
+	# Cache must be cleared when the shape changes
+	original.move(5, 5)
+	assert original.bounding(exact=True) == (5, -2.5, 15, 5)
+	original.drawing_cmds = "m 0 0 l 1 1"
+	assert original.bounding() == (0, 0, 1, 1)
+
+def test_to_outline():
+	original = Shape("m 0 0 l 10 0 10 10 0 10")
+	dest     = Shape("m -2 -2 l 12 -2 12 12 -2 12 m 2 8 l 8 8 8 2 2 2")
+	assert original.to_outline(2, mode="miter") == dest
+
+	original = Shape("m 0 0 l 10 0 10 10 0 10")
+	dest     = Shape("m -2 0 l 0 -1 10 -1 12 0 12 10 10 11 0 11 -2 10 m 2 9 l 8 9 8 1 2 1")
+	assert original.to_outline(2, 1, mode="bevel") == dest
+
+	with pytest.raises(ValueError):
+		Shape("m 0 0 l 10 0 10 10 0 10").to_outline(0)
+
+def test_boolean():
+	a = "m 0 0 l 10 0 10 10 0 10"
+	b = "m 5 5 l 15 5 15 15 5 15"
+	assert Shape(a).intersection(Shape(b)) == Shape("m 5 5 l 10 5 10 10 5 10")
+	assert Shape(a).union(Shape(b)) == Shape("m 0 0 l 10 0 10 5 15 5 15 15 5 15 5 10 0 10")
+	assert Shape(a).difference(Shape(b)) == Shape("m 0 0 l 10 0 10 5 5 5 5 10 0 10")
+	assert Shape(a).intersection(Shape("m 20 20 l 30 20 30 30")) == Shape("")
+
+	# Holes depend on the fill rule
+	hole = "m 0 0 l 3 0 3 3 0 3 m 1 1 l 2 1 2 2 1 2"
+	assert Shape.merge([hole]) == Shape("m 0 0 l 3 0 3 3 0 3")
+	assert Shape.merge([hole], fill_rule="evenodd") == Shape("m 0 0 l 3 0 3 3 0 3 m 1 1 l 1 2 2 2 2 1")
+
+	# Edges shared by adjacent shapes disappear
+	pixels = [Shape.rectangle().move(x, y) for x in range(3) for y in range(2)]
+	assert Shape.merge(pixels) == Shape("m 0 0 l 3 0 3 2 0 2")
+
+	with pytest.raises(ValueError):
+		Shape(a).boolean(Shape(b), "sum")
+
+def test_simplify():
+	original = Shape("m 0 0 l 5 0.1 10 0 10 5 10 10 0 10")
+	dest     = Shape("m 0 0 l 10 0 10 10 0 10")
+	assert original.simplify(0.5) == dest
+	assert Shape(original.drawing_cmds).simplify(0.5, report=True) == (dest, 4, 4)
+	assert Shape("m 0 0 l 5 0.1 10 0 10 5 10 10 0 10").simplify(0.5, report=True) == (dest, 6, 4)
+
+	# Bezier curves and other commands are kept as they are
+	original = Shape("m 0 0 b 10 0 10 10 0 10 l 5 5 5.1 5.05 5.2 5 c")
+	dest     = Shape("m 0 0 b 10 0 10 10 0 10 l 5.2 5 c")
+	assert original.simplify(0.5) == dest
+
+	# Refitting a flattened curve gives back few bezier curves, near to the original points
+	flat = Shape.ellipse(100, 60).flatten()
+	refitted = Shape(flat.drawing_cmds).simplify(0.5, refit=True)
+	assert "b" in refitted.drawing_cmds.split()
+	assert len(refitted.drawing_cmds) < len(Shape(flat.drawing_cmds).simplify(0.5).drawing_cmds) < len(flat.drawing_cmds)
+	for a, b in zip(refitted.bounding(exact=True), flat.bounding()):
+		assert abs(a - b) < 0.5
+
+def test_shape_path():
+	path = ShapePath(Shape("m 0 0 l 100 0 100 100"))
+	assert path.length == 200
+	assert path.point_at(150) == (100, 50)
+	assert path.tangent_at(150) == (0, 1)
+	assert path.point_at([-10, 0, 50, 100, 1000]) == [(0, 0), (0, 0), (50, 0), (100, 0), (100, 100)]
+	assert path.tangent_at([50, 150]) == [(1, 0), (0, 1)]
+
+	# Closed figures, walked one after the other
+	path = ShapePath(Shape("m 0 0 l 10 0 10 10 0 10 m 20 0 l 30 0"), closed=True)
+	assert path.lengths == [40, 20]
+	assert path.point_at(35) == (0, 5)
+	assert path.point_at(45) == (25, 0)
+	assert path.tangent_at(55) == (-1, 0)
+
+	with pytest.raises(ValueError):
+		ShapePath(Shape("")).point_at(0)
+
+def test_shape_morph():
+	morph = ShapeMorph(Shape.rectangle(10, 10), Shape.rectangle(20, 20), points=4)
+	assert morph.at(0) == Shape("m 0 0 l 10 0 10 10 0 10")
+	assert morph.at(0.5) == Shape("m 0 0 l 15 0 15 15 0 15")
+	assert morph.at([0.5, 1]) == [Shape("m 0 0 l 15 0 15 15 0 15"), Shape("m 0 0 l 20 0 20 20 0 20")]
+
+	# Direction and starting point of the second shape are aligned to the first one
+	morph = ShapeMorph("m 0 0 l 10 0 10 10 0 10", "m 10 10 l 10 0 0 0 0 10", points=4)
+	assert morph.at(1) == Shape("m 0 0 l 10 0 10 10 0 10")
+
+	# Figures without a pair shrink into their center
+	morph = ShapeMorph("m 0 0 l 10 0 10 10 0 10 m 20 0 l 24 0 24 4 20 4", "m 0 0 l 10 0 10 10 0 10", points=4)
+	assert morph.at(1) == Shape("m 0 0 l 10 0 10 10 0 10 m 22 2 l 22 2 22 2 22 2")
+
+def test_shape_index():
+	index = ShapeIndex(Shape("m 0 0 l 30 0 30 30 0 30 m 10 10 l 20 10 20 20 10 20"))
+	assert index.contains(5, 5)
+	assert index.contains(15, 15)
+	assert not index.contains(35, 15)
+	assert index.contains([5, 15, 35], [5, 15, 15]) == [True, True, False]
+
+	index = ShapeIndex(Shape("m 0 0 l 30 0 30 30 0 30 m 10 10 l 20 10 20 20 10 20"), fill_rule="evenodd")
+	assert index.contains([5, 15], [5, 15]) == [True, False]
+
+	import random
+	points = index.sample_inside(50, random.Random(0))
+	assert len(points) == 50
+	assert all(not (10 < x < 20 and 10 < y < 20) for x, y in points)
+
+	with pytest.raises(ValueError):
+		ShapeIndex(Shape("m 0 0 l 10 0")).sample_inside(1)
+
+def test_distance_field():
+	field = DistanceField(Shape("m 0 0 l 30 0 30 30 0 30 m 10 10 l 10 20 20 20 20 10"), margin=5)
+	assert (field.x, field.y, field.width, field.height) == (-5, -5, 41, 41)
+	assert field.at(5, 15) == -5
+	assert field.at(15, 15) == 5
+	assert field.at(-3, 15) == 3
+	assert field.at(-3, -4) == 5
+
+	# Outset and inset outlines
+	assert field.contour(2).bounding() == (-2, -2, 32, 32)
+	inset = ShapeIndex(field.contour(-2))
+	assert inset.contains([1, 3, 15, 9, 27], [15, 15, 15, 15, 15]) == [False, True, False, False, True]
+	assert str(field.contour(-20)) == ""
+
+	with pytest.raises(ValueError):
+		DistanceField(Shape("m 0 0"))
+
+def test_has_error():
+	assert Shape("m 0 0 l 10 0 10 10 b 1 1 2 2 3 3 4 4 5 5 6 6 c n 1 1 s 1 1 2 2 3 3 4 4 p 5 5").has_error() is False
+	assert Shape("m 0 0 l 10 0 10").has_error() == "Unexpected end of 'l' command at position 15 ('l' expects two values per point)"
+	assert Shape("m 0 0 l 10 x 10").has_error() == "Expected numeric value at position 11, found 'x'"
+	assert Shape("m 0 0 l 10 10 x 5").has_error() == "Unexpected command 'x' at position 14"
+	assert Shape("5 5 m 0 0").has_error() == "Unexpected value '5' at position 0 (a command is expected)"
+	assert Shape("m 0 0 b 1 1 2 2 3 3 4 4").has_error() == "Unexpected end of 'b' command at position 23 ('b' expects six values per curve)"
+
+	with pytest.raises(ValueError):
+		Shape("m 0 0 l 10").map(lambda x, y: (x, y))
+
+	# Other methods are lenient with malformed drawings, has_error is the validator
+	original = Shape("m 0 0 l 10 0 10 c")
+	assert original.has_error()
+	assert original.map(lambda x, y: (x+1, y)) == Shape("m 1 0 l 11 0 10 c")
+	assert Shape("m 0 0 l 10 10 x 5 5").bounding() == (0, 0, 10, 10)
+	assert Shape("m 0 0 l 10 10 x 5 5").flatten() == Shape("m 0 0 l 10 10 x 5 5")
+	assert Shape("m 0 0 b 1 1 2 2 3 3 4 4 l 5 5").simplify() == Shape("m 0 0 b 1 1 2 2 3 3 4 4 l 5 5")
+
+	# Parse must follow lazy transformations
+	original = Shape("m 0 0 l 10 0 10 10")
+	original.bounding()
+	original.move(5, 5)
+	assert original.flatten() == Shape("m 5 5 l 15 5 15 15")